@@ -17,9 +17,175 @@ load_dotenv(dotenv_path=env_path)
 
 class Settings:
     DATABASE_URL = os.getenv("DATABASE_URL")
+    # Async driver URL for the request path; derived from DATABASE_URL when unset
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+    # Connection pools: DB_POOL_SIZE for the async request path, DB_SYNC_POOL_SIZE
+    # for ingestion (0 = INGESTION_WORKERS + 4); overflow/timeout/recycle apply to both
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_SYNC_POOL_SIZE = int(os.getenv("DB_SYNC_POOL_SIZE", "0"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    # Run the schema migrations at startup; turn off when `python -m app.database`
+    # runs once before the workers start
+    DB_CREATE_SCHEMA = os.getenv("DB_CREATE_SCHEMA", "true").lower() == "true"
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+    # Point the SDK clients elsewhere (e.g. the fake upstreams in benchmarks/);
+    # unset means the providers' public endpoints
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+    GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+    # Shared clients are created on first use, or all at startup with
+    # SERVICES_WARM_UP. Each upstream gets one keep-alive connection pool.
+    SERVICES_WARM_UP = os.getenv("SERVICES_WARM_UP", "true").lower() == "true"
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+    HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+    HTTP_READ_TIMEOUT_SECONDS = float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", "60"))
     WEATHER_API_BASE_URL = os.getenv("WEATHER_API_BASE_URL", "https://api.openweathermap.org/data/2.5/weather")
     WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
+    WEATHER_CACHE_TTL_SECONDS = float(os.getenv("WEATHER_CACHE_TTL_SECONDS", "300"))
+    # How long an expired value may still be served while it is refreshed
+    WEATHER_CACHE_STALE_SECONDS = float(os.getenv("WEATHER_CACHE_STALE_SECONDS", "600"))
+
+    # Document ingestion
+    # Uploads are streamed to UPLOAD_DIR in UPLOAD_CHUNK_SIZE pieces and
+    # rejected with 413 past UPLOAD_MAX_BYTES
+    UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploaded_docs")
+    UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+    INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+    # false = uploads are only recorded and a dedicated `python -m
+    # app.ingestion_worker` process, polling every INGESTION_POLL_SECONDS,
+    # processes them; failed documents are retried after INGESTION_RETRY_SECONDS
+    INGESTION_IN_PROCESS = os.getenv("INGESTION_IN_PROCESS", "true").lower() == "true"
+    INGESTION_POLL_SECONDS = float(os.getenv("INGESTION_POLL_SECONDS", "2"))
+    INGESTION_RETRY_SECONDS = float(os.getenv("INGESTION_RETRY_SECONDS", "300"))
+    # An ingestion job claims its document in the database and renews the
+    # claim as it goes; a claim not renewed for this long (a crashed worker)
+    # can be taken over
+    INGESTION_CLAIM_TTL_SECONDS = float(os.getenv("INGESTION_CLAIM_TTL_SECONDS", "600"))
+    # Compaction of orphaned vectors and pages, run by whichever process does
+    # the ingestion every COMPACTION_INTERVAL_SECONDS (0 = only on demand),
+    # scanning the vector store COMPACTION_BATCH_SIZE records at a time
+    COMPACTION_INTERVAL_SECONDS = float(os.getenv("COMPACTION_INTERVAL_SECONDS", "3600"))
+    COMPACTION_BATCH_SIZE = int(os.getenv("COMPACTION_BATCH_SIZE", "1000"))
+    PDF_EXTRACTION_BACKEND = os.getenv("PDF_EXTRACTION_BACKEND", "pdfplumber")  # or 'pypdfium2'
+    PDF_EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", "0"))  # 0 = one per CPU
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    # Output size requested through the model's `dimensions` parameter
+    # (text-embedding-3 models); 0 = the model's native size. Changing it
+    # requires re-indexing, since stored and query vectors must match
+    EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "0"))
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+    EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "100000"))
+    EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+    EMBEDDING_MAX_INPUT_TOKENS = int(os.getenv("EMBEDDING_MAX_INPUT_TOKENS", "8191"))  # per-input limit of the model
+    # Token-aware chunking: CHUNK_TOKENIZER is auto, tiktoken, tokenizers,
+    # heuristic, or a tokenizer.json path / Hub repository
+    CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", "auto")
+    CHUNK_TOKENIZER_NAME = os.getenv("CHUNK_TOKENIZER_NAME", "Xenova/text-embedding-ada-002")  # cl100k_base for `tokenizers`
+    # Chunk boundaries (and so content hashes and re-embedding) depend on the
+    # tokenizer, so one that fails to load (e.g. offline, with no cached
+    # tiktoken/Hub files) is an error unless a fallback is named here
+    # ("heuristic"); empty = no fallback
+    CHUNK_TOKENIZER_FALLBACK = os.getenv("CHUNK_TOKENIZER_FALLBACK", "")
+    CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "512"))
+    CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "64"))
+    # Streaming ingestion: pages buffered between extraction and chunking, and
+    # pages per DocumentPage INSERT
+    INGESTION_PREFETCH_PAGES = int(os.getenv("INGESTION_PREFETCH_PAGES", "32"))
+    INGESTION_PAGE_BATCH = int(os.getenv("INGESTION_PAGE_BATCH", "16"))
+    EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./.embedding_cache/embeddings.sqlite3")
+
+    # Vector storage: embedded 'chroma', the in-process 'numpy' index (both
+    # single-process), or 'chroma_server' shared by every worker and node.
+    # With a shared store, workers poll its version every
+    # VECTOR_CHANGE_POLL_SECONDS (0 = off) to drop stale cached answers.
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+    CHROMA_PATH = os.getenv("CHROMA_PATH", "./.chromadb")
+    CHROMA_HOST = os.getenv("CHROMA_HOST", "localhost")
+    CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8001"))
+    CHROMA_SSL = os.getenv("CHROMA_SSL", "false").lower() == "true"
+    CHROMA_AUTH_TOKEN = os.getenv("CHROMA_AUTH_TOKEN") or None
+    VECTOR_CHANGE_POLL_SECONDS = float(os.getenv("VECTOR_CHANGE_POLL_SECONDS", "5"))
+    NUMPY_INDEX_PATH = os.getenv("NUMPY_INDEX_PATH", "./.vector_index")
+    # 'int8' keeps an int8 copy of the numpy index in RAM for scanning and
+    # re-scores the best NUMPY_INDEX_RESCORE_FACTOR x top_k candidates with
+    # the float32 vectors, read from the memory-mapped file; 'none' scans
+    # the float32 matrix directly
+    NUMPY_INDEX_QUANTIZATION = os.getenv("NUMPY_INDEX_QUANTIZATION", "none")
+    NUMPY_INDEX_RESCORE_FACTOR = int(os.getenv("NUMPY_INDEX_RESCORE_FACTOR", "4"))
+
+    # Local fast-path intent classifier in front of the LLM classifier
+    LOCAL_CLASSIFIER_ENABLED = os.getenv("LOCAL_CLASSIFIER_ENABLED", "true").lower() == "true"
+    # Keyword rules reach full confidence with two matching words; one scores at most 0.5
+    LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.8"))
+    LOCAL_CLASSIFIER_USE_EMBEDDINGS = os.getenv("LOCAL_CLASSIFIER_USE_EMBEDDINGS", "true").lower() == "true"
+    # Share of fast-path decisions double-checked by the LLM to measure agreement
+    LOCAL_CLASSIFIER_SHADOW_RATE = float(os.getenv("LOCAL_CLASSIFIER_SHADOW_RATE", "0.05"))
+
+    # POST /messages/batch
+    MESSAGE_BATCH_MAX_SIZE = int(os.getenv("MESSAGE_BATCH_MAX_SIZE", "1000"))
+    # Concurrent LLM calls (classification groups and generations) per batch
+    MESSAGE_BATCH_CONCURRENCY = int(os.getenv("MESSAGE_BATCH_CONCURRENCY", "8"))
+    # Messages per grouped LLM classification call
+    CLASSIFIER_BATCH_SIZE = int(os.getenv("CLASSIFIER_BATCH_SIZE", "20"))
+
+    # Start food retrieval (and the weather fetch) while classification is in flight
+    SPECULATIVE_EXECUTION = os.getenv("SPECULATIVE_EXECUTION", "false").lower() == "true"
+    SPECULATIVE_WEATHER = os.getenv("SPECULATIVE_WEATHER", "true").lower() == "true"
+
+    # RAG context: candidates fetched per query, prompt context budget, and
+    # the cutoffs for near-duplicate (Jaccard) and irrelevant (squared L2) chunks
+    RAG_CANDIDATES = int(os.getenv("RAG_CANDIDATES", "8"))
+    RAG_CONTEXT_MAX_TOKENS = int(os.getenv("RAG_CONTEXT_MAX_TOKENS", "1500"))
+    RAG_DEDUP_THRESHOLD = float(os.getenv("RAG_DEDUP_THRESHOLD", "0.8"))
+    RAG_MAX_DISTANCE = float(os.getenv("RAG_MAX_DISTANCE", "1.5"))  # 0 disables the cutoff
+
+    # Semantic answer cache for food RAG queries
+    SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+    SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+    SEMANTIC_CACHE_MAX_SIZE = int(os.getenv("SEMANTIC_CACHE_MAX_SIZE", "1000"))
+    # Observability: Prometheus /metrics and OpenTelemetry spans (exported over
+    # OTLP/gRPC when an endpoint is set)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+    OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "conversational-ai-platform")
+    OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+    # LLM calls: each route is a 'provider:model' list (openai or groq), the
+    # first being the primary and the rest hedge/failover alternates. A hedge
+    # starts once the primary has run for LLM_HEDGE_PERCENTILE of its recent
+    # latency on that route (the slowest call seen until LLM_HEDGE_MIN_SAMPLES
+    # calls are; before the first one, LLM_HEDGE_DEFAULT_DELAY_SECONDS for
+    # streams and no hedge otherwise). Concurrency and circuit breakers are
+    # per provider.
+    LLM_FOOD_MODELS = os.getenv("LLM_FOOD_MODELS", "groq:llama-3.1-70b-versatile,openai:gpt-4o-mini")
+    LLM_OOC_MODELS = os.getenv("LLM_OOC_MODELS", "groq:llama-3.1-70b-versatile,openai:gpt-4o-mini")
+    LLM_WEATHER_MODELS = os.getenv("LLM_WEATHER_MODELS", "openai:gpt-4o,groq:llama-3.1-70b-versatile")
+    LLM_CLASSIFIER_MODELS = os.getenv("LLM_CLASSIFIER_MODELS", "openai:gpt-3.5-turbo,groq:llama-3.1-8b-instant")
+    LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "30"))
+    LLM_CLASSIFIER_DEADLINE_SECONDS = float(os.getenv("LLM_CLASSIFIER_DEADLINE_SECONDS", "5"))
+    LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING_ENABLED", "true").lower() == "true"
+    LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+    LLM_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_SECONDS", "3"))
+    LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "0.2"))
+    LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+    LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+    LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+    # Logging: 'development' (text, synchronous, diagnose) or 'production'
+    # (JSON, enqueued, no diagnose). In production, DEBUG records are sampled
+    # at LOG_DEBUG_SAMPLE_RATE and capped per call site at
+    # LOG_DEBUG_RATE_LIMIT per second (0 = no cap)
+    LOG_PROFILE = os.getenv("LOG_PROFILE", "development")
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+    LOG_DEBUG_RATE_LIMIT = float(os.getenv("LOG_DEBUG_RATE_LIMIT", "10"))
 
 settings = Settings()
\ No newline at end of file
@@ -1,22 +1,85 @@
+from pathlib import Path
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.config import settings
 from loguru import logger
 
 Base = declarative_base()
 
-engine = create_engine(settings.DATABASE_URL, echo=False, future=True)
+def _async_url(url: str) -> str:
+    """
+    Map a sync DATABASE_URL onto its async driver equivalent.
+    """
+    for sync_prefix, async_prefix in (
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("postgres://", "postgresql+asyncpg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+def _pool_options(url: str, pool_size: int) -> dict:
+    """
+    Connection pool settings; SQLite uses its own pool classes without them.
+    """
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": pool_size,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+# Sync engine used by the ingestion workers and the documents router; by
+# default one connection per ingestion worker plus a few for request threads
+engine = create_engine(
+    settings.DATABASE_URL, echo=False, future=True,
+    **_pool_options(settings.DATABASE_URL, settings.DB_SYNC_POOL_SIZE or settings.INGESTION_WORKERS + 4)
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
 
-try:
-    Base.metadata.create_all(bind=engine, checkfirst=True)
-    logger.info("Database tables ensured.")
-except Exception as e:
-    logger.exception("Failed to ensure database tables exist.")
+# Async engine used by the request path. Objects stay loaded after commit so
+# handlers can return them without a refresh round trip.
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or _async_url(settings.DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False, **_pool_options(ASYNC_DATABASE_URL, settings.DB_POOL_SIZE))
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+def init_db():
+    """
+    Bring the schema up to date by running the Alembic migrations in
+    `migrations/` (the same as `alembic upgrade head`). Runs at startup
+    (`DB_CREATE_SCHEMA`) rather than on import; with several workers, run
+    `python -m app.database` once before starting them and turn
+    `DB_CREATE_SCHEMA` off.
+    """
+    from alembic import command
+    from alembic.config import Config
+    config = Config(str(Path(__file__).resolve().parent.parent / "alembic.ini"))
+    # Keep the app's logging setup instead of alembic.ini's
+    config.attributes["configure_logging"] = False
+    try:
+        command.upgrade(config, "head")
+        logger.info("Database schema migrated.")
+    except Exception as e:
+        logger.exception("Failed to migrate the database schema.")
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+if __name__ == "__main__":
+    # Go through the importable module, whose Base the models registered on
+    from app.database import init_db
+    init_db()
@@ -0,0 +1,60 @@
+"""
+Dedicated ingestion process for multi-worker and multi-node deployments.
+
+With `INGESTION_IN_PROCESS=false` the API workers only store uploads and
+their `Document` rows; this process polls the database for unprocessed
+documents and runs them through the usual pipeline on `INGESTION_WORKERS`
+threads, and compacts orphaned vectors and pages every
+`COMPACTION_INTERVAL_SECONDS`. Run a single instance of it next to a shared
+vector store:
+
+    chroma run --path ./.chromadb --port 8001
+    VECTOR_BACKEND=chroma_server INGESTION_IN_PROCESS=false uvicorn app.main:app --workers 4
+    VECTOR_BACKEND=chroma_server python -m app.ingestion_worker
+"""
+import signal
+import threading
+import time
+from app.logging_config import logger
+from app.config import settings
+from app.database import init_db
+from app.services import ingestion_queue
+from app.services.compaction import run_compaction
+from app.services.container import services
+from app.utils.pdf_utils import shutdown_process_pool
+
+def main():
+    if settings.DB_CREATE_SCHEMA:
+        init_db()
+    services.warm_up()
+    if not services.vector_backend.shared:
+        logger.warning(f"The '{settings.VECTOR_BACKEND}' vector backend is not shared; API workers won't see what this process ingests.")
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+
+    logger.info(f"Ingestion worker started with {settings.INGESTION_WORKERS} threads, polling every {settings.INGESTION_POLL_SECONDS}s.")
+    next_compaction = time.monotonic() + settings.COMPACTION_INTERVAL_SECONDS
+    while not stop.is_set():
+        try:
+            queued = ingestion_queue.enqueue_pending()
+            if queued:
+                logger.info(f"Queued {queued} documents for ingestion.")
+        except Exception:
+            logger.exception("Failed to look up unprocessed documents.")
+        if settings.COMPACTION_INTERVAL_SECONDS and time.monotonic() >= next_compaction:
+            next_compaction = time.monotonic() + settings.COMPACTION_INTERVAL_SECONDS
+            try:
+                run_compaction()
+            except Exception:
+                logger.exception("Compaction failed.")
+        stop.wait(settings.INGESTION_POLL_SECONDS)
+
+    logger.info("Ingestion worker stopping; waiting for running jobs.")
+    ingestion_queue.shutdown(wait=True)
+    shutdown_process_pool(wait=True)
+    logger.complete()
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,108 @@
-from loguru import logger
+import json
+import random
 import sys
+import time
+from threading import Lock
+from loguru import logger
+from app.config import settings
+
+# Two profiles, picked with LOG_PROFILE:
+# - development: colored text written synchronously to stderr, with
+#   `diagnose` (variable values in tracebacks).
+# - production: one JSON object per line, written by loguru's background
+#   thread (`enqueue=True`) so request handlers never block on the stream,
+#   no `diagnose`/`backtrace`, and chatty DEBUG call sites sampled and
+#   rate-limited.
+#
+# Hot paths log with loguru's `{}` arguments (or `logger.opt(lazy=True)`),
+# so messages below the configured level are never formatted.
+
+DEVELOPMENT_FORMAT = "<green>{time}</green> <level>{message}</level>"
+
+class DebugSampler:
+    """
+    Loguru filter for records below `below_level`: keeps a `sample_rate`
+    share of them and at most `per_second` per call site (token bucket per
+    module and line), so per-chunk and per-request lines can't flood the
+    sink. Records at `below_level` and above always pass.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, per_second: float = 0, below_level: str = "INFO"):
+        self.sample_rate = sample_rate
+        self.per_second = per_second
+        self.below = logger.level(below_level).no
+        self._lock = Lock()
+        self._buckets = {}  # (module, line) -> (tokens, updated_at)
+        self.dropped = 0
+
+    def __call__(self, record) -> bool:
+        if record["level"].no >= self.below:
+            return True
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.dropped += 1
+            return False
+        if not self.per_second:
+            return True
+        site = (record["name"], record["line"])
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(site, (self.per_second, now))
+            tokens = min(self.per_second, tokens + (now - updated_at) * self.per_second)
+            if tokens < 1.0:
+                self._buckets[site] = (tokens, now)
+                self.dropped += 1
+                return False
+            self._buckets[site] = (tokens - 1.0, now)
+        return True
+
+def _exception_only(record) -> str:
+    # A callable format gets no automatic "{exception}" suffix; the JSON sink
+    # takes the message from the record and the traceback from this string
+    return "{exception}"
+
+def json_sink(stream):
+    """
+    Sink writing one compact JSON object per record to `stream`.
+    """
+    def write(message):
+        record = message.record
+        entry = {
+            "time": record["time"].isoformat(),
+            "level": record["level"].name,
+            "message": record["message"],
+            "logger": record["name"],
+            "function": record["function"],
+            "line": record["line"],
+        }
+        if record["extra"]:
+            entry["extra"] = record["extra"]
+        if record["exception"] is not None:
+            entry["exception"] = str(message).rstrip("\n")
+        stream.write(json.dumps(entry, default=str) + "\n")
+    return write
+
+def configure_logging(profile: str = None, sink=None, level: str = None) -> int:
+    """
+    Replace loguru's handlers with the `profile` (`LOG_PROFILE`) handler
+    writing to `sink` (stderr by default). Returns the handler ID.
+    """
+    profile = profile or settings.LOG_PROFILE
+    sink = sink or sys.stderr
+    level = level or settings.LOG_LEVEL
+    logger.remove()
+    if profile == "production":
+        return logger.add(
+            json_sink(sink),
+            format=_exception_only,
+            level=level,
+            filter=DebugSampler(settings.LOG_DEBUG_SAMPLE_RATE, settings.LOG_DEBUG_RATE_LIMIT),
+            enqueue=True,
+            backtrace=False,
+            diagnose=False,
+            catch=True,
+        )
+    if profile != "development":
+        raise ValueError(f"Unknown log profile '{profile}'.")
+    return logger.add(sink, format=DEVELOPMENT_FORMAT, level=level, backtrace=True, diagnose=True)
 
-# Configure loguru
-logger.remove()
-logger.add(sys.stderr, format="<green>{time}</green> <level>{message}</level>", level="INFO", backtrace=True, diagnose=True)
\ No newline at end of file
+configure_logging()
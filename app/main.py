@@ -1,15 +1,57 @@
+import asyncio
+from contextlib import asynccontextmanager
+# Configure logging before the services below are imported and start logging
+from app.logging_config import logger
 from fastapi import FastAPI
-from app.routers import messages, documents
+from app.routers import messages, documents, stats
+from app.services import ingestion_queue
+from app.services.compaction import compact_periodically
+from app.services.semantic_cache import watch_corpus_changes
+from app.services.container import services
+from app.database import init_db
+from app.config import settings
 from app.utils.error_handlers import http_exception_handler, general_exception_handler
+from app.utils.pdf_utils import shutdown_process_pool
+from app.utils.upload_limit import UploadSizeLimitMiddleware
+from app.utils.telemetry import setup_telemetry
 from fastapi.exceptions import HTTPException
-from app.logging_config import logger
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.DB_CREATE_SCHEMA:
+        init_db()
+    if settings.SERVICES_WARM_UP:
+        services.warm_up()
+    if settings.INGESTION_IN_PROCESS:
+        # Pick up documents left unprocessed by a previous run
+        ingestion_queue.resume_pending()
+    tasks = []
+    if settings.VECTOR_CHANGE_POLL_SECONDS:
+        tasks.append(asyncio.create_task(watch_corpus_changes(settings.VECTOR_CHANGE_POLL_SECONDS)))
+    if settings.INGESTION_IN_PROCESS and settings.COMPACTION_INTERVAL_SECONDS:
+        tasks.append(asyncio.create_task(compact_periodically(settings.COMPACTION_INTERVAL_SECONDS)))
+    yield
+    for task in tasks:
+        task.cancel()
+    ingestion_queue.shutdown()
+    shutdown_process_pool()
+    await services.aclose()
+    # Drain records still queued for the enqueued (production) sink
+    await logger.complete()
 
 def create_app():
-    app = FastAPI(title="Conversational AI Platform", version="1.0")
+    app = FastAPI(title="Conversational AI Platform", version="1.0", lifespan=lifespan)
 
     # Include routers
     app.include_router(messages.router)
     app.include_router(documents.router)
+    app.include_router(stats.router)
+
+    # Turn away oversized uploads before their body is read
+    app.add_middleware(UploadSizeLimitMiddleware, max_bytes=settings.UPLOAD_MAX_BYTES)
+
+    # Metrics and tracing
+    setup_telemetry(app)
 
     # Exception handlers
     app.add_exception_handler(HTTPException, http_exception_handler)
@@ -22,4 +64,4 @@ app = create_app()
 if __name__ == "__main__":
     import uvicorn
     logger.info("Starting FastAPI application with Uvicorn.")
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
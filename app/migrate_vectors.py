@@ -0,0 +1,22 @@
+"""
+One-off migration for vector stores written before chunk text was stored
+as the vector's document instead of a `chunk_text` metadata field.
+
+Retrieval still reads such vectors (through an extra lookup per query that
+hits them), so the app keeps working while this runs:
+
+    python -m app.migrate_vectors
+"""
+import argparse
+from app.logging_config import logger
+from app.services.vector_store import migrate_documents
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000, help="Vectors read per request while scanning.")
+    args = parser.parse_args()
+    migrate_documents(args.batch_size)
+    logger.complete()
+
+if __name__ == "__main__":
+    main()
@@ -16,6 +16,10 @@ class Document(Base):
     title = Column(String, nullable=False)
     file_path = Column(String, nullable=False)
     is_processed = Column(Boolean, default=False, nullable=False)
+    content_hash = Column(String(64), unique=True, index=True, nullable=True)  # SHA-256 of the uploaded file
+    # Ingestion job currently working on the document, see app/services/document_claims.py
+    claimed_by = Column(String(32), nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
     pages = relationship("DocumentPage", back_populates="document")
 
 class DocumentPage(Base):
@@ -24,5 +28,6 @@ class DocumentPage(Base):
     document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
     page_number = Column(Integer, nullable=False)
     content = Column(Text, nullable=False)
+    content_hash = Column(String(64), nullable=True)  # SHA-256 of `content`, to re-index only changed pages
     is_processed = Column(Boolean, default=False, nullable=False)
     document = relationship("Document", back_populates="pages")
\ No newline at end of file
@@ -1,102 +1,379 @@
-from fastapi import APIRouter, File, UploadFile, Form, Depends, HTTPException
+from fastapi import APIRouter, File, UploadFile, Form, Depends, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+import hashlib
 import os
+from typing import Optional
 from uuid import uuid4
-from app.database import get_db
-from app.models import Document
-from app.schemas import DocumentResponse
-from sqlalchemy.orm import Session
-from app.services.pdf_processor import process_document
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.database import get_async_db
+from app.models import Document, DocumentPage
+from app.schemas import CompactionResponse, DocumentStatusResponse
+from app.services.compaction import run_compaction
+from app.services.document_claims import is_busy
+from app.services.ingestion_queue import enqueue_document, get_job
+from app.services.semantic_cache import food_answer_cache
+from app.services.vector_store import delete_vectors, notify_changed
+from app.utils.telemetry import stage
 from loguru import logger
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 
 @router.post(
     "",
-    response_model=DocumentResponse,
-    summary="Upload and process a PDF document",
+    response_model=DocumentStatusResponse,
+    status_code=202,
+    summary="Upload a PDF document for processing",
     description=(
-        "Uploads a PDF file, stores it, and initiates a processing pipeline. "
-        "This pipeline extracts the PDF pages, chunks content, obtains embeddings, "
-        "and stores vector data in ChromaDB for RAG."
+        "Uploads a PDF file, stores it, and queues it for background processing. "
+        "The pipeline extracts the PDF pages, chunks content, obtains embeddings, "
+        "and stores vector data in ChromaDB for RAG. Poll `GET /documents/{id}` for progress."
     ),
     responses={
         200: {
-            "description": "Successfully uploaded and processed the document. Returns processed document info."
+            "description": "The same file was uploaded before. Returns the existing document and its status."
+        },
+        202: {
+            "description": "Successfully uploaded and queued the document. Returns the document ID and job status."
         },
         400: {"description": "Invalid file or data provided."},
+        413: {"description": "File exceeds `UPLOAD_MAX_BYTES`."},
         500: {"description": "Internal server error during file handling or processing."}
     }
 )
-@logger.catch
-def upload_document(
+@logger.catch(exclude=HTTPException, reraise=True)
+async def upload_document(
+    response: Response,
     title: str = Form(..., description="Title of the document being uploaded"),
     file: UploadFile = File(..., description="PDF file to be uploaded"),
-    db: Session = Depends(get_db)
-) -> DocumentResponse:
+    db: AsyncSession = Depends(get_async_db)
+) -> DocumentStatusResponse:
     """
     Endpoint: **Upload Document**
 
     - **Form Data**:
         - `title`: A string representing the document's title.
         - `file`: The PDF file upload.
-    - **Response**: `DocumentResponse` with the document’s metadata.
+    - **Response**: `DocumentStatusResponse` with the document’s metadata and job status.
 
     **Processing Steps**:
-    1. Validate and save the uploaded PDF file.
-    2. Create a `Document` record in the database.
-    3. Call `process_document` to:
+    1. Validate the upload and stream it to disk, hashing it on the way.
+    2. If a byte-identical PDF was uploaded before, drop the new copy and
+       return the existing document (`200`, `deduplicated: true`).
+    3. Otherwise create a `Document` record and queue it for the background
+       ingestion workers, which:
        - Extract pages
        - Chunk text
        - Embed with OpenAI embeddings
        - Store vectors in ChromaDB
-    4. Mark document as processed
+       - Mark pages and finally the document as processed
 
     **Constraints**:
     - Only PDF files are supported.
-    - Large PDF files might require more time to process.
+    - Files larger than `UPLOAD_MAX_BYTES` are rejected with `413`.
+    - Large PDF files might require more time to process; poll `GET /documents/{id}`.
     """
     logger.info(f"Received document upload request: Title='{title}', Filename='{file.filename}'")
+    file_path, content_hash = await _store_upload(file)
+
+    existing = await db.scalar(select(Document).where(Document.content_hash == content_hash))
+    if existing is None:
+        # Create Document record
+        try:
+            doc = Document(title=title, file_path=file_path, is_processed=False, content_hash=content_hash)
+            db.add(doc)
+            with stage("db_commit"):
+                await db.commit()
+            logger.debug(f"Created Document record with ID: {doc.id}")
+        except IntegrityError:
+            # The same file was uploaded concurrently and won the insert
+            await db.rollback()
+            existing = await db.scalar(select(Document).where(Document.content_hash == content_hash))
+        except Exception as e:
+            os.remove(file_path)
+            logger.exception("Failed to create Document record in database.")
+            raise HTTPException(status_code=500, detail="Failed to create Document record.")
+
+    if existing is not None:
+        os.remove(file_path)
+        logger.info(f"Upload matches document ID: {existing.id}, skipping ingestion.")
+        if not existing.is_processed and settings.INGESTION_IN_PROCESS:
+            # Picks up documents whose earlier job failed; no-op while one is running
+            enqueue_document(existing.id)
+        response.status_code = 200
+        return await _document_status(db, existing, deduplicated=True)
+
+    # Queue the document for background processing, unless a dedicated
+    # ingestion worker picks it up from the database
+    if settings.INGESTION_IN_PROCESS:
+        enqueue_document(doc.id)
+
+    return await _document_status(db, doc)
+
+async def _store_upload(file: UploadFile):
+    """
+    Validate a PDF upload and stream it to a new file under `UPLOAD_DIR`.
+    Returns (file path, sha256 hex digest).
+    """
     # Validate file type
     if not file.filename.lower().endswith('.pdf'):
         logger.error("Uploaded file is not a PDF.")
         raise HTTPException(status_code=400, detail="Only PDF files are supported.")
 
-    # Save file locally
+    # Stream the file to disk
     file_id = str(uuid4())
     file_ext = os.path.splitext(file.filename)[1]
-    upload_dir = "./uploaded_docs"
-    os.makedirs(upload_dir, exist_ok=True)
-    file_path = os.path.join(upload_dir, f"{file_id}{file_ext}")
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    file_path = os.path.join(settings.UPLOAD_DIR, f"{file_id}{file_ext}")
     try:
-        with open(file_path, "wb") as f:
-            f.write(file.file.read())
-        logger.info(f"Saved uploaded file to {file_path}")
+        with stage("upload_save"):
+            content_hash, size = await run_in_threadpool(_save_upload, file.file, file_path)
+        logger.info(f"Saved uploaded file ({size} bytes) to {file_path}")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Failed to save uploaded file: {e}")
         raise HTTPException(status_code=500, detail="Failed to save the uploaded file.")
+    return file_path, content_hash
 
-    # Create Document record
+def _save_upload(source, file_path: str):
+    """
+    Copy an upload to `file_path` in `UPLOAD_CHUNK_SIZE` pieces, hashing it
+    along the way. Returns (sha256 hex digest, size). Raises 413 and removes
+    the partial file once `UPLOAD_MAX_BYTES` is exceeded.
+    """
+    hasher = hashlib.sha256()
+    size = 0
     try:
-        doc = Document(title=title, file_path=file_path, is_processed=False)
-        db.add(doc)
-        db.commit()
-        db.refresh(doc)
-        logger.debug(f"Created Document record with ID: {doc.id}")
-    except Exception as e:
-        logger.exception("Failed to create Document record in database.")
-        raise HTTPException(status_code=500, detail="Failed to create Document record.")
+        with open(file_path, "wb") as f:
+            while chunk := source.read(settings.UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > settings.UPLOAD_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"File exceeds the maximum upload size of {settings.UPLOAD_MAX_BYTES} bytes.")
+                hasher.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(file_path)
+        raise
+    return hasher.hexdigest(), size
+
+@router.get(
+    "/{document_id}",
+    response_model=DocumentStatusResponse,
+    summary="Get a document and its processing progress",
+    responses={
+        200: {"description": "Document metadata with processing status and page progress."},
+        404: {"description": "Document not found."}
+    }
+)
+async def get_document(
+    document_id: int,
+    db: AsyncSession = Depends(get_async_db)
+) -> DocumentStatusResponse:
+    """
+    Endpoint: **Get Document**
+
+    Returns the document with its ingestion status (`queued`, `processing`,
+    `completed`, `failed` or `pending` when no worker has picked it up yet)
+    and the number of pages processed out of the total extracted so far.
+    """
+    doc = await db.get(Document, document_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    return await _document_status(db, doc)
+
+@router.put(
+    "/{document_id}",
+    response_model=DocumentStatusResponse,
+    status_code=202,
+    summary="Replace a document's PDF and re-index what changed",
+    responses={
+        200: {"description": "The file is identical to the current one and the title is unchanged; nothing to re-index."},
+        202: {"description": "The document was updated and queued for re-indexing."},
+        400: {"description": "Invalid file or data provided."},
+        404: {"description": "Document not found."},
+        409: {"description": "The document is being processed, or the file belongs to another document."},
+        413: {"description": "File exceeds `UPLOAD_MAX_BYTES`."}
+    }
+)
+@logger.catch(exclude=HTTPException, reraise=True)
+async def update_document(
+    document_id: int,
+    response: Response,
+    title: Optional[str] = Form(None, description="New title; the current one is kept when omitted"),
+    file: UploadFile = File(..., description="Revised PDF file"),
+    db: AsyncSession = Depends(get_async_db)
+) -> DocumentStatusResponse:
+    """
+    Endpoint: **Update Document**
+
+    Replaces the document's file (and optionally its title) and queues it
+    for re-indexing under the same ID. Re-indexing hashes every page and
+    chunk: unchanged pages are skipped, only changed chunks are embedded
+    and upserted, and vectors of chunks or pages that disappeared are
+    deleted. A new title re-writes every chunk's metadata, which costs no
+    new embeddings when the embedding cache is enabled.
+    """
+    doc = await db.get(Document, document_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    _ensure_idle(doc)
 
-    # Process the document
+    file_path, content_hash = await _store_upload(file)
     try:
-        process_document(db, doc)
-        logger.info(f"Processed document ID: {doc.id} successfully.")
-    except Exception as e:
-        logger.exception(f"Failed to process document ID: {doc.id}.")
-        raise HTTPException(status_code=500, detail="Failed to process the document.")
+        # Checked again with the row locked: an ingestion job can't claim the
+        # document between this check and the commit below
+        doc = await _lock_idle(db, document_id)
+    except HTTPException:
+        os.remove(file_path)
+        raise
+    title_changed = title is not None and title != doc.title
+    if content_hash == doc.content_hash:
+        os.remove(file_path)
+        if not title_changed:
+            response.status_code = 200
+            return await _document_status(db, doc)
+        file_path = doc.file_path
+    elif await db.scalar(select(Document.id).where(Document.content_hash == content_hash)) is not None:
+        os.remove(file_path)
+        raise HTTPException(status_code=409, detail="This file was uploaded as another document.")
+
+    old_path = doc.file_path
+    try:
+        doc.file_path = file_path
+        doc.content_hash = content_hash
+        doc.is_processed = False
+        if title_changed:
+            doc.title = title
+            # Every chunk's metadata carries the title, so revisit every page
+            await db.execute(update(DocumentPage).where(DocumentPage.document_id == document_id).values(is_processed=False))
+        with stage("db_commit"):
+            await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        os.remove(file_path)
+        raise HTTPException(status_code=409, detail="This file was uploaded as another document.")
+    if old_path != file_path:
+        _remove_file(old_path)
+    logger.info(f"Updated document ID: {document_id}, queued for re-indexing.")
+
+    if settings.INGESTION_IN_PROCESS:
+        enqueue_document(document_id)
+    return await _document_status(db, doc)
+
+@router.delete(
+    "/{document_id}",
+    status_code=204,
+    summary="Delete a document and its vectors",
+    responses={
+        204: {"description": "The document, its pages, vectors and file were deleted."},
+        404: {"description": "Document not found."},
+        409: {"description": "The document is being processed."}
+    }
+)
+@logger.catch(exclude=HTTPException, reraise=True)
+async def delete_document(
+    document_id: int,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Endpoint: **Delete Document**
+
+    Deletes the `Document` and its `DocumentPage` rows, then its vectors
+    with a `document_id` metadata filter, and finally the stored file.
+    Vectors that can't be deleted right away are removed by the next
+    compaction.
+    """
+    doc = await _lock_idle(db, document_id)
+    file_path = doc.file_path
+    await db.execute(delete(DocumentPage).where(DocumentPage.document_id == document_id))
+    await db.execute(delete(Document).where(Document.id == document_id))
+    with stage("db_commit"):
+        await db.commit()
+    try:
+        await run_in_threadpool(delete_vectors, where={"document_id": document_id})
+        food_answer_cache.invalidate()
+        await run_in_threadpool(notify_changed)
+    except Exception:
+        logger.exception(f"Failed to delete vectors of document ID: {document_id}; compaction will remove them.")
+    _remove_file(file_path)
+    logger.info(f"Deleted document ID: {document_id}.")
+    return Response(status_code=204)
+
+@router.post(
+    "/compact",
+    response_model=CompactionResponse,
+    summary="Remove orphaned vectors and pages",
+    responses={200: {"description": "Counts of what the compaction pass removed."}}
+)
+async def compact_documents() -> CompactionResponse:
+    """
+    Endpoint: **Compact**
+
+    Runs one compaction pass now instead of waiting for the periodic one
+    (`COMPACTION_INTERVAL_SECONDS`): deletes `DocumentPage` rows and
+    vectors left without a document or page, then lets the vector backend
+    reclaim the space of deleted vectors.
+    """
+    return CompactionResponse(**await run_in_threadpool(run_compaction))
+
+def _ensure_idle(doc: Document):
+    # Ingestion jobs in any process claim the document's row while they run
+    if is_busy(doc):
+        raise HTTPException(status_code=409, detail="The document is being processed; try again once it is done.")
+
+async def _lock_idle(db: AsyncSession, document_id: int) -> Document:
+    """
+    Load the document with its row locked until the session commits or
+    rolls back, so no ingestion job can claim it meanwhile. Raises 404 when
+    it doesn't exist and 409 when a job holds it.
+    """
+    doc = await db.scalar(
+        select(Document).where(Document.id == document_id).with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    _ensure_idle(doc)
+    return doc
+
+def _remove_file(file_path: str):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        logger.exception(f"Failed to remove file {file_path}.")
+
+async def _document_status(db: AsyncSession, doc: Document, deduplicated: bool = False) -> DocumentStatusResponse:
+    total_pages, pages_processed = (await db.execute(
+        select(
+            func.count(DocumentPage.id),
+            func.count(DocumentPage.id).filter(DocumentPage.is_processed.is_(True))
+        ).where(DocumentPage.document_id == doc.id)
+    )).one()
+
+    job = get_job(doc.id)
+    if doc.is_processed:
+        status, error = "completed", None
+    elif is_busy(doc):
+        # Claimed by an ingestion job, in this process or another one
+        status, error = "processing", None
+    elif job:
+        status, error = job["status"], job["error"]
+    else:
+        status, error = "pending", None
 
-    return DocumentResponse(
+    return DocumentStatusResponse(
         id=doc.id,
         title=doc.title,
         file_path=doc.file_path,
-        is_processed=doc.is_processed
+        is_processed=doc.is_processed,
+        status=status,
+        pages_processed=pages_processed,
+        total_pages=total_pages,
+        error=error,
+        deduplicated=deduplicated
     )
\ No newline at end of file
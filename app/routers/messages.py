@@ -1,13 +1,19 @@
+import time
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.schemas import MessageCreate, MessageResponse
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db, AsyncSessionLocal
+from app.schemas import MessageCreate, MessageResponse, MessageBatchCreate, MessageBatchItem, MessageBatchResponse
 from app.models import Message
-from app.services.llm_classifier import classify_message
-from app.services.llm_food_rag import generate_food_answer
-from app.services.llm_weather import generate_weather_answer
-from app.services.llm_ooc import generate_ooc_answer
+from app.services.speculation import classify_with_speculation
+from app.services.message_batch import answer_messages
+from app.services.llm_food_rag import generate_food_answer, stream_food_answer
+from app.services.llm_weather import generate_weather_answer, stream_weather_answer
+from app.services.llm_ooc import generate_ooc_answer, stream_ooc_answer
+from app.services.vector_store import scope_filter
 from app.services.weather_service import get_weather_for_newyork
+from app.utils.streaming import sse_event
+from app.utils.telemetry import stage
 from loguru import logger
 
 router = APIRouter(prefix="/messages", tags=["messages"])
@@ -30,18 +36,20 @@ router = APIRouter(prefix="/messages", tags=["messages"])
         500: {"description": "Internal server error."}
     }
 )
-def create_message(
+async def create_message(
     msg_in: MessageCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> MessageResponse:
     """
     Endpoint: **Create Message**
 
-    - **Request Body**: `MessageCreate` with user content.
+    - **Request Body**: `MessageCreate` with user content, and optionally
+      `document_ids` / `titles` to answer food queries from those documents only.
     - **Response**: `MessageResponse` representing the newly created AI response.
     
     This endpoint handles:
-    1. **Storing the user message** in the database.
+    1. **Storing the user message** in the database, so it is kept even
+       when no answer can be generated.
     2. **Classification** of the user content (food vs. weather).
     3. **Food Query**: Retrieval-Augmented Generation (RAG) with llama-3.3-70b on Groq.
     4. **Weather Query**: Fetch OpenWeather data for New York, summarized by GPT-4o.
@@ -52,36 +60,38 @@ def create_message(
         # Store user message
         user_msg = Message(is_ai=False, content=msg_in.content)
         db.add(user_msg)
-        db.commit()
-        db.refresh(user_msg)
-        logger.info(f"Stored user message with ID: {user_msg.id}")
+        with stage("db_commit"):
+            await db.commit()
+        logger.info("Stored user message with ID: {}", user_msg.id)
 
-        # Classify the message
-        classification = classify_message(user_msg.content)
-        logger.info(f"Message classified as: {classification}")
+        # Classify the message (retrieval may already be running speculatively)
+        where = scope_filter(msg_in.document_ids, msg_in.titles)
+        classification, prepared, weather_data = await classify_with_speculation(user_msg.content, where)
+        logger.info("Message classified as: {}", classification)
 
         # Generate response based on classification
         if classification == "food":
-            logger.info("Generating response for food query.")
-            answer = generate_food_answer(user_msg.content)
+            logger.debug("Generating response for food query.")
+            answer = await generate_food_answer(user_msg.content, prepared=prepared, where=where)
         elif classification == "other":
-            logger.info("Generating response for out-of-classification query.")
-            answer = generate_ooc_answer(user_msg.content)
+            logger.debug("Generating response for out-of-classification query.")
+            answer = await generate_ooc_answer(user_msg.content)
         else:  # weather
-            logger.info("Generating response for weather query.")
-            weather_data = get_weather_for_newyork()
+            logger.debug("Generating response for weather query.")
+            weather_data = weather_data or await get_weather_for_newyork()
             if not weather_data:
                 logger.warning("Weather data is empty.")
                 answer = "I'm sorry, I can't fetch the weather right now."
             else:
-                answer = generate_weather_answer(weather_data)
+                answer = await generate_weather_answer(weather_data)
 
-        # Store AI response
+        # Store AI response; the session doesn't expire it on commit, so no
+        # refresh is needed
         ai_msg = Message(is_ai=True, content=answer)
         db.add(ai_msg)
-        db.commit()
-        db.refresh(ai_msg)
-        logger.info(f"Stored AI response with ID: {ai_msg.id}")
+        with stage("db_commit"):
+            await db.commit()
+        logger.info("Stored AI response with ID: {}", ai_msg.id)
 
         logger.info("Responding to message request successfully.")
         return MessageResponse(
@@ -92,4 +102,179 @@ def create_message(
         )
     except Exception as e:
         logger.exception("Failed to handle message request.")
-        raise HTTPException(status_code=500, detail="Internal server error.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error.")
+
+async def _single(text: str):
+    yield text
+
+@router.post(
+    "/stream",
+    summary="Create a new user message and stream the AI response",
+    description=(
+        "Same pipeline as `POST /messages`, but the AI response is streamed as "
+        "Server-Sent Events while the model generates it. Each `token` event "
+        "carries a piece of text; the final `done` event carries the stored AI message."
+    ),
+    responses={
+        200: {
+            "description": "An `text/event-stream` of `token` events followed by one `done` (or `error`) event.",
+            "content": {"text/event-stream": {}}
+        },
+        400: {"description": "Invalid input data."},
+        500: {"description": "Internal server error."}
+    }
+)
+async def create_message_stream(
+    msg_in: MessageCreate,
+    db: AsyncSession = Depends(get_async_db)
+) -> StreamingResponse:
+    """
+    Endpoint: **Create Message (streaming)**
+
+    - **Request Body**: `MessageCreate` with user content.
+    - **Response**: `text/event-stream`:
+        - `event: token` with `{"content": "..."}` for each piece of the answer.
+        - `event: done` with the stored `MessageResponse` once the answer is complete.
+        - `event: error` if the answer could not be generated or stored.
+
+    The user message is stored and classified before streaming starts; the
+    AI message is stored once the stream ends. When the stream fails
+    midway, the user message is kept and no AI message is stored.
+    """
+    logger.info("Received new streaming message request.")
+    started = time.perf_counter()
+    try:
+        # Store user message
+        user_msg = Message(is_ai=False, content=msg_in.content)
+        db.add(user_msg)
+        with stage("db_commit"):
+            await db.commit()
+        logger.info("Stored user message with ID: {}", user_msg.id)
+
+        # Classify the message
+        where = scope_filter(msg_in.document_ids, msg_in.titles)
+        classification, prepared, weather_data = await classify_with_speculation(user_msg.content, where)
+        logger.info("Message classified as: {}", classification)
+
+        if classification == "food":
+            tokens = stream_food_answer(user_msg.content, prepared=prepared, where=where)
+        elif classification == "other":
+            tokens = stream_ooc_answer(user_msg.content)
+        else:  # weather
+            weather_data = weather_data or await get_weather_for_newyork()
+            if not weather_data:
+                logger.warning("Weather data is empty.")
+                tokens = _single("I'm sorry, I can't fetch the weather right now.")
+            else:
+                tokens = stream_weather_answer(weather_data)
+    except Exception as e:
+        logger.exception("Failed to handle streaming message request.")
+        raise HTTPException(status_code=500, detail="Internal server error.")
+
+    async def event_stream():
+        parts = []
+        try:
+            async for text in tokens:
+                if not parts:
+                    logger.info("Time to first token: {:.0f} ms", (time.perf_counter() - started) * 1000)
+                parts.append(text)
+                yield sse_event("token", {"content": text})
+        except Exception:
+            # The response has started, so the failure can only be reported in-stream
+            logger.exception("Failed to stream the AI response.")
+            yield sse_event("error", {"detail": "Failed to generate the AI response."})
+            return
+
+        # The request-scoped session is closed once the response starts, so
+        # the AI message gets its own session
+        try:
+            async with AsyncSessionLocal() as stream_db:
+                ai_msg = Message(is_ai=True, content="".join(parts))
+                stream_db.add(ai_msg)
+                with stage("db_commit"):
+                    await stream_db.commit()
+            logger.info("Stored streamed AI response with ID: {}", ai_msg.id)
+            yield sse_event("done", MessageResponse(
+                id=ai_msg.id,
+                is_ai=ai_msg.is_ai,
+                content=ai_msg.content,
+                timestamp=ai_msg.timestamp
+            ).model_dump(mode="json"))
+        except Exception:
+            logger.exception("Failed to store streamed AI response.")
+            yield sse_event("error", {"detail": "Failed to store the AI response."})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post(
+    "/batch",
+    response_model=MessageBatchResponse,
+    summary="Create and answer many user messages at once",
+    description=(
+        "Stores and answers a list of user messages. Classification, query embedding "
+        "and vector search are coalesced across the batch and generation runs under a "
+        "concurrency cap. Results keep the input order and report errors per item."
+    ),
+    responses={
+        200: {"description": "One result per input message, each with the AI message or an error."},
+        422: {"description": "Invalid input data (e.g. an empty batch or more than `MESSAGE_BATCH_MAX_SIZE` messages)."},
+        500: {"description": "Internal server error."}
+    }
+)
+async def create_messages_batch(
+    batch_in: MessageBatchCreate,
+    db: AsyncSession = Depends(get_async_db)
+) -> MessageBatchResponse:
+    """
+    Endpoint: **Create Message Batch**
+
+    - **Request Body**: `MessageBatchCreate` with a list of `MessageCreate`.
+    - **Response**: `MessageBatchResponse` with one `MessageBatchItem` per
+      input message, in input order. Items that failed carry an `error`
+      instead of a `message`.
+
+    The user messages are stored before any answer is generated, then the
+    AI messages of the answered items in one transaction.
+
+    Meant for offline evaluation and bulk imports; interactive clients should
+    use `POST /messages` or `POST /messages/stream`.
+    """
+    contents = [msg.content for msg in batch_in.messages]
+    logger.info("Received batch of {} messages.", len(contents))
+    try:
+        # Store the user messages first, so they are kept even when the
+        # answers can't be generated
+        db.add_all([Message(is_ai=False, content=content) for content in contents])
+        with stage("db_commit"):
+            await db.commit()
+
+        answers = await answer_messages(contents, [scope_filter(msg.document_ids, msg.titles) for msg in batch_in.messages])
+
+        # AI responses in input order, in one transaction
+        ai_msgs = {i: Message(is_ai=True, content=answer) for i, (answer, _) in enumerate(answers) if answer is not None}
+        db.add_all(ai_msgs.values())
+        with stage("db_commit"):
+            await db.commit()
+        results = [
+            MessageBatchItem(
+                index=i,
+                message=MessageResponse(
+                    id=ai_msgs[i].id,
+                    is_ai=ai_msgs[i].is_ai,
+                    content=ai_msgs[i].content,
+                    timestamp=ai_msgs[i].timestamp
+                ) if i in ai_msgs else None,
+                error=error
+            )
+            for i, (_, error) in enumerate(answers)
+        ]
+        logger.info("Answered batch of {} messages, {} failed.", len(contents), len(contents) - len(ai_msgs))
+        return MessageBatchResponse(results=results)
+    except Exception as e:
+        logger.exception("Failed to handle message batch request.")
+        raise HTTPException(status_code=500, detail="Internal server error.")
@@ -0,0 +1,49 @@
+from fastapi import APIRouter
+from app.services.semantic_cache import food_answer_cache
+from app.services.container import services
+from app.services.weather_service import weather_cache
+from app.services.llm_weather import summary_cache
+from app.services.local_classifier import agreement
+from app.services.speculation import speculation_stats
+from app.services.context_builder import context_stats
+from app.services import llm_client
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+@router.get(
+    "",
+    summary="Runtime statistics",
+    description="Returns hit-rate statistics for the in-process caches, classifier fast-path, speculative execution, RAG context and LLM call counters.",
+)
+def get_stats() -> dict:
+    """
+    Endpoint: **Stats**
+
+    - **semantic_cache**: size, hits, misses, hit rate, evictions and
+      invalidations of the food answer cache.
+    - **embedding_cache**: hits, misses and hit rate of the persistent
+      embedding cache.
+    - **weather_cache** / **weather_summary_cache**: hits, stale hits,
+      misses and coalesced requests of the OpenWeather and summary caches.
+    - **classifier**: local fast-path vs LLM fallback counts and the
+      local/LLM agreement rate by confidence band.
+    - **speculation**: speculative retrieval/weather work used vs wasted,
+      latency saved and upstream time thrown away.
+    - **rag_context**: prompt tokens per food request, chunks used, and
+      candidates dropped as duplicates, over budget or too distant.
+    - **llm**: circuit state and in-flight calls per provider, latency
+      percentiles per model, and hedges/failovers per route.
+    - **services**: which shared clients and stores have been created and
+      how long each took to initialize.
+    """
+    return {
+        "semantic_cache": food_answer_cache.stats(),
+        "embedding_cache": services.embedding_cache.stats() if services.embedding_cache else {"enabled": False},
+        "weather_cache": weather_cache.stats(),
+        "weather_summary_cache": summary_cache.stats(),
+        "classifier": agreement.stats(),
+        "speculation": speculation_stats.stats(),
+        "rag_context": context_stats.stats(),
+        "llm": llm_client.stats(),
+        "services": services.stats(),
+    }
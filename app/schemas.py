@@ -1,9 +1,13 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from app.config import settings
 from datetime import datetime
 
 class MessageCreate(BaseModel):
     content: str
+    # Restrict food retrieval to these documents and/or titles
+    document_ids: Optional[List[int]] = None
+    titles: Optional[List[str]] = None
 
 class MessageResponse(BaseModel):
     id: int
@@ -14,6 +18,17 @@ class MessageResponse(BaseModel):
     class Config:
         orm_mode = True
 
+class MessageBatchCreate(BaseModel):
+    messages: List[MessageCreate] = Field(..., min_length=1, max_length=settings.MESSAGE_BATCH_MAX_SIZE)
+
+class MessageBatchItem(BaseModel):
+    index: int
+    message: Optional[MessageResponse] = None
+    error: Optional[str] = None
+
+class MessageBatchResponse(BaseModel):
+    results: List[MessageBatchItem]
+
 class DocumentCreate(BaseModel):
     title: str
 
@@ -24,4 +39,16 @@ class DocumentResponse(BaseModel):
     is_processed: bool
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class DocumentStatusResponse(DocumentResponse):
+    status: str
+    pages_processed: int
+    total_pages: int
+    error: Optional[str] = None
+    deduplicated: bool = False  # True when the upload matched an existing document
+
+class CompactionResponse(BaseModel):
+    orphan_pages: int
+    orphan_vectors: int
+    freed_slots: int
@@ -0,0 +1,94 @@
+import asyncio
+from loguru import logger
+from sqlalchemy import delete, select
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Document, DocumentPage
+from app.services.container import services
+from app.services.semantic_cache import food_answer_cache
+from app.services.vector_store import delete_vectors, get_vectors, notify_changed
+from app.utils.telemetry import timed
+
+# Compaction removes what deletions and re-indexing can leave behind when
+# they are interrupted or race each other:
+# - DocumentPage rows whose document no longer exists,
+# - vectors whose document no longer exists,
+# - vectors of processed documents whose page row no longer exists,
+# then lets the vector backend reclaim the space of deleted vectors.
+# Documents still being ingested are left alone.
+
+def _processed_pages(db, document_ids) -> set:
+    return set(db.execute(
+        select(DocumentPage.document_id, DocumentPage.page_number)
+        .join(Document, Document.id == DocumentPage.document_id)
+        .where(Document.is_processed.is_(True), Document.id.in_(document_ids))
+    ).all())
+
+@timed("compaction")
+def compact(db) -> dict:
+    """
+    Run one compaction pass. Returns how many orphaned pages and vectors
+    were deleted and how many vector slots the backend freed.
+    """
+    orphan_pages = db.execute(
+        delete(DocumentPage).where(DocumentPage.document_id.not_in(select(Document.id)))
+    ).rowcount
+    db.commit()
+
+    documents = dict(db.execute(select(Document.id, Document.is_processed)).all())
+    pages = _processed_pages(db, [document_id for document_id, is_processed in documents.items() if is_processed])
+    orphans = {}  # vector id -> (document_id, page_number)
+    offset = 0
+    while True:
+        batch = get_vectors(limit=settings.COMPACTION_BATCH_SIZE, offset=offset)
+        if not batch["ids"]:
+            break
+        for id, metadata in zip(batch["ids"], batch["metadatas"]):
+            key = (metadata.get("document_id"), metadata.get("page_number"))
+            if key[0] not in documents or documents[key[0]] and key not in pages:
+                orphans[id] = key
+        offset += len(batch["ids"])
+
+    if orphans:
+        # A document may have been re-uploaded or re-created during the
+        # scan; only delete what is still orphaned now
+        document_ids = {document_id for document_id, _ in orphans.values()}
+        current = dict(db.execute(select(Document.id, Document.is_processed).where(Document.id.in_(document_ids))).all())
+        pages = _processed_pages(db, list(current))
+        orphans = [
+            id for id, (document_id, page_number) in orphans.items()
+            if document_id not in current or current[document_id] and (document_id, page_number) not in pages
+        ]
+    if orphans:
+        delete_vectors(ids=orphans)
+        food_answer_cache.invalidate()
+        notify_changed()
+    freed = services.vector_backend.compact()
+
+    result = {"orphan_pages": orphan_pages, "orphan_vectors": len(orphans), "freed_slots": freed}
+    logger.info("Compaction finished: {}", result)
+    return result
+
+def run_compaction() -> dict:
+    """
+    Run `compact` with its own database session.
+    """
+    db = SessionLocal()
+    try:
+        return compact(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+async def compact_periodically(interval: float):
+    """
+    Run a compaction pass every `interval` seconds until cancelled.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(run_compaction)
+        except Exception:
+            logger.exception("Compaction failed.")
@@ -0,0 +1,156 @@
+import time
+from threading import RLock
+import httpx
+from loguru import logger
+from app.config import settings
+
+class ServiceContainer:
+    """
+    Process-wide clients and stores, created on first use instead of at
+    import time, so importing the app needs no credentials and starts fast.
+
+    There is one HTTP connection pool per upstream (OpenAI async, OpenAI
+    sync for the ingestion threads, Groq, OpenWeather), sized and kept alive
+    by the `HTTP_*` settings and shared by every module talking to it.
+    `warm_up()` creates everything up front (the app lifespan calls it when
+    `SERVICES_WARM_UP` is set) and `aclose()` closes the pools on shutdown.
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self._instances = {}
+        self._http_clients = []
+        self.init_seconds = {}
+
+    def _get(self, name: str, factory):
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._instances:
+                started = time.perf_counter()
+                self._instances[name] = factory()
+                self.init_seconds[name] = time.perf_counter() - started
+                logger.info("Initialized {} in {:.0f} ms.", name, self.init_seconds[name] * 1000)
+            return self._instances[name]
+
+    def _http(self, client_class, read_timeout: float):
+        client = client_class(
+            timeout=httpx.Timeout(read_timeout, connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+        )
+        self._http_clients.append(client)
+        return client
+
+    @property
+    def openai(self):
+        """
+        Sync OpenAI client, for the ingestion threads.
+        """
+        def create():
+            import openai
+            return openai.OpenAI(
+                api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL,
+                http_client=self._http(httpx.Client, settings.HTTP_READ_TIMEOUT_SECONDS),
+            )
+        return self._get("openai", create)
+
+    @property
+    def openai_async(self):
+        """
+        Async OpenAI client for the request path (embeddings and chat).
+        """
+        def create():
+            import openai
+            return openai.AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL,
+                http_client=self._http(httpx.AsyncClient, settings.HTTP_READ_TIMEOUT_SECONDS),
+            )
+        return self._get("openai_async", create)
+
+    @property
+    def groq_async(self):
+        def create():
+            from groq import AsyncGroq
+            return AsyncGroq(
+                api_key=settings.GROQ_API_KEY, base_url=settings.GROQ_BASE_URL,
+                http_client=self._http(httpx.AsyncClient, settings.HTTP_READ_TIMEOUT_SECONDS),
+            )
+        return self._get("groq_async", create)
+
+    @property
+    def weather_http(self) -> httpx.AsyncClient:
+        return self._get("weather_http", lambda: self._http(httpx.AsyncClient, 5))
+
+    @property
+    def vector_backend(self):
+        def create():
+            from app.services.vector_store import create_backend
+            return create_backend()
+        return self._get("vector_backend", create)
+
+    @property
+    def embedding_cache(self):
+        """
+        The persistent embedding cache, or None when it is disabled.
+        """
+        def create():
+            if not settings.EMBEDDING_CACHE_ENABLED:
+                return None
+            from app.services.embedding_cache import EmbeddingCache
+            return EmbeddingCache(settings.EMBEDDING_CACHE_PATH)
+        return self._get("embedding_cache", create)
+
+    @property
+    def tokenizer(self):
+        """
+        The chunking tokenizer; loading it may read or download model files.
+        """
+        def create():
+            from app.utils.tokenization import get_tokenizer
+            return get_tokenizer()
+        return self._get("tokenizer", create)
+
+    def get(self, name: str):
+        """
+        The instance `name` if it was created already, else None.
+        """
+        return self._instances.get(name)
+
+    def warm_up(self):
+        """
+        Create every service now rather than on the first request.
+        """
+        started = time.perf_counter()
+        for name in ("openai", "openai_async", "groq_async", "weather_http", "vector_backend", "embedding_cache", "tokenizer"):
+            getattr(self, name)
+        logger.info("Services warmed up in {:.0f} ms.", (time.perf_counter() - started) * 1000)
+
+    async def aclose(self):
+        """
+        Close the connection pools; services are created again on next use.
+        """
+        with self._lock:
+            clients, self._http_clients = self._http_clients, []
+            self._instances.clear()
+        for client in clients:
+            try:
+                if isinstance(client, httpx.AsyncClient):
+                    await client.aclose()
+                else:
+                    client.close()
+            except Exception:
+                logger.exception("Failed to close HTTP client.")
+
+    def stats(self) -> dict:
+        return {
+            "initialized": sorted(self._instances),
+            "init_ms": {name: seconds * 1000 for name, seconds in self.init_seconds.items()},
+        }
+
+services = ServiceContainer()
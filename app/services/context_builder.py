@@ -0,0 +1,102 @@
+import re
+from threading import Lock
+from loguru import logger
+from app.config import settings
+from app.utils.tokenization import count_tokens
+
+_WORD = re.compile(r"\w+")
+
+def _shingles(text: str, size: int = 5) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def _similarity(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class ContextStats:
+    """
+    Per-request RAG context counters: prompt tokens, chunks used, and
+    candidates dropped as near-duplicates, over budget or too distant.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._requests = 0
+        self._no_context = 0
+        self._prompt_tokens = 0
+        self._max_prompt_tokens = 0
+        self._chunks = 0
+        self._duplicates = 0
+        self._over_budget = 0
+        self._too_distant = 0
+
+    def record(self, prompt_tokens: int, chunks: int, duplicates: int, over_budget: int, too_distant: int):
+        with self._lock:
+            self._requests += 1
+            self._prompt_tokens += prompt_tokens
+            self._max_prompt_tokens = max(self._max_prompt_tokens, prompt_tokens)
+            self._chunks += chunks
+            self._duplicates += duplicates
+            self._over_budget += over_budget
+            self._too_distant += too_distant
+
+    def record_no_context(self, too_distant: int):
+        with self._lock:
+            self._no_context += 1
+            self._too_distant += too_distant
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "skipped_no_context": self._no_context,
+                "avg_prompt_tokens": self._prompt_tokens / self._requests if self._requests else 0.0,
+                "max_prompt_tokens": self._max_prompt_tokens,
+                "avg_chunks": self._chunks / self._requests if self._requests else 0.0,
+                "dropped_duplicates": self._duplicates,
+                "dropped_over_budget": self._over_budget,
+                "dropped_too_distant": self._too_distant,
+            }
+
+context_stats = ContextStats()
+
+def build_context(texts: list, distances: list, max_tokens: int = None):
+    """
+    Pick the chunks to put in a RAG prompt from one query's search results
+    (the chunk texts and their distances).
+
+    Candidates are ranked by distance; those farther than
+    `RAG_MAX_DISTANCE` are dropped, as are near-duplicates of an already
+    picked chunk (word 5-gram Jaccard similarity of at least
+    `RAG_DEDUP_THRESHOLD`, e.g. overlapping pages or a re-uploaded PDF).
+    The rest are packed greedily into `max_tokens` (`RAG_CONTEXT_MAX_TOKENS`).
+
+    Returns (chunk_texts, dropped) where `dropped` counts candidates per
+    reason. `chunk_texts` is empty when nothing relevant was found.
+    """
+    max_tokens = max_tokens or settings.RAG_CONTEXT_MAX_TOKENS
+    dropped = {"duplicates": 0, "over_budget": 0, "too_distant": 0}
+    chunks, picked_shingles, used_tokens = [], [], 0
+    for distance, text in sorted(zip(distances, texts), key=lambda candidate: candidate[0]):
+        if settings.RAG_MAX_DISTANCE and distance > settings.RAG_MAX_DISTANCE:
+            dropped["too_distant"] += 1
+            continue
+        if not text:
+            continue
+        shingles = _shingles(text)
+        if any(_similarity(shingles, other) >= settings.RAG_DEDUP_THRESHOLD for other in picked_shingles):
+            dropped["duplicates"] += 1
+            continue
+        tokens = count_tokens(text)
+        if used_tokens + tokens > max_tokens:
+            dropped["over_budget"] += 1
+            continue
+        chunks.append(text)
+        picked_shingles.append(shingles)
+        used_tokens += tokens
+    logger.debug("Picked {} of {} candidate chunks ({} tokens), dropped {}.", len(chunks), len(texts), used_tokens, dropped)
+    return chunks, dropped
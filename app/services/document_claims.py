@@ -0,0 +1,82 @@
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+from sqlalchemy import or_, update
+from app.config import settings
+from app.models import Document
+
+# Whoever ingests a document claims its row first (`claimed_by`, refreshed in
+# `claimed_at` while the job runs), so every process can tell from the
+# database alone that the document is busy: API workers refuse to update or
+# delete it, and other ingestion workers skip it. A claim left behind by a
+# crashed process expires after INGESTION_CLAIM_TTL_SECONDS.
+
+class ClaimLostError(RuntimeError):
+    """
+    Raised when a job's claim on its document expired and was taken over,
+    or the document was deleted.
+    """
+
+def _expiry() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=settings.INGESTION_CLAIM_TTL_SECONDS)
+
+def claimable():
+    """
+    SQL condition: the document holds no live claim.
+    """
+    return or_(Document.claimed_by.is_(None), Document.claimed_at < _expiry())
+
+def is_busy(doc: Document) -> bool:
+    """
+    Whether an ingestion job holds a live claim on the loaded document.
+    """
+    return doc.claimed_by is not None and doc.claimed_at >= _expiry()
+
+class DocumentClaim:
+    """
+    One ingestion job's claim on a document, used with a sync session.
+    Every method commits, so the claim never holds the row locked.
+    """
+
+    def __init__(self, db, document_id: int):
+        self.db = db
+        self.document_id = document_id
+        self.owner = uuid4().hex
+        self._renewed_at = 0.0
+
+    def _update(self, *conditions, **values) -> bool:
+        result = self.db.execute(
+            update(Document).where(Document.id == self.document_id, *conditions)
+            .values(**values).execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+        return result.rowcount == 1
+
+    def acquire(self) -> bool:
+        """
+        Claim the document unless it holds someone else's live claim.
+        Returns False when it does, or when the document doesn't exist.
+        """
+        acquired = self._update(claimable(), claimed_by=self.owner, claimed_at=datetime.utcnow())
+        self._renewed_at = time.monotonic()
+        return acquired
+
+    def renew(self):
+        """
+        Push the claim's expiry back, at most every quarter of the TTL.
+        Raises ClaimLostError when the claim is no longer ours.
+        """
+        if time.monotonic() - self._renewed_at < settings.INGESTION_CLAIM_TTL_SECONDS / 4:
+            return
+        if not self._update(Document.claimed_by == self.owner, claimed_at=datetime.utcnow()):
+            raise ClaimLostError(f"Lost the claim on document ID: {self.document_id}.")
+        self._renewed_at = time.monotonic()
+
+    def release(self, **values):
+        """
+        Give the claim up, setting `values` on the document in the same
+        UPDATE. Raises ClaimLostError when the claim is no longer ours, in
+        which case nothing is written.
+        """
+        if not self._update(Document.claimed_by == self.owner, claimed_by=None, claimed_at=None, **values):
+            raise ClaimLostError(f"Lost the claim on document ID: {self.document_id}.")
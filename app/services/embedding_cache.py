@@ -0,0 +1,85 @@
+import hashlib
+import os
+import sqlite3
+from threading import Lock
+import numpy as np
+from app.config import settings
+from app.utils.telemetry import record_cache
+
+class EmbeddingCache:
+    """
+    Persistent content-addressed embedding cache.
+
+    Embeddings are stored in a local SQLite file as float32 blobs, keyed by
+    a SHA-256 of the model name, the requested dimensions and the text, so
+    identical text is only ever embedded once per model and size.
+
+    Reads and writes are blocking and serialized on one connection, which
+    the ingestion threads share; async callers run them in a thread.
+    """
+
+    # Stay well below SQLite's bound parameter limit
+    _LOOKUP_BATCH = 500
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = Lock()  # the connection
+        self._stats_lock = Lock()  # the counters, so stats() never waits on a write
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def key(model: str, text: str, dimensions: int = 0) -> str:
+        # The native size keeps the original key format, so existing entries stay valid
+        model = f"{model}@{dimensions}" if dimensions else model
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: list) -> dict:
+        """
+        Return a dict of key -> embedding for the keys that are cached.
+        """
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            for i in range(0, len(unique_keys), self._LOOKUP_BATCH):
+                batch = unique_keys[i:i + self._LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        hits = sum(1 for key in keys if key in found)
+        with self._stats_lock:
+            self._hits += hits
+            self._misses += len(keys) - hits
+        record_cache("embedding", "hit", hits)
+        record_cache("embedding", "miss", len(keys) - hits)
+        return found
+
+    def put_many(self, items: dict):
+        """
+        Store a dict of key -> embedding.
+        """
+        rows = [(key, np.asarray(embedding, dtype=np.float32).tobytes()) for key, embedding in items.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": settings.EMBEDDING_CACHE_ENABLED,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
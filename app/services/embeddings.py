@@ -1,22 +1,135 @@
-import openai
+import asyncio
 from app.config import settings
+from app.services.container import services
+from app.utils.tokenization import count_tokens
+from app.utils.telemetry import stage
 from loguru import logger
 
-# Initialize the OpenAI client
-client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+# OpenAI clients come from the service container: the sync one for the
+# ingestion threads, the async one for the request path
+
+# In-flight single-text embedding requests, so concurrent callers embedding
+# the same text (e.g. the classifier and speculative retrieval) share one call
+_inflight = {}
+
+def estimate_tokens(text: str) -> int:
+    """
+    Token count used to size embedding batches, from the chunking tokenizer.
+    """
+    return count_tokens(text)
+
+def iter_batches(items, max_items: int = None, max_tokens: int = None, key=None):
+    """
+    Yield (start_index, batch) pairs where each batch holds at most `max_items`
+    items and at most `max_tokens` tokens. `items` may be any iterable,
+    consumed lazily; `key` maps an item to its text (default: the item
+    itself). A single oversized item still gets its own batch.
+    """
+    max_items = max_items or settings.EMBEDDING_BATCH_SIZE
+    max_tokens = max_tokens or settings.EMBEDDING_BATCH_MAX_TOKENS
+    batch, batch_tokens, start = [], 0, 0
+    for i, item in enumerate(items):
+        tokens = estimate_tokens(key(item) if key else item)
+        if batch and (len(batch) >= max_items or batch_tokens + tokens > max_tokens):
+            yield start, batch
+            batch, batch_tokens, start = [], 0, i
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        yield start, batch
+
+def _request_params() -> dict:
+    params = {"model": settings.EMBEDDING_MODEL}
+    if settings.EMBEDDING_DIMENSIONS:
+        params["dimensions"] = settings.EMBEDDING_DIMENSIONS
+    return params
+
+def _from_cache(texts: list):
+    """
+    Look texts up in the embedding cache. Returns (embeddings, keys, misses)
+    where `embeddings` has None for every text in `misses` (a list of
+    indices into `texts`).
+    """
+    embedding_cache = services.embedding_cache
+    if embedding_cache is None:
+        return [None] * len(texts), None, list(range(len(texts)))
+    keys = [embedding_cache.key(settings.EMBEDDING_MODEL, text, settings.EMBEDDING_DIMENSIONS) for text in texts]
+    cached = embedding_cache.get_many(keys)
+    embeddings = [cached.get(key) for key in keys]
+    misses = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    return embeddings, keys, misses
+
+def _fill_misses(embeddings: list, keys: list, misses: list, fetched: list):
+    for i, embedding in zip(misses, fetched):
+        embeddings[i] = embedding
+    embedding_cache = services.embedding_cache
+    if embedding_cache is not None and misses:
+        embedding_cache.put_many({keys[i]: embeddings[i] for i in misses})
+    return embeddings
 
 def embed_text(text: str):
     """
     Generate embeddings for the given text using OpenAI's embedding API.
     """
-    logger.debug("Generating embedding for text.")
+    return embed_texts([text])[0]
+
+async def aembed_text(text: str):
+    """
+    Async variant of `embed_text` for the request path. Concurrent calls for
+    the same text share one request.
+    """
+    key = (settings.EMBEDDING_MODEL, settings.EMBEDDING_DIMENSIONS, text)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(aembed_texts([text]))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return (await asyncio.shield(task))[0]
+
+def embed_texts(texts: list):
+    """
+    Generate embeddings for a batch of texts with a single embeddings request.
+    Cached texts are served from the embedding cache and only the misses are
+    sent to the API. Results are returned in the same order as `texts`.
+    """
+    embeddings, keys, misses = _from_cache(texts)
+    if not misses:
+        logger.debug("All {} embeddings served from cache.", len(texts))
+        return embeddings
+    logger.debug("Generating embeddings for {} of {} texts.", len(misses), len(texts))
+    try:
+        with stage("ingest_embed"):
+            response = services.openai.embeddings.create(
+                input=[texts[i] for i in misses],
+                **_request_params()
+            )
+        fetched = [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+        logger.debug("Batch of {} embeddings generated successfully.", len(fetched))
+    except Exception as e:
+        logger.exception(f"Batch embedding failed: {e}")
+        raise
+    return _fill_misses(embeddings, keys, misses, fetched)
+
+async def aembed_texts(texts: list):
+    """
+    Async variant of `embed_texts` for the request path. The embedding
+    cache is blocking (and shared with the ingestion threads), so it is
+    read and written from a worker thread.
+    """
+    embeddings, keys, misses = await asyncio.to_thread(_from_cache, texts)
+    if not misses:
+        logger.debug("All {} embeddings served from cache.", len(texts))
+        return embeddings
+    logger.debug("Generating embeddings for {} of {} texts.", len(misses), len(texts))
     try:
-        response = client.embeddings.create(
-            input=text,
-            model="text-embedding-3-small"  
-        )
-        logger.debug("Embedding generated successfully.")
-        return response.data[0].embedding
+        with stage("embed"):
+            response = await services.openai_async.embeddings.create(
+                input=[texts[i] for i in misses],
+                **_request_params()
+            )
+        fetched = [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+        logger.debug("Batch of {} embeddings generated successfully.", len(fetched))
     except Exception as e:
-        logger.exception(f"Embedding failed: {e}")
-        raise
\ No newline at end of file
+        logger.exception(f"Batch embedding failed: {e}")
+        raise
+    return await asyncio.to_thread(_fill_misses, embeddings, keys, misses, fetched)
@@ -0,0 +1,114 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from loguru import logger
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Document
+from app.services.document_claims import ClaimLostError, DocumentClaim
+from app.services.pdf_processor import process_document
+
+# Bounded pool doing the heavy lifting for uploaded documents
+executor = ThreadPoolExecutor(max_workers=settings.INGESTION_WORKERS, thread_name_prefix="ingestion")
+
+# In-memory job state per document ID: queued, processing, completed or failed
+_jobs = {}
+_jobs_lock = Lock()
+
+def _set_job(document_id: int, status: str, error: str = None):
+    with _jobs_lock:
+        _jobs[document_id] = {"status": status, "error": error, "updated_at": time.monotonic()}
+
+def get_job(document_id: int):
+    """
+    Return the in-memory job state for a document, or None if this process
+    never saw a job for it.
+    """
+    with _jobs_lock:
+        return _jobs.get(document_id)
+
+def _run(document_id: int):
+    _set_job(document_id, "processing")
+    db = SessionLocal()
+    claim = DocumentClaim(db, document_id)
+    try:
+        # Loaded after the claim, so it reflects any update committed before it
+        acquired = claim.acquire()
+        doc = db.get(Document, document_id)
+        if doc is None:
+            logger.warning(f"Document ID: {document_id} no longer exists, dropping ingestion job.")
+            _set_job(document_id, "failed", "Document not found.")
+            return
+        if not acquired:
+            logger.info(f"Document ID: {document_id} is being processed by another job, skipping.")
+            _set_job(document_id, "failed", "Document is being processed by another job.")
+            return
+        process_document(db, doc, claim)
+        _set_job(document_id, "completed")
+        logger.info(f"Ingestion job for document ID: {document_id} completed.")
+    except Exception as e:
+        db.rollback()
+        _set_job(document_id, "failed", str(e))
+        logger.exception(f"Ingestion job for document ID: {document_id} failed.")
+        if not isinstance(e, ClaimLostError):
+            # Let a retry start right away rather than after the claim expires
+            try:
+                claim.release()
+            except Exception:
+                logger.exception(f"Failed to release the claim on document ID: {document_id}.")
+    finally:
+        db.close()
+
+def enqueue_document(document_id: int):
+    """
+    Schedule a document for background processing.
+    """
+    with _jobs_lock:
+        job = _jobs.get(document_id)
+        if job and job["status"] in ("queued", "processing"):
+            logger.debug(f"Document ID: {document_id} is already queued.")
+            return
+        _jobs[document_id] = {"status": "queued", "error": None, "updated_at": time.monotonic()}
+    executor.submit(_run, document_id)
+    logger.info(f"Queued document ID: {document_id} for ingestion.")
+
+def enqueue_pending() -> int:
+    """
+    Queue every unprocessed document, except those already queued here and
+    those whose job failed less than `INGESTION_RETRY_SECONDS` ago. Returns
+    the number of documents queued.
+    """
+    db = SessionLocal()
+    try:
+        pending = db.query(Document.id).filter(Document.is_processed.is_(False)).order_by(Document.id).all()
+    finally:
+        db.close()
+    queued = 0
+    now = time.monotonic()
+    for (document_id,) in pending:
+        job = get_job(document_id)
+        if job and (job["status"] in ("queued", "processing") or
+                    job["status"] == "failed" and now - job["updated_at"] < settings.INGESTION_RETRY_SECONDS):
+            continue
+        enqueue_document(document_id)
+        queued += 1
+    return queued
+
+def resume_pending():
+    """
+    Re-queue every document left unprocessed by a previous run.
+    """
+    try:
+        queued = enqueue_pending()
+    except Exception:
+        logger.exception("Failed to look up unprocessed documents.")
+        return
+    logger.info(f"Resumed {queued} unprocessed documents.")
+
+def shutdown(wait: bool = False):
+    """
+    Stop accepting work. Queued jobs are dropped and picked up again by
+    `resume_pending` on the next start; with `wait`, running jobs are
+    allowed to finish first.
+    """
+    executor.shutdown(wait=wait, cancel_futures=True)
@@ -1,11 +1,18 @@
+import asyncio
+import json
+import random
 from loguru import logger
-import openai
 from app.config import settings
+from app.utils.telemetry import stage, timed
+from app.services import llm_client
+from app.services.embeddings import aembed_text, aembed_texts
+from app.services.local_classifier import classify_by_keywords, classify_by_centroid, agreement
 
-# Initialize the OpenAI client
-client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+# Classification is on the critical path of every message, so it gets a
+# short deadline; a miss falls back to 'food' like any other failure
+route = llm_client.route("classify", settings.LLM_CLASSIFIER_MODELS, settings.LLM_CLASSIFIER_DEADLINE_SECONDS)
 
-def classify_message(content: str) -> str:
+async def classify_with_llm(content: str) -> str:
     """
     Classify the message as 'food' or 'weather' using an LLM.
     """
@@ -13,20 +20,159 @@ def classify_message(content: str) -> str:
         {"role": "system", "content": "You are a classifier that categorizes user queries into 'food' or 'weather' or 'other' just return one of those words depending on what user wants."},
         {"role": "user", "content": content}
     ]
-    logger.info(f"Classifying message: {content}")
+    logger.debug("Classifying message of {} characters with the LLM.", len(content))
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            max_tokens=5,
-            temperature=0
-        )
+        with stage("llm_classify"):
+            response = await llm_client.complete(
+                route,
+                messages=messages,
+                max_tokens=5,
+                temperature=0
+            )
         classification = response.choices[0].message.content.lower()
-        logger.info(f"Message classified as: {classification}")
+        logger.info("Message classified as: {}", classification)
         if classification not in ["food", "weather", "other"]:
             logger.warning(f"Unexpected classification '{classification}'. Falling back to 'food'.")
             classification = "food"  # fallback
         return classification
     except Exception as e:
         logger.exception("Classification failed. Falling back to 'food'.")
-        return "food"  # fallback
\ No newline at end of file
+        return "food"  # fallback
+
+async def classify_local(content: str):
+    """
+    Local classification: keyword rules first, then nearest-centroid over the
+    query embedding (which is cached and reused by the food RAG path).
+    Returns (label, confidence).
+    """
+    label, confidence = classify_by_keywords(content)
+    if confidence >= settings.LOCAL_CLASSIFIER_THRESHOLD or not settings.LOCAL_CLASSIFIER_USE_EMBEDDINGS:
+        return label, confidence
+    try:
+        centroid_label, centroid_confidence = await classify_by_centroid(await aembed_text(content))
+    except Exception:
+        logger.exception("Centroid classification failed.")
+        return label, confidence
+    if centroid_confidence > confidence:
+        return centroid_label, centroid_confidence
+    return label, confidence
+
+# Shadow comparisons in flight; the event loop only keeps weak references
+# to tasks, so they must be held here until they finish
+_shadow_tasks = set()
+
+async def _shadow_compare(content: str, label: str, confidence: float):
+    agreement.record(label, confidence, await classify_with_llm(content))
+
+def _shadow_done(task):
+    _shadow_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Shadow classification failed: {task.exception()}")
+
+@timed("classify")
+async def classify_message(content: str) -> str:
+    """
+    Classify the message as 'food', 'weather' or 'other'.
+
+    Confident local classifications skip the LLM entirely; the rest fall
+    back to the LLM classifier. A `LOCAL_CLASSIFIER_SHADOW_RATE` sample of
+    fast-path decisions is also checked against the LLM in the background
+    to measure agreement.
+    """
+    if not settings.LOCAL_CLASSIFIER_ENABLED:
+        return await classify_with_llm(content)
+
+    label, confidence = await classify_local(content)
+    if confidence >= settings.LOCAL_CLASSIFIER_THRESHOLD:
+        logger.info("Message classified locally as: {} (confidence={:.2f})", label, confidence)
+        agreement.record_fast_path()
+        if random.random() < settings.LOCAL_CLASSIFIER_SHADOW_RATE:
+            task = asyncio.ensure_future(_shadow_compare(content, label, confidence))
+            _shadow_tasks.add(task)
+            task.add_done_callback(_shadow_done)
+        return label
+
+    agreement.record_fallback()
+    classification = await classify_with_llm(content)
+    agreement.record(label, confidence, classification)
+    return classification
+
+async def classify_batch_with_llm(contents: list) -> list:
+    """
+    Classify several messages with one LLM call. Messages are sent as a JSON
+    array and the model answers with a JSON array of labels in the same order.
+    """
+    messages = [
+        {"role": "system", "content": "You are a classifier that categorizes user queries into 'food' or 'weather' or 'other'. You receive a JSON array of queries; return only a JSON array with one of those words for each query, in the same order."},
+        {"role": "user", "content": json.dumps(contents)}
+    ]
+    logger.info("Classifying batch of {} messages.", len(contents))
+    try:
+        with stage("llm_classify_batch"):
+            response = await llm_client.complete(
+                route,
+                messages=messages,
+                max_tokens=4 * len(contents) + 16,
+                temperature=0
+            )
+        labels = json.loads(response.choices[0].message.content)
+        if not isinstance(labels, list) or len(labels) != len(contents):
+            raise ValueError(f"Expected {len(contents)} labels, got {labels!r}.")
+    except Exception as e:
+        logger.exception("Batch classification failed. Classifying messages one by one.")
+        return list(await asyncio.gather(*(classify_with_llm(content) for content in contents)))
+    classifications = []
+    for label in labels:
+        label = str(label).strip().lower()
+        if label not in ["food", "weather", "other"]:
+            logger.warning(f"Unexpected classification '{label}'. Falling back to 'food'.")
+            label = "food"  # fallback
+        classifications.append(label)
+    return classifications
+
+@timed("classify_batch")
+async def classify_messages(contents: list) -> list:
+    """
+    Batch variant of `classify_message`. All messages are embedded in one
+    request for the local classifier, and the low-confidence ones are sent to
+    the LLM in groups of `CLASSIFIER_BATCH_SIZE`.
+    """
+    if not settings.LOCAL_CLASSIFIER_ENABLED:
+        local = [("food", 0.0)] * len(contents)
+    else:
+        local = [classify_by_keywords(content) for content in contents]
+        uncertain = [i for i, (_, confidence) in enumerate(local) if confidence < settings.LOCAL_CLASSIFIER_THRESHOLD]
+        if uncertain and settings.LOCAL_CLASSIFIER_USE_EMBEDDINGS:
+            try:
+                embeddings = await aembed_texts([contents[i] for i in uncertain])
+                for i, embedding in zip(uncertain, embeddings):
+                    centroid_label, centroid_confidence = await classify_by_centroid(embedding)
+                    if centroid_confidence > local[i][1]:
+                        local[i] = (centroid_label, centroid_confidence)
+            except Exception:
+                logger.exception("Centroid classification failed.")
+
+    classifications = [None] * len(contents)
+    fallback = []
+    for i, (label, confidence) in enumerate(local):
+        if settings.LOCAL_CLASSIFIER_ENABLED and confidence >= settings.LOCAL_CLASSIFIER_THRESHOLD:
+            agreement.record_fast_path()
+            classifications[i] = label
+        else:
+            fallback.append(i)
+
+    groups = [fallback[start:start + settings.CLASSIFIER_BATCH_SIZE] for start in range(0, len(fallback), settings.CLASSIFIER_BATCH_SIZE)]
+    semaphore = asyncio.Semaphore(settings.MESSAGE_BATCH_CONCURRENCY)
+
+    async def classify_group(group):
+        async with semaphore:
+            return await classify_batch_with_llm([contents[i] for i in group])
+
+    results = await asyncio.gather(*(classify_group(group) for group in groups))
+    for group, labels in zip(groups, results):
+        for i, label in zip(group, labels):
+            classifications[i] = label
+            if settings.LOCAL_CLASSIFIER_ENABLED:
+                agreement.record_fallback()
+                agreement.record(local[i][0], local[i][1], label)
+    return classifications
@@ -0,0 +1,384 @@
+import asyncio
+import time
+from collections import deque
+from loguru import logger
+from app.config import settings
+from app.services.container import services
+from app.utils.streaming import iter_text_deltas
+from app.utils.telemetry import record_hedge, record_llm_attempt, record_tokens, record_usage
+from app.utils.tokenization import count_tokens
+
+# Shared call layer for chat completions: every call goes through a route
+# (an ordered list of provider:model targets) and gets
+# - a deadline for the whole call (for streams: until the first token),
+# - a hedge: once the primary has been running for its recent p95 latency,
+#   the next target is started too and whichever answers first wins,
+# - failover: when an attempt fails, the next target is tried right away,
+# - a circuit breaker and a concurrency cap per provider, so a failing or
+#   slow upstream is skipped instead of tying up every request.
+
+class LLMUnavailableError(RuntimeError):
+    """
+    Raised when no target of a route is available or all of them failed.
+    """
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` failures in a row the circuit opens and
+    `allow()` refuses calls for `reset_seconds`; then a single probe call is
+    let through (half-open), which closes the circuit on success and opens
+    it again on failure.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.opened = 0
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.reset_seconds:
+                return False
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def record_success(self):
+        self.state = "closed"
+        self._failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self._failures += 1
+        self._probing = False
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opened += 1
+                logger.warning("Circuit opened after {} consecutive failures.", self._failures)
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def record_cancelled(self):
+        # A hedge loser says nothing about the provider's health
+        self._probing = False
+
+class Provider:
+    def __init__(self, name: str, client_name: str):
+        self.name = name
+        self.client_name = client_name
+        self._base = None
+        self._client = None
+        self._loop = None
+        self._semaphore = None
+        self.breaker = CircuitBreaker(settings.LLM_BREAKER_FAILURES, settings.LLM_BREAKER_RESET_SECONDS)
+        self.in_flight = 0
+
+    @property
+    def client(self):
+        """
+        The container's client for this provider, sharing its connection
+        pool but without SDK retries, which would stack on the failover below.
+        """
+        base = getattr(services, self.client_name)
+        if base is not self._base:
+            self._client = base.with_options(max_retries=0, timeout=settings.LLM_DEADLINE_SECONDS)
+            self._base = base
+        return self._client
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """
+        The `LLM_MAX_CONCURRENCY` cap for the running event loop. asyncio
+        primitives belong to the loop that first uses them, and this module
+        outlives any one loop (app restarts, benchmark runners, test clients).
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+            self._loop = loop
+        return self._semaphore
+
+class Target:
+    """
+    Latency window and counters of one provider:model within one route
+    (prompt and answer sizes, and so latencies, differ a lot between
+    routes); the window's `LLM_HEDGE_PERCENTILE` is the hedge delay.
+    """
+
+    def __init__(self, route: str, provider: str, model: str):
+        self.route = route
+        self.provider = provider
+        self.model = model
+        self._latencies = deque(maxlen=settings.LLM_LATENCY_WINDOW)
+        self._first_token = deque(maxlen=settings.LLM_LATENCY_WINDOW)
+        self.calls = 0
+        self.errors = 0
+        self.wins = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.provider}:{self.model}"
+
+    def record_latency(self, seconds: float, stream: bool):
+        (self._first_token if stream else self._latencies).append(seconds)
+
+    def percentile(self, q: float, stream: bool = False):
+        samples = sorted(self._first_token if stream else self._latencies)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+    def hedge_delay(self, stream: bool):
+        """
+        Seconds after which to hedge a call to this target, or None for no
+        hedge. Until `LLM_HEDGE_MIN_SAMPLES` calls are seen, the slowest one
+        so far stands in for the percentile. Before the first call, streams
+        use `LLM_HEDGE_DEFAULT_DELAY_SECONDS` (the first token comes about
+        as fast whatever the answer length), while complete answers aren't
+        hedged: any fixed guess would be too short for long answers.
+        """
+        samples = self._first_token if stream else self._latencies
+        if not samples:
+            return settings.LLM_HEDGE_DEFAULT_DELAY_SECONDS if stream else None
+        if len(samples) < settings.LLM_HEDGE_MIN_SAMPLES:
+            delay = max(samples)
+        else:
+            delay = self.percentile(settings.LLM_HEDGE_PERCENTILE, stream)
+        return max(settings.LLM_HEDGE_MIN_DELAY_SECONDS, delay)
+
+    def stats(self) -> dict:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        ttft_p95 = self.percentile(95, stream=True)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "wins": self.wins,
+            "p50_ms": p50 * 1000 if p50 is not None else None,
+            "p95_ms": p95 * 1000 if p95 is not None else None,
+            "first_token_p95_ms": ttft_p95 * 1000 if ttft_p95 is not None else None,
+        }
+
+class Route:
+    """
+    An ordered list of targets for one kind of call, parsed from a
+    `provider:model,provider:model` setting; the first is the primary.
+    """
+
+    def __init__(self, name: str, spec: str, deadline_seconds: float):
+        self.name = name
+        self.deadline_seconds = deadline_seconds
+        self.targets = []
+        for item in spec.split(","):
+            provider, _, model = item.strip().partition(":")
+            if provider not in _providers or not model:
+                raise ValueError(f"Invalid LLM target '{item}' for route '{name}'.")
+            self.targets.append(Target(name, provider, model))
+        self.hedges = 0
+        self.hedges_won = 0
+        self.failovers = 0
+
+    def stats(self) -> dict:
+        return {
+            "targets": {target.name: target.stats() for target in self.targets},
+            "hedges": self.hedges,
+            "hedges_won": self.hedges_won,
+            "failovers": self.failovers,
+        }
+
+_providers = {
+    "openai": Provider("openai", "openai_async"),
+    "groq": Provider("groq", "groq_async"),
+}
+_routes = {}
+
+def route(name: str, spec: str, deadline_seconds: float = None) -> Route:
+    """
+    Define (or look up) the route `name` from a `provider:model,...` spec.
+    """
+    if name not in _routes:
+        _routes[name] = Route(name, spec, deadline_seconds or settings.LLM_DEADLINE_SECONDS)
+    return _routes[name]
+
+async def _close(stream):
+    close = getattr(stream, "close", None)
+    if close is not None:
+        try:
+            await close()
+        except Exception:
+            logger.debug("Failed to close a discarded LLM stream.")
+
+async def _attempt(target: Target, call, stream: bool):
+    provider = _providers[target.provider]
+    try:
+        async with provider.semaphore:
+            provider.in_flight += 1
+            target.calls += 1
+            started = time.perf_counter()
+            try:
+                result = await call(provider.client, target.model)
+            finally:
+                provider.in_flight -= 1
+    except asyncio.CancelledError:
+        # Hedge losers and timeouts; the latter are counted by `_hedged`
+        provider.breaker.record_cancelled()
+        raise
+    except Exception:
+        target.errors += 1
+        provider.breaker.record_failure()
+        record_llm_attempt(target.provider, target.model, "error")
+        raise
+    target.record_latency(time.perf_counter() - started, stream)
+    provider.breaker.record_success()
+    record_llm_attempt(target.provider, target.model, "success")
+    return result
+
+async def _hedged(route: Route, call, stream: bool = False, discard=None):
+    """
+    Run `call(client, model)` against the route's targets with hedging and
+    failover. Returns (target, result) of the first attempt to succeed;
+    `discard(result)` is awaited for any other attempt that also succeeded.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + route.deadline_seconds
+    candidates = list(route.targets)
+    attempts = {}  # task -> target
+    hedge_at = None
+    last_error = None
+
+    def launch() -> bool:
+        while candidates:
+            target = candidates.pop(0)
+            if _providers[target.provider].breaker.allow():
+                attempts[asyncio.ensure_future(_attempt(target, call, stream))] = target
+                return True
+            logger.debug("Skipping {}: circuit open.", target.name)
+        return False
+
+    if not launch():
+        raise LLMUnavailableError(f"No LLM available for '{route.name}': every circuit is open.")
+    primary = next(iter(attempts.values()))
+    if settings.LLM_HEDGING_ENABLED and candidates:
+        delay = primary.hedge_delay(stream)
+        if delay is not None:
+            hedge_at = started + delay
+
+    try:
+        while attempts:
+            now = loop.time()
+            wake_at = min(deadline, hedge_at) if hedge_at is not None else deadline
+            done, _ = await asyncio.wait(attempts, timeout=max(0.0, wake_at - now), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if loop.time() >= deadline:
+                    for target in attempts.values():
+                        _providers[target.provider].breaker.record_failure()
+                        record_llm_attempt(target.provider, target.model, "timeout")
+                    raise asyncio.TimeoutError(f"LLM call '{route.name}' exceeded its {route.deadline_seconds:.1f}s deadline.")
+                # The primary is slower than usual: race it against the next target
+                hedge_at = None
+                if launch():
+                    route.hedges += 1
+                    record_hedge(route.name, "started")
+                    logger.info("Hedging '{}' after {:.0f} ms.", route.name, (loop.time() - started) * 1000)
+                continue
+
+            winner = None
+            for task in done:
+                target = attempts.pop(task)
+                if task.exception() is not None:
+                    last_error = task.exception()
+                    logger.warning("LLM call to {} failed: {}", target.name, last_error)
+                elif winner is None:
+                    winner = (target, task.result())
+                elif discard is not None:
+                    await discard(task.result())
+            if winner is not None:
+                target = winner[0]
+                target.wins += 1
+                if target is not primary:
+                    route.hedges_won += 1
+                    record_hedge(route.name, "won")
+                return winner
+            if not attempts:
+                # Everything in flight failed: fail over to the next target
+                hedge_at = None
+                if not launch():
+                    break
+                route.failovers += 1
+                logger.info("Failing over '{}' to {}.", route.name, next(iter(attempts.values())).name)
+    finally:
+        for task in attempts:
+            task.cancel()
+    raise LLMUnavailableError(f"Every LLM target for '{route.name}' failed.") from last_error
+
+async def complete(route: Route, messages: list, **params):
+    """
+    Chat completion through `route`. Returns the provider's response.
+    """
+    async def call(client, model):
+        return await client.chat.completions.create(model=model, messages=messages, **params)
+
+    target, response = await _hedged(route, call)
+    record_usage(target.provider, target.model, response)
+    return response
+
+async def _prepend(first, stream):
+    if first is not None:
+        yield first
+    async for chunk in stream:
+        yield chunk
+
+async def stream_text(route: Route, messages: list, **params):
+    """
+    Streaming chat completion through `route`, yielding text deltas. Hedging
+    and the deadline apply until the first chunk arrives; from then on the
+    winning stream is read to the end.
+    """
+    async def call(client, model):
+        stream = await client.chat.completions.create(model=model, messages=messages, stream=True, **params)
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except BaseException:
+            await _close(stream)
+            raise
+        return stream, first
+
+    async def discard(result):
+        await _close(result[0])
+
+    target, (stream, first) = await _hedged(route, call, stream=True, discard=discard)
+    parts = []
+    try:
+        async for text in iter_text_deltas(_prepend(first, stream)):
+            parts.append(text)
+            yield text
+    finally:
+        await _close(stream)
+    # Streams carry no usage, so count the tokens locally
+    prompt = "\n".join(str(message.get("content", "")) for message in messages)
+    record_tokens(target.provider, target.model, count_tokens(prompt), count_tokens("".join(parts)))
+
+def stats() -> dict:
+    return {
+        "hedging_enabled": settings.LLM_HEDGING_ENABLED,
+        "providers": {
+            name: {
+                "circuit": provider.breaker.state,
+                "circuit_opened": provider.breaker.opened,
+                "in_flight": provider.in_flight,
+            }
+            for name, provider in _providers.items()
+        },
+        "routes": {name: route.stats() for name, route in _routes.items()},
+    }
@@ -1,45 +1,167 @@
-from .embeddings import embed_text
-from .vector_store import query_vectors
+import asyncio
+import json
+from .embeddings import aembed_text, aembed_texts
+from .vector_store import query_vectors, query_vectors_batch
+from .semantic_cache import food_answer_cache
+from .context_builder import build_context, context_stats
+from . import llm_client
 from loguru import logger
-from groq import Groq
 from app.config import settings
+from app.utils.tokenization import count_tokens
+from app.utils.telemetry import stage
 
-client = Groq(
-    api_key= settings.GROQ_API_KEY
-)
+# Groq first, with an OpenAI model as the hedge/failover target
+route = llm_client.route("food", settings.LLM_FOOD_MODELS)
 
-def generate_food_answer(query: str):
+FALLBACK_ANSWER = "I'm sorry, I cannot answer right now."
+NO_CONTEXT_ANSWER = "I'm sorry, I don't have a recipe for that."
+
+def _use_cache(where) -> bool:
+    # Answers are cached for the whole corpus only; a scoped query could
+    # otherwise be served an answer built from documents outside its scope
+    return settings.SEMANTIC_CACHE_ENABLED and where is None
+
+async def prepare_food_answer(query: str, where: dict = None):
+    """
+    Embed the query and check the semantic cache, then retrieve context and
+    build the prompt. Returns (query_embedding, cache_generation, answer,
+    prompt); `answer` is set instead of `prompt` when no LLM call is needed
+    (a semantic cache hit, or no relevant context).
+
+    `where` (see `vector_store.scope_filter`) restricts retrieval to some
+    documents. Safe to start before the query is classified; the result
+    can be handed to `generate_food_answer` / `stream_food_answer` as
+    `prepared`, along with the same `where`.
+    """
     # We can improve RAG using Hybrid search.
     # 1. Embed query
-    query_embedding = embed_text(query)
-    logger.info("Query embedded successfully.")
-    # 2. Retrieve similar docs
-    results = query_vectors(query_embedding)
-    logger.info("Retrieved vectors for RAG.")
-    # Extract top chunks as context
-    context_chunks = []
+    query_embedding = await aembed_text(query)
+    logger.debug("Query embedded successfully.")
+    cache_generation = None
+    if _use_cache(where):
+        cached_answer, cache_generation = food_answer_cache.lookup(query_embedding)
+        if cached_answer is not None:
+            logger.info("Returning food answer from semantic cache.")
+            return query_embedding, cache_generation, cached_answer, None
+    # 2. Retrieve the text and distance of similar chunks (Chroma is
+    # blocking, keep it off the event loop)
+    results = await asyncio.to_thread(query_vectors, query_embedding, settings.RAG_CANDIDATES, where)
+    logger.debug("Retrieved vectors for RAG.")
+    answer, prompt = _build_prompt(query, results['documents'][0], results['distances'][0])
+    return query_embedding, cache_generation, answer, prompt
 
-    for doc, meta in zip(results['documents'][0], results['metadatas'][0]):
-        context_chunks.append(meta['chunk_text'])
+def _build_prompt(query: str, texts: list, distances: list):
+    """
+    Returns (answer, prompt): the prompt for the food LLM, or a canned
+    answer when no candidate chunk is relevant enough to be worth a call.
+    """
+    context_chunks, dropped = build_context(texts, distances)
+    if not context_chunks:
+        logger.info("No relevant context among {} candidates, skipping the food LLM.", len(texts))
+        context_stats.record_no_context(dropped["too_distant"])
+        return NO_CONTEXT_ANSWER, None
 
     context_text = "\n\n".join(context_chunks)
-    logger.info(f"Context for RAG: {context_text[:100]}...")  # Log first 100 chars
+    logger.opt(lazy=True).debug("Context for RAG: {}...", lambda: context_text[:100])  # Log first 100 chars
     prompt ={
             "role": "system",
             "content": f"You are a helpful food assistant. Use the following context to answer the user:\n\n{context_text}\n\nif the context is not correct, apologize and say that you do not have a recipe.\n\nUser: {query}\n",
-        } 
+        }
+    prompt_tokens = count_tokens(prompt["content"])
+    context_stats.record(prompt_tokens, len(context_chunks), dropped["duplicates"], dropped["over_budget"], dropped["too_distant"])
+    logger.info("Food prompt: {} tokens from {} of {} candidate chunks.", prompt_tokens, len(context_chunks), len(texts))
+    return None, prompt
+
+async def prepare_food_answers(queries: list, wheres: list = None):
+    """
+    Batch variant of `prepare_food_answer`: one embeddings request and one
+    multi-query vector store call per distinct `where` filter (`wheres` has
+    one per query, None for the whole corpus) for every query not answered
+    by the semantic cache.
+    """
+    wheres = wheres or [None] * len(queries)
+    embeddings = await aembed_texts(queries)
+    logger.debug("Embedded {} queries successfully.", len(queries))
+    prepared = [None] * len(queries)
+    to_retrieve = {}  # filter key -> query indexes
+    for i, embedding in enumerate(embeddings):
+        cache_generation = None
+        if _use_cache(wheres[i]):
+            cached_answer, cache_generation = food_answer_cache.lookup(embedding)
+            if cached_answer is not None:
+                prepared[i] = (embedding, cache_generation, cached_answer, None)
+                continue
+        prepared[i] = (embedding, cache_generation, None, None)
+        to_retrieve.setdefault(json.dumps(wheres[i], sort_keys=True), []).append(i)
+
+    for indexes in to_retrieve.values():
+        results = await asyncio.to_thread(query_vectors_batch, [embeddings[i] for i in indexes], settings.RAG_CANDIDATES, wheres[indexes[0]])
+        logger.debug("Retrieved vectors for {} RAG queries.", len(indexes))
+        for i, texts, distances in zip(indexes, results['documents'], results['distances']):
+            embedding, cache_generation, _, _ = prepared[i]
+            prepared[i] = (embedding, cache_generation, *_build_prompt(queries[i], texts, distances))
+    return prepared
+
+async def generate_food_answer(query: str, prepared=None, where: dict = None):
+    query_embedding, cache_generation, answer, prompt = prepared or await prepare_food_answer(query, where)
+    if answer is not None:
+        return answer
 
     try:
-        completion = client.chat.completions.create(
-            model="llama-3.1-70b-versatile",
-            messages=[prompt],
-            temperature=1,
-            max_tokens=1024,
-            top_p=1,
-        )
+        with stage("llm_food"):
+            completion = await llm_client.complete(
+                route,
+                messages=[prompt],
+                temperature=1,
+                max_tokens=1024,
+                top_p=1,
+            )
         answer = completion.choices[0].message.content
-        logger.info("Generated food answer using RAG.")
+        usage = getattr(completion, "usage", None)
+        logger.info("Generated food answer using RAG (prompt_tokens={}).", usage.prompt_tokens if usage else 'n/a')
+        if _use_cache(where):
+            food_answer_cache.store(query_embedding, answer, cache_generation)
         return answer
     except Exception as e:
         logger.exception("Food LLM call failed.")
-        return "I'm sorry, I cannot answer right now."
\ No newline at end of file
+        return FALLBACK_ANSWER
+
+async def stream_food_answer(query: str, prepared=None, where: dict = None):
+    """
+    Streaming variant of `generate_food_answer`: yields answer text as the
+    completion tokens arrive. Retrieval failures, and LLM failures before
+    the first token, end the stream with the fallback answer; an LLM
+    failure after it is raised, since the answer is already incomplete.
+    """
+    try:
+        query_embedding, cache_generation, answer, prompt = prepared or await prepare_food_answer(query, where)
+    except Exception:
+        logger.exception("Food retrieval failed.")
+        yield FALLBACK_ANSWER
+        return
+    if answer is not None:
+        yield answer
+        return
+
+    parts = []
+    try:
+        with stage("llm_food_stream"):
+            async for text in llm_client.stream_text(
+                route,
+                messages=[prompt],
+                temperature=1,
+                max_tokens=1024,
+                top_p=1,
+            ):
+                parts.append(text)
+                yield text
+    except Exception:
+        if parts:
+            # Part of the answer is already out: the caller reports the failure
+            raise
+        logger.exception("Food LLM stream failed.")
+        yield FALLBACK_ANSWER
+        return
+    logger.info("Streamed food answer using RAG.")
+    if _use_cache(where):
+        food_answer_cache.store(query_embedding, "".join(parts), cache_generation)
@@ -1,17 +1,14 @@
-from .embeddings import embed_text
-from .vector_store import query_vectors
+from . import llm_client
 from loguru import logger
-from groq import Groq
 from app.config import settings
+from app.utils.telemetry import stage
 
-client = Groq(
-    api_key= settings.GROQ_API_KEY
-)
+route = llm_client.route("ooc", settings.LLM_OOC_MODELS)
 
-def generate_ooc_answer(query: str):
-    logger.info("handling out of classification query.")
+FALLBACK_ANSWER = "I'm sorry, I cannot answer right now."
 
-    agent_messages = [{
+def _build_messages(query: str):
+    return [{
                 "role": "system",
                 "content": f"You are a helpful assistant. Please advise and apologize to the user as you can only answer questions about the weather in NY or about food.",
             }, 
@@ -21,17 +18,49 @@ def generate_ooc_answer(query: str):
             }
         ]
 
+async def generate_ooc_answer(query: str):
+    logger.info("handling out of classification query.")
+
+    agent_messages = _build_messages(query)
+
     try:
-        completion = client.chat.completions.create(
-            model="llama-3.1-70b-versatile",
-            messages=agent_messages,
-            temperature=1,
-            max_tokens=1024,
-            top_p=1,
-        )
+        with stage("llm_ooc"):
+            completion = await llm_client.complete(
+                route,
+                messages=agent_messages,
+                temperature=1,
+                max_tokens=1024,
+                top_p=1,
+            )
         answer = completion.choices[0].message.content
         logger.info("Generated ooc answer .")
         return answer
     except Exception as e:
         logger.exception("Food LLM call failed.")
-        return "I'm sorry, I cannot answer right now."
\ No newline at end of file
+        return FALLBACK_ANSWER
+
+async def stream_ooc_answer(query: str):
+    """
+    Streaming variant of `generate_ooc_answer`. Failures before the first
+    token yield the fallback answer; later ones are raised.
+    """
+    logger.info("handling out of classification query (streaming).")
+    parts = []
+    try:
+        with stage("llm_ooc_stream"):
+            async for text in llm_client.stream_text(
+                route,
+                messages=_build_messages(query),
+                temperature=1,
+                max_tokens=1024,
+                top_p=1,
+            ):
+                parts.append(text)
+                yield text
+        logger.info("Streamed ooc answer.")
+    except Exception:
+        if parts:
+            # Part of the answer is already out: the caller reports the failure
+            raise
+        logger.exception("OOC LLM stream failed.")
+        yield FALLBACK_ANSWER
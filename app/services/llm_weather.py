@@ -1,14 +1,29 @@
 from loguru import logger
-import openai
 from app.config import settings
+from app.services import llm_client
+from app.utils.async_cache import AsyncTTLCache
+from app.utils.telemetry import stage
 
-# Initialize the OpenAI client
-client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+route = llm_client.route("weather", settings.LLM_WEATHER_MODELS)
 
-def generate_weather_answer(weather_json: dict):
+# The summary is identical for every user until the weather snapshot changes,
+# so it is keyed on the formatted snapshot itself
+summary_cache = AsyncTTLCache(
+    "weather summary",
+    ttl_seconds=settings.WEATHER_CACHE_TTL_SECONDS + settings.WEATHER_CACHE_STALE_SECONDS,
+    max_size=16,
+)
+
+FALLBACK_ANSWER = "I'm sorry, I cannot provide the weather details right now."
+
+def _format_weather(weather_json: dict):
+    """
+    Returns (city, formatted_weather), or (None, error_answer) when the data
+    is missing or malformed.
+    """
     if not weather_json:
         logger.warning("No weather data provided.")
-        return "I'm sorry, I can't provide the weather details right now."
+        return None, "I'm sorry, I can't provide the weather details right now."
 
     try:
         weather_description = weather_json['weather'][0]['description'].capitalize()
@@ -26,24 +41,73 @@ def generate_weather_answer(weather_json: dict):
             f"Humidity: {humidity}%\n"
             f"Wind Speed: {wind_speed} m/s\n"
         )
-        logger.debug(f"Formatted weather data: {formatted_weather}")
+        logger.debug("Formatted weather data: {}", formatted_weather)
+        return city, formatted_weather
     except KeyError as e:
         logger.error(f"Missing key in weather data: {e}")
-        return "I'm sorry, I can't parse the weather details right now."
+        return None, "I'm sorry, I can't parse the weather details right now."
 
-    messages = [
+def _build_messages(city: str, formatted_weather: str):
+    return [
         {"role": "system", "content": "You are a helpful assistant."},
         {"role": "user", "content": f"Summarize this weather data for {city} in a helpful, natural way:\n\n{formatted_weather}"}
     ]
-    logger.info("Generating weather summary using LLM.")
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages
-        )
+
+async def generate_weather_answer(weather_json: dict):
+    city, formatted_weather = _format_weather(weather_json)
+    if city is None:
+        return formatted_weather
+
+    async def summarize():
+        logger.info("Generating weather summary using LLM.")
+        with stage("llm_weather"):
+            response = await llm_client.complete(
+                route,
+                messages=_build_messages(city, formatted_weather)
+            )
         answer = response.choices[0].message.content.strip()
         logger.info("Weather summary generated successfully.")
         return answer
+
+    try:
+        return await summary_cache.get_or_fetch(formatted_weather, summarize)
     except Exception as e:
         logger.exception("Weather LLM call failed.")
-        return "I'm sorry, I cannot provide the weather details right now."
\ No newline at end of file
+        return FALLBACK_ANSWER
+
+async def stream_weather_answer(weather_json: dict):
+    """
+    Streaming variant of `generate_weather_answer`. A cached summary for the
+    same snapshot is yielded at once; otherwise the streamed summary is
+    cached when it completes. Failures before the first token yield the
+    fallback answer; later ones are raised.
+    """
+    city, formatted_weather = _format_weather(weather_json)
+    if city is None:
+        yield formatted_weather
+        return
+
+    cached = summary_cache.get(formatted_weather)
+    if cached is not None:
+        yield cached
+        return
+
+    logger.info("Streaming weather summary using LLM.")
+    parts = []
+    try:
+        with stage("llm_weather_stream"):
+            async for text in llm_client.stream_text(
+                route,
+                messages=_build_messages(city, formatted_weather),
+            ):
+                parts.append(text)
+                yield text
+    except Exception:
+        if parts:
+            # Part of the answer is already out: the caller reports the failure
+            raise
+        logger.exception("Weather LLM stream failed.")
+        yield FALLBACK_ANSWER
+        return
+    logger.info("Weather summary streamed successfully.")
+    summary_cache.set(formatted_weather, "".join(parts).strip())
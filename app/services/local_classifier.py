@@ -0,0 +1,177 @@
+import asyncio
+import re
+from threading import Lock
+import numpy as np
+from loguru import logger
+from app.services.embeddings import aembed_texts
+
+LABELS = ("food", "weather", "other")
+
+KEYWORDS = {
+    "food": {
+        "food", "recipe", "recipes", "cook", "cooking", "cooked", "bake", "baking", "ingredient",
+        "ingredients", "dish", "dishes", "meal", "meals", "eat", "eating", "dinner", "lunch",
+        "breakfast", "dessert", "snack", "cuisine", "kitchen", "oven", "fry", "grill", "roast",
+        "boil", "sauce", "soup", "salad", "pasta", "spaghetti", "pizza", "bread", "cake", "chicken",
+        "beef", "pork", "fish", "rice", "vegetarian", "vegan", "calories", "spicy", "delicious",
+        "taste", "flavor", "carbonara", "cookies", "restaurant",
+    },
+    "weather": {
+        "weather", "forecast", "temperature", "temperatures", "rain", "raining", "rainy", "snow",
+        "snowing", "sunny", "cloudy", "clouds", "humid", "humidity", "wind", "windy", "storm",
+        "stormy", "umbrella", "celsius", "fahrenheit", "degrees", "thunder", "fog", "foggy",
+        "hail", "drizzle", "precipitation", "climate", "outside",
+    },
+}
+
+# A few representative queries per label; their embedding centroids back
+# the nearest-centroid fallback
+EXEMPLARS = {
+    "food": [
+        "How do I make spaghetti carbonara?",
+        "Give me a quick vegetarian dinner recipe.",
+        "What can I cook with chicken and rice?",
+        "How long should I bake chocolate chip cookies?",
+        "What ingredients do I need for guacamole?",
+    ],
+    "weather": [
+        "What's the weather like in New York today?",
+        "Is it going to rain this afternoon?",
+        "How hot is it outside right now?",
+        "Do I need a jacket today?",
+        "What is the current temperature and humidity?",
+    ],
+    "other": [
+        "Who won the football game last night?",
+        "Can you help me write a cover letter?",
+        "What is the capital of Australia?",
+        "Tell me a joke.",
+        "How do I reset my password?",
+    ],
+}
+
+# Keyword matches for the winning label that count as full confidence
+_KEYWORD_FULL_CONFIDENCE_HITS = 2
+
+# Difference between the best and second-best centroid similarity that
+# counts as full confidence
+_CENTROID_FULL_CONFIDENCE_MARGIN = 0.1
+
+_WORD_RE = re.compile(r"[a-z]+")
+
+_centroids = None
+# (loop, lock): asyncio locks belong to the loop that first uses them, and
+# this module outlives any one loop
+_centroids_lock = None
+
+def classify_by_keywords(content: str):
+    """
+    Keyword-rule classification. Returns (label, confidence); confidence is
+    0 when no rule matches.
+    """
+    words = _WORD_RE.findall(content.lower())
+    hits = {label: sum(1 for w in words if w in keywords) for label, keywords in KEYWORDS.items()}
+    total = sum(hits.values())
+    if total == 0:
+        return "other", 0.0
+    label = max(hits, key=hits.get)
+    # Share of matches for the winning label, discounted below
+    # _KEYWORD_FULL_CONFIDENCE_HITS matches: a single generic word ("cook",
+    # "outside") scores at most 0.5 and is left to the other classifiers
+    confidence = (hits[label] / total) * min(1.0, hits[label] / _KEYWORD_FULL_CONFIDENCE_HITS)
+    return label, confidence
+
+def _get_centroids_lock() -> asyncio.Lock:
+    global _centroids_lock
+    loop = asyncio.get_running_loop()
+    if _centroids_lock is None or _centroids_lock[0] is not loop:
+        _centroids_lock = (loop, asyncio.Lock())
+    return _centroids_lock[1]
+
+async def _get_centroids():
+    global _centroids
+    if _centroids is None:
+        async with _get_centroids_lock():
+            if _centroids is None:
+                labels = list(EXEMPLARS)
+                texts = [text for label in labels for text in EXEMPLARS[label]]
+                embeddings = np.asarray(await aembed_texts(texts), dtype=np.float32)
+                embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+                centroids, offset = [], 0
+                for label in labels:
+                    count = len(EXEMPLARS[label])
+                    centroid = embeddings[offset:offset + count].mean(axis=0)
+                    centroids.append(centroid / np.linalg.norm(centroid))
+                    offset += count
+                _centroids = (labels, np.stack(centroids))
+                logger.info("Local classifier centroids initialized.")
+    return _centroids
+
+async def classify_by_centroid(embedding):
+    """
+    Nearest-centroid classification of a query embedding. Returns
+    (label, confidence) based on the margin to the runner-up label.
+    """
+    labels, centroids = await _get_centroids()
+    query = np.asarray(embedding, dtype=np.float32)
+    query /= np.linalg.norm(query) or 1.0
+    similarities = centroids @ query
+    order = np.argsort(similarities)[::-1]
+    margin = float(similarities[order[0]] - similarities[order[1]])
+    return labels[order[0]], min(1.0, margin / _CENTROID_FULL_CONFIDENCE_MARGIN)
+
+class AgreementTracker:
+    """
+    Counts how often the local classifier agrees with the LLM, bucketed by
+    local confidence, so the fast-path threshold can be tuned.
+    """
+
+    BANDS = (0.5, 0.7, 0.8, 0.9, 1.01)
+
+    def __init__(self, log_every: int = 100):
+        self.log_every = log_every
+        self._lock = Lock()
+        self._compared = 0
+        self._agreed = 0
+        self._bands = {band: [0, 0] for band in self.BANDS}  # upper bound -> [agreed, compared]
+        self._fast_path = 0
+        self._llm_fallback = 0
+
+    def record_fast_path(self):
+        with self._lock:
+            self._fast_path += 1
+
+    def record_fallback(self):
+        with self._lock:
+            self._llm_fallback += 1
+
+    def record(self, local_label: str, confidence: float, llm_label: str):
+        with self._lock:
+            agreed = local_label == llm_label
+            self._compared += 1
+            self._agreed += agreed
+            band = next(band for band in self.BANDS if confidence < band)
+            self._bands[band][0] += agreed
+            self._bands[band][1] += 1
+            if self._compared % self.log_every == 0:
+                logger.info(f"Local/LLM classifier agreement: {self._agreed / self._compared:.1%} over {self._compared} comparisons.")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lower = 0.0
+            bands = {}
+            for band, (agreed, compared) in self._bands.items():
+                bands[f"{lower:.1f}-{min(band, 1.0):.1f}"] = {
+                    "compared": compared,
+                    "agreement": agreed / compared if compared else None,
+                }
+                lower = band
+            return {
+                "fast_path": self._fast_path,
+                "llm_fallback": self._llm_fallback,
+                "compared": self._compared,
+                "agreement": self._agreed / self._compared if self._compared else None,
+                "by_confidence": bands,
+            }
+
+agreement = AgreementTracker()
@@ -0,0 +1,56 @@
+import asyncio
+from loguru import logger
+from app.config import settings
+from app.services.llm_classifier import classify_messages
+from app.services.llm_food_rag import generate_food_answer, prepare_food_answers
+from app.services.llm_weather import generate_weather_answer
+from app.services.llm_ooc import generate_ooc_answer
+from app.services.weather_service import get_weather_for_newyork
+
+async def answer_messages(contents: list, wheres: list = None) -> list:
+    """
+    Answer many messages with coalesced upstream calls: grouped
+    classification, one embeddings request and one multi-query vector search
+    per retrieval scope (`wheres`, one filter or None per message) for all
+    food queries, a single weather fetch, and generation fanned out under
+    `MESSAGE_BATCH_CONCURRENCY`.
+
+    Returns one `(answer, error)` pair per message, in input order.
+    """
+    wheres = wheres or [None] * len(contents)
+    classifications = await classify_messages(contents)
+    logger.info("Classified batch of {} messages.", len(contents))
+
+    food = [i for i, label in enumerate(classifications) if label == "food"]
+    prepared, food_error = {}, None
+    if food:
+        try:
+            prepared = dict(zip(food, await prepare_food_answers([contents[i] for i in food], [wheres[i] for i in food])))
+        except Exception:
+            logger.exception("Batch retrieval for food queries failed.")
+            food_error = "Failed to retrieve context for the food query."
+
+    weather_data = None
+    if "weather" in classifications:
+        weather_data = await get_weather_for_newyork()
+
+    semaphore = asyncio.Semaphore(settings.MESSAGE_BATCH_CONCURRENCY)
+
+    async def answer(i: int):
+        classification = classifications[i]
+        if classification == "food" and food_error:
+            return None, food_error
+        async with semaphore:
+            try:
+                if classification == "food":
+                    return await generate_food_answer(contents[i], prepared=prepared[i], where=wheres[i]), None
+                if classification == "other":
+                    return await generate_ooc_answer(contents[i]), None
+                if not weather_data:
+                    return "I'm sorry, I can't fetch the weather right now.", None
+                return await generate_weather_answer(weather_data), None
+            except Exception:
+                logger.exception(f"Failed to answer batch message {i}.")
+                return None, "Failed to generate a response."
+
+    return list(await asyncio.gather(*(answer(i) for i in range(len(contents)))))
@@ -0,0 +1,479 @@
+import json
+import os
+from uuid import uuid4
+from threading import RLock
+import numpy as np
+from loguru import logger
+from app.services.vector_store import QUERY_FIELDS, VectorBackend
+
+class NumpyIndexBackend(VectorBackend):
+    """
+    In-process exact vector index over a memory-mapped float32 matrix.
+
+    Files under `path`:
+    - `vectors.f32`: row-major float32 matrix, grown by doubling its capacity.
+    - `records.jsonl`: append-only log of `{"id", "row", "metadata",
+      "document"}` records; re-adding an ID overwrites its row in place and
+      appends a new record. Deleting appends `{"id", "row", "deleted": true}`
+      and frees the row for the next add.
+    - `header.json`: dimension, the number of committed rows and the names
+      of the two files above. Rows past `count` (e.g. from an interrupted
+      write) are ignored on load. `compact()` writes new files without the
+      free rows and switches to them by replacing the header.
+
+    Queries compute squared L2 distances for a whole batch of query vectors
+    with one matrix product and select the top-k with `argpartition`. Free
+    rows have an infinite norm, so they rank last and are dropped. A `where`
+    filter narrows the rows scanned first; filters on `document_id` alone
+    are answered from an array of per-row document IDs. Scoring runs
+    outside the lock; the hits are resolved to IDs only if no row was
+    deleted, overwritten or compacted meanwhile, else the query is retried.
+
+    With `quantization="int8"` each row is also kept in RAM as int8 codes
+    with one float32 scale (symmetric, per vector), built on load and
+    updated on add. Queries scan the codes, a quarter of the float32
+    matrix, in blocks of `_SCAN_BLOCK` rows. The `rescore_factor * top_k`
+    best candidates are then re-scored exactly with their float32 rows,
+    read from the memory-mapped file. Returned distances are always exact.
+    """
+
+    name = "numpy"
+
+    _INITIAL_CAPACITY = 1024
+    _SCAN_BLOCK = 4096
+    _QUERY_ATTEMPTS = 3
+
+    def __init__(self, path: str, quantization: str = "none", rescore_factor: int = 4):
+        if quantization not in ("none", "int8"):
+            raise ValueError(f"Unknown quantization '{quantization}'.")
+        self.quantization = quantization
+        self.rescore_factor = max(1, rescore_factor)
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._records_path = os.path.join(path, "records.jsonl")
+        self._header_path = os.path.join(path, "header.json")
+        self._lock = RLock()
+        self._version = 0  # bumped whenever an existing row changes
+        self._dim = None
+        self._count = 0
+        self._capacity = 0
+        self._matrix = None
+        self._norms = np.zeros(0, dtype=np.float32)  # squared L2 norm per row
+        self._document_ids = np.zeros(0, dtype=np.int64)  # metadata document_id per row, -1 if none
+        self._codes = np.zeros((0, 0), dtype=np.int8)  # int8 rows, when quantized
+        self._scales = np.zeros(0, dtype=np.float32)  # per-row dequantization scale
+        self._ids = []
+        self._metadatas = []
+        self._documents = []
+        self._rows = {}  # id -> row
+        self._free = []  # deleted rows, reused by `add`
+        self._load()
+        logger.info(f"NumPy vector index at {path} initialized with {self.count()} vectors.")
+
+    def _load(self):
+        if not os.path.exists(self._header_path):
+            return
+        with open(self._header_path) as f:
+            header = json.load(f)
+        self._dim, self._count = header["dim"], header["count"]
+        self._vectors_path = os.path.join(self.path, header.get("vectors", "vectors.f32"))
+        self._records_path = os.path.join(self.path, header.get("records", "records.jsonl"))
+        self._capacity = os.path.getsize(self._vectors_path) // (4 * self._dim)
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(self._capacity, self._dim))
+        self._ids = [None] * self._count
+        self._metadatas = [None] * self._count
+        self._documents = [None] * self._count
+        with open(self._records_path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                row = record["row"]
+                if row >= self._count:
+                    continue
+                if record.get("deleted"):
+                    if self._rows.get(record["id"]) == row:
+                        del self._rows[record["id"]]
+                        self._set_row(row, None, None, None)
+                    continue
+                self._set_row(row, record["id"], record["metadata"], record.get("document"))
+                self._rows[record["id"]] = row
+        active = self._matrix[:self._count]
+        self._norms = np.einsum("ij,ij->i", active, active).astype(np.float32)
+        self._document_ids = np.array([_document_id(metadata) for metadata in self._metadatas], dtype=np.int64)
+        if self.quantization == "int8":
+            self._codes, self._scales = self._quantize(active)
+        self._free = [row for row in range(self._count) if self._ids[row] is None]
+        self._norms[self._free] = np.inf
+
+    def _quantize(self, vectors):
+        """
+        Symmetric per-vector int8 quantization, in blocks so the float32
+        temporaries stay small. Returns (codes, scales).
+        """
+        codes = np.empty(vectors.shape, dtype=np.int8)
+        scales = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), self._SCAN_BLOCK):
+            block = np.asarray(vectors[start:start + self._SCAN_BLOCK], dtype=np.float32)
+            block_scales = np.abs(block).max(axis=1) / 127.0
+            block_scales[block_scales == 0] = 1.0
+            codes[start:start + len(block)] = np.rint(block / block_scales[:, None])
+            scales[start:start + len(block)] = block_scales
+        return codes, scales
+
+    def _set_row(self, row: int, id, metadata, document):
+        self._ids[row] = id
+        self._metadatas[row] = metadata
+        self._documents[row] = document
+
+    def _write_header(self):
+        tmp_path = self._header_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "dim": self._dim,
+                "count": self._count,
+                "vectors": os.path.basename(self._vectors_path),
+                "records": os.path.basename(self._records_path),
+            }, f)
+        os.replace(tmp_path, self._header_path)
+
+    def _ensure_capacity(self, needed: int):
+        if needed <= self._capacity:
+            return
+        capacity = max(self._INITIAL_CAPACITY, self._capacity)
+        while capacity < needed:
+            capacity *= 2
+        if self._matrix is not None:
+            self._matrix.flush()
+            del self._matrix
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(capacity * self._dim * 4)
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self._dim))
+        self._capacity = capacity
+        logger.debug(f"Grew NumPy vector index capacity to {capacity} rows.")
+
+    def add(self, ids: list, embeddings: list, metadatas: list, documents: list = None):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        documents = documents if documents is not None else [None] * len(ids)
+        with self._lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+            if vectors.shape[1] != self._dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self._dim}.")
+            rows = []
+            next_row = self._count
+            assigned = {}
+            for id in ids:
+                row = self._rows.get(id, assigned.get(id))
+                if row is None:
+                    if self._free:
+                        row = self._free.pop()
+                    else:
+                        row = next_row
+                        next_row += 1
+                    assigned[id] = row
+                rows.append(row)
+            self._ensure_capacity(next_row)
+
+            rows = np.asarray(rows)
+            if len(rows) and rows.min() < self._count:
+                self._version += 1
+            self._matrix[rows] = vectors
+            self._matrix.flush()
+            norms = np.einsum("ij,ij->i", vectors, vectors).astype(np.float32)
+            if next_row > self._count:
+                grown = next_row - self._count
+                self._norms = np.concatenate([self._norms, np.zeros(grown, dtype=np.float32)])
+                self._document_ids = np.concatenate([self._document_ids, np.full(grown, -1, dtype=np.int64)])
+                if self.quantization == "int8":
+                    self._codes = np.concatenate([self._codes.reshape(-1, self._dim), np.zeros((grown, self._dim), dtype=np.int8)])
+                    self._scales = np.concatenate([self._scales, np.ones(grown, dtype=np.float32)])
+                for rows_list in (self._ids, self._metadatas, self._documents):
+                    rows_list.extend([None] * grown)
+            self._norms[rows] = norms
+            if self.quantization == "int8":
+                self._codes[rows], self._scales[rows] = self._quantize(vectors)
+            self._document_ids[rows] = [_document_id(metadata) for metadata in metadatas]
+            with open(self._records_path, "a") as f:
+                for id, row, metadata, document in zip(ids, rows.tolist(), metadatas, documents):
+                    f.write(json.dumps({"id": id, "row": row, "metadata": metadata, "document": document}) + "\n")
+                    self._set_row(row, id, metadata, document)
+                    self._rows[id] = row
+            self._count = next_row
+            self._write_header()
+
+    def _filter_rows(self, where: dict, count: int):
+        """
+        Rows matching `where`, or None when every row is a candidate.
+        """
+        if not where:
+            return None
+        condition = where.get("document_id") if len(where) == 1 else None
+        if isinstance(condition, int):
+            return np.flatnonzero(self._document_ids[:count] == condition)
+        if isinstance(condition, dict) and list(condition) == ["$in"]:
+            return np.flatnonzero(np.isin(self._document_ids[:count], condition["$in"]))
+        return np.fromiter(
+            (row for row in range(count) if self._ids[row] is not None and matches(self._metadatas[row], where)),
+            dtype=np.int64,
+        )
+
+    def query(self, query_embeddings: list, top_k: int, where: dict = None, include: tuple = QUERY_FIELDS) -> dict:
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        # Scoring runs outside the lock, so rows may be deleted, reused or
+        # compacted meanwhile: hits are only resolved to IDs if the index
+        # version is unchanged, else the query is scored again, finally
+        # holding the lock throughout
+        for _ in range(self._QUERY_ATTEMPTS):
+            with self._lock:
+                version = self._version
+                snapshot = self._snapshot(where)
+            hits = self._score(queries, top_k, *snapshot)
+            with self._lock:
+                if self._version == version:
+                    return self._results(hits, include)
+        with self._lock:
+            return self._results(self._score(queries, top_k, *self._snapshot(where)), include)
+
+    def _snapshot(self, where: dict):
+        """
+        What a query scans, taken under the lock: the filtered rows (None for
+        all of them) and their norms and codes or float32 rows.
+        """
+        count = self._count
+        rows = self._filter_rows(where, count)
+        norms = self._norms[:count] if rows is None else self._norms[rows]
+        codes = scales = matrix = None
+        if self.quantization == "int8":
+            codes = self._codes[:count] if rows is None else self._codes[rows]
+            scales = self._scales[:count] if rows is None else self._scales[rows]
+        elif count:
+            matrix = self._matrix[:count] if rows is None else self._matrix[rows]
+        return rows, norms, codes, scales, matrix, self._matrix, self._norms
+
+    def _score(self, queries, top_k: int, rows, norms, codes, scales, matrix, vectors, all_norms) -> list:
+        """
+        The `top_k` (row, distance) pairs per query, nearest first.
+        """
+        if len(norms) == 0:
+            return [[] for _ in queries]
+        query_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+        if codes is None:
+            # ||x - q||^2 = ||x||^2 - 2 x.q + ||q||^2
+            distances = norms[None, :] - 2.0 * (queries @ matrix.T) + query_norms
+            top, top_distances = _top_k(distances, top_k)
+            if rows is not None:
+                top = rows[top]
+        else:
+            shortlist, _ = _top_k(self._approximate_distances(queries, codes, scales, norms), top_k * self.rescore_factor)
+            if rows is not None:
+                shortlist = rows[shortlist]
+            exact = all_norms[shortlist] - 2.0 * np.einsum("qkd,qd->qk", vectors[shortlist], queries) + query_norms
+            order, top_distances = _top_k(exact, top_k)
+            top = np.take_along_axis(shortlist, order, axis=1)
+        top_distances = np.maximum(top_distances, 0.0)
+
+        # Free rows only make the top-k when fewer live rows exist
+        return [
+            [(row, distance) for row, distance in zip(query_rows, row_distances) if distance != np.inf]
+            for query_rows, row_distances in zip(top.tolist(), top_distances.tolist())
+        ]
+
+    def _results(self, hits: list, include: tuple) -> dict:
+        return {
+            "ids": [[self._ids[row] for row, _ in query_hits] for query_hits in hits],
+            "distances": [[distance for _, distance in query_hits] for query_hits in hits] if "distances" in include else None,
+            "metadatas": [[self._metadatas[row] for row, _ in query_hits] for query_hits in hits] if "metadatas" in include else None,
+            "documents": [[self._documents[row] for row, _ in query_hits] for query_hits in hits] if "documents" in include else None,
+        }
+
+    def _approximate_distances(self, queries, codes, scales, norms):
+        """
+        Squared L2 distances minus ||q||^2 from the int8 codes, converting
+        one block of rows to float32 at a time.
+        """
+        distances = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), self._SCAN_BLOCK):
+            end = start + self._SCAN_BLOCK
+            dots = (queries @ codes[start:end].astype(np.float32).T) * scales[start:end]
+            distances[:, start:end] = norms[start:end] - 2.0 * dots
+        return distances
+
+    def memory(self) -> dict:
+        """
+        Bytes held in RAM for scanning, and the float32 matrix size on disk
+        (fully touched by every unquantized scan, only per candidate when
+        quantized).
+        """
+        resident = self._norms.nbytes + self._document_ids.nbytes + self._codes.nbytes + self._scales.nbytes
+        float_bytes = self._count * (self._dim or 0) * 4
+        return {
+            "quantization": self.quantization,
+            "vectors": self.count(),
+            "dim": self._dim,
+            "scan_bytes": resident + (float_bytes if self.quantization == "none" else 0),
+            "float_matrix_bytes": float_bytes,
+        }
+
+    def count(self) -> int:
+        return len(self._rows)
+
+    def get(self, ids: list = None, where: dict = None, limit: int = None, offset: int = 0, include: tuple = ("metadatas",)) -> dict:
+        with self._lock:
+            if ids is not None:
+                rows = [self._rows[id] for id in ids if id in self._rows]
+                rows = [row for row in rows if matches(self._metadatas[row], where)]
+            else:
+                rows = self._filter_rows(where, self._count)
+                rows = rows.tolist() if rows is not None else range(self._count)
+                rows = [row for row in rows if self._ids[row] is not None]
+            rows = rows[offset:offset + limit if limit is not None else None]
+            results = {"ids": [self._ids[row] for row in rows]}
+            if "metadatas" in include:
+                results["metadatas"] = [self._metadatas[row] for row in rows]
+            if "documents" in include:
+                results["documents"] = [self._documents[row] for row in rows]
+            if "embeddings" in include:
+                results["embeddings"] = np.array(self._matrix[rows]) if rows else np.zeros((0, self._dim or 0), dtype=np.float32)
+            return results
+
+    def migrate_documents(self, batch_size: int = 1000) -> int:
+        # One lock hold and records write per batch, so queries and writes
+        # interleave with a long migration
+        migrated = 0
+        with self._lock:
+            legacy = [self._ids[row] for row in range(self._count) if self._metadatas[row] and "chunk_text" in self._metadatas[row]]
+        for start in range(0, len(legacy), batch_size):
+            with self._lock, open(self._records_path, "a") as f:
+                for id in legacy[start:start + batch_size]:
+                    row = self._rows.get(id)
+                    if row is None or "chunk_text" not in (self._metadatas[row] or {}):
+                        continue
+                    metadata = dict(self._metadatas[row])
+                    document = metadata.pop("chunk_text")
+                    f.write(json.dumps({"id": id, "row": row, "metadata": metadata, "document": document}) + "\n")
+                    self._set_row(row, id, metadata, document)
+                    migrated += 1
+        return migrated
+
+    def delete(self, ids: list = None, where: dict = None):
+        with self._lock:
+            rows = {self._rows[id] for id in ids or () if id in self._rows}
+            if where:
+                matched = self._filter_rows(where, self._count)
+                rows.update(row for row in matched.tolist() if self._ids[row] is not None)
+            if not rows:
+                return
+            rows = sorted(rows)
+            with open(self._records_path, "a") as f:
+                for row in rows:
+                    id = self._ids[row]
+                    f.write(json.dumps({"id": id, "row": row, "deleted": True}) + "\n")
+                    del self._rows[id]
+                    self._set_row(row, None, None, None)
+            self._version += 1
+            self._norms[rows] = np.inf
+            self._document_ids[rows] = -1
+            self._free.extend(reversed(rows))
+
+    def compact(self) -> int:
+        """
+        Rewrite the matrix and the record log with only the live rows.
+        """
+        with self._lock:
+            live = [row for row in range(self._count) if self._ids[row] is not None]
+            freed = self._count - len(live)
+            if not freed:
+                return 0
+            vectors = np.array(self._matrix[live])
+            ids = [self._ids[row] for row in live]
+            metadatas = [self._metadatas[row] for row in live]
+            documents = [self._documents[row] for row in live]
+            capacity = max(self._INITIAL_CAPACITY, len(live))
+
+            generation = uuid4().hex[:8]
+            vectors_path = os.path.join(self.path, f"vectors-{generation}.f32")
+            records_path = os.path.join(self.path, f"records-{generation}.jsonl")
+            matrix = np.memmap(vectors_path, dtype=np.float32, mode="w+", shape=(capacity, self._dim))
+            matrix[:len(live)] = vectors
+            matrix.flush()
+            with open(records_path, "w") as f:
+                for row, (id, metadata, document) in enumerate(zip(ids, metadatas, documents)):
+                    f.write(json.dumps({"id": id, "row": row, "metadata": metadata, "document": document}) + "\n")
+
+            # The header replace is the commit point: until then, a restart
+            # loads the old files
+            old_paths = (self._vectors_path, self._records_path)
+            self._vectors_path, self._records_path = vectors_path, records_path
+            self._count = len(live)
+            self._write_header()
+            self._matrix.flush()
+            for old_path in old_paths:
+                os.remove(old_path)
+
+            self._matrix = matrix
+            self._capacity = capacity
+            self._ids = ids
+            self._metadatas = metadatas
+            self._documents = documents
+            self._rows = {id: row for row, id in enumerate(ids)}
+            self._norms = np.einsum("ij,ij->i", vectors, vectors).astype(np.float32)
+            self._document_ids = np.array([_document_id(metadata) for metadata in metadatas], dtype=np.int64)
+            if self.quantization == "int8":
+                self._codes, self._scales = self._quantize(vectors)
+            self._free = []
+            self._version += 1
+        logger.info(f"Compacted NumPy vector index: freed {freed} rows, {len(live)} left.")
+        return freed
+
+def _top_k(distances, k: int):
+    """
+    Indices and values of the `k` smallest distances per row, ascending.
+    """
+    n = distances.shape[1]
+    k = min(k, n)
+    if k < n:
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(n), distances.shape)
+    top_distances = np.take_along_axis(distances, top, axis=1)
+    order = np.argsort(top_distances, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_distances, order, axis=1)
+
+def _document_id(metadata) -> int:
+    document_id = (metadata or {}).get("document_id")
+    return document_id if isinstance(document_id, int) else -1
+
+def matches(metadata: dict, where: dict = None) -> bool:
+    """
+    Evaluate a Chroma-style `where` filter against one metadata dict.
+    Supports field equality, `$eq`, `$ne`, `$in`, `$nin` and `$and`/`$or`.
+    """
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(metadata, clause) for clause in condition):
+                return False
+        else:
+            value = metadata.get(key)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for operator, operand in condition.items():
+                if operator == "$eq":
+                    ok = value == operand
+                elif operator == "$ne":
+                    ok = value != operand
+                elif operator == "$in":
+                    ok = value in operand
+                elif operator == "$nin":
+                    ok = value not in operand
+                else:
+                    raise ValueError(f"Unsupported filter operator '{operator}'.")
+                if not ok:
+                    return False
+    return True
@@ -1,45 +1,255 @@
-from app.utils.pdf_utils import extract_pages_from_pdf, chunk_text
-from app.services.embeddings import embed_text
-from app.services.vector_store import add_vector
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import hashlib
+from itertools import islice
+from sqlalchemy import delete, insert, select, update
+from app.config import settings
+from app.utils.pdf_utils import iter_pages_from_pdf, chunk_text
+from app.utils.pipeline import prefetch
+from app.utils.telemetry import record_ingested, stage, timed
+from app.services.embeddings import embed_texts, iter_batches
+from app.services.vector_store import add_vectors, delete_vectors, get_vectors, notify_changed
+from app.services.semantic_cache import food_answer_cache
 from loguru import logger
 from app.models import DocumentPage
 
-@logger.catch
-def process_document(db, doc):
+@logger.catch(reraise=True)
+@timed("ingest_document")
+def process_document(db, doc, claim):
+    """
+    Extract, chunk, embed and index a document as a streaming pipeline.
+    `claim` is the caller's `DocumentClaim` on the document: it is renewed
+    as pages are stored and released when the document is marked
+    processed, which raises ClaimLostError instead when another job has
+    taken the document over.
+
+    Pages are extracted on a background thread into a bounded queue of
+    `INGESTION_PREFETCH_PAGES`, chunked as they arrive and streamed into
+    `index_chunks`, which stops pulling chunks while `EMBEDDING_CONCURRENCY`
+    batches are in flight. Extraction, embedding and vector writes overlap,
+    and memory stays bounded regardless of document size.
+
+    DocumentPage rows are inserted as pages arrive, one INSERT per
+    `INGESTION_PAGE_BATCH` pages, and each page is flagged `is_processed`
+    once all of its chunks are stored, so progress can be tracked and
+    resumed per page.
+
+    The same run re-indexes a document whose file was replaced: processed
+    pages whose content hash is unchanged are skipped, and of the other
+    pages only chunks whose hash (of title and text) differs from the
+    stored vector's are embedded again. Vectors of chunks and pages that no
+    longer exist, and the rows of vanished pages, are removed at the end.
+    """
     logger.info(f"Starting processing of document ID: {doc.id}, Title: {doc.title}")
+    pages = prefetch(iter_pages_from_pdf(doc.file_path), settings.INGESTION_PREFETCH_PAGES, name=f"extract-doc{doc.id}")
     try:
-        pages = extract_pages_from_pdf(doc.file_path)
-        logger.info(f"Extracted {len(pages)} pages from PDF.")
-        
-        for page_number, content in pages:
-            logger.debug(f"Processing page {page_number}.")
-            # Store DocumentPage in DB
-            page_obj = DocumentPage(document_id=doc.id, page_number=page_number, content=content)
-            db.add(page_obj)
-            db.commit()
-            db.refresh(page_obj)
-            logger.debug(f"Stored DocumentPage ID: {page_obj.id} in database.")
-
-            # Chunk content
-            chunks = chunk_text(content)
-            logger.debug(f"Chunked page {page_number} into {len(chunks)} chunks.")
-
-            for i, chunk in enumerate(chunks):
-                emb = embed_text(chunk)
-                metadata = {
-                    "document_id": doc.id,
-                    "page_number": page_number,
-                    "chunk_id": i,
-                    "title": doc.title,
-                    "chunk_text": chunk
-                }
-                vector_id = f"doc{doc.id}_p{page_number}_c{i}"
-                add_vector(vector_id, emb, metadata)
-                logger.debug(f"Added vector ID: {vector_id} to ChromaDB.")
-
-        doc.is_processed = True
-        db.commit()
+        page_rows = {
+            page_number: (page_id, is_processed, content_hash)
+            for page_id, page_number, is_processed, content_hash in db.execute(
+                select(DocumentPage.id, DocumentPage.page_number, DocumentPage.is_processed, DocumentPage.content_hash)
+                .where(DocumentPage.document_id == doc.id)
+            )
+        }
+        # Chunks already in the vector store, when resuming or re-indexing
+        indexed_chunks = _indexed_chunks(doc.id) if page_rows else {}
+        remaining = {}  # chunks not yet stored, per page in flight
+        seen_pages = set()
+        chunked_pages = set()
+        chunk_ids = set()
+        unchanged = 0
+
+        def chunk_stream():
+            nonlocal unchanged
+            for group in _grouped(pages, settings.INGESTION_PAGE_BATCH):
+                claim.renew()
+                _store_pages(db, doc, group, page_rows)
+                done_pages = []
+                for page_number, content in group:
+                    seen_pages.add(page_number)
+                    page_id, is_processed, _ = page_rows[page_number]
+                    if is_processed:
+                        logger.debug("Page {} already processed and unchanged, skipping.", page_number)
+                        continue
+
+                    # Chunk content
+                    with stage("ingest_chunk"):
+                        chunks = chunk_text(content)
+                    record_ingested("page")
+                    logger.debug("Chunked page {} into {} chunks.", page_number, len(chunks))
+                    chunked_pages.add(page_number)
+
+                    changed = []
+                    for i, chunk in enumerate(chunks):
+                        chunk_id = f"doc{doc.id}_p{page_number}_c{i}"
+                        chunk_hash = content_hash(f"{doc.title}\0{chunk}")
+                        chunk_ids.add(chunk_id)
+                        if indexed_chunks.get(chunk_id, (None, None))[1] == chunk_hash:
+                            unchanged += 1
+                            continue
+                        changed.append((chunk_id, chunk, {
+                            "document_id": doc.id,
+                            "page_number": page_number,
+                            "chunk_id": i,
+                            "title": doc.title,
+                            "chunk_hash": chunk_hash
+                        }))
+                    if not changed:
+                        done_pages.append(page_id)
+                        continue
+                    remaining[page_number] = len(changed)
+                    yield from changed
+                if done_pages:
+                    with stage("ingest_db"):
+                        _mark_processed(db, done_pages)
+                        db.commit()
+
+        def mark_pages(batch):
+            claim.renew()
+            done = []
+            for _, _, metadata in batch:
+                page_number = metadata["page_number"]
+                remaining[page_number] -= 1
+                if remaining[page_number] == 0:
+                    del remaining[page_number]
+                    done.append(page_rows[page_number][0])
+            if done:
+                with stage("ingest_db"):
+                    _mark_processed(db, done)
+                    db.commit()
+
+        indexed = index_chunks(chunk_stream(), on_batch_done=mark_pages)
+        removed = _remove_stale(db, doc, indexed_chunks, seen_pages, chunked_pages, chunk_ids)
+        logger.info(f"Indexed {indexed} chunks from {len(seen_pages)} pages ({unchanged} unchanged, {removed} stale removed).")
+        # New context can change food answers, so cached ones are stale, here
+        # and in the processes sharing the vector store
+        food_answer_cache.invalidate()
+        notify_changed()
+
+        claim.release(is_processed=True)
         logger.info(f"Document ID: {doc.id} processed successfully.")
     except Exception as e:
         logger.exception(f"Failed to process document ID: {doc.id}.")
-        raise
\ No newline at end of file
+        raise
+    finally:
+        pages.close()
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _grouped(iterable, size: int):
+    iterator = iter(iterable)
+    while group := list(islice(iterator, size)):
+        yield group
+
+def _indexed_chunks(document_id: int) -> dict:
+    """
+    Map the document's stored vector IDs to (page_number, chunk_hash).
+    Vectors from before chunk hashing have no hash and are re-embedded.
+    """
+    stored = get_vectors(where={"document_id": document_id})
+    return {
+        id: (metadata.get("page_number"), metadata.get("chunk_hash"))
+        for id, metadata in zip(stored["ids"], stored["metadatas"])
+    }
+
+@timed("ingest_db")
+def _store_pages(db, doc, pages: list, page_rows: dict):
+    """
+    Insert the DocumentPage rows missing from `page_rows` with one
+    INSERT ... RETURNING, and rewrite (as unprocessed) the rows whose
+    content hash changed with one bulk UPDATE.
+    """
+    new_pages = []
+    changed_pages = []
+    for page_number, content in pages:
+        page_hash = content_hash(content)
+        row = page_rows.get(page_number)
+        if row is None:
+            new_pages.append({
+                "document_id": doc.id, "page_number": page_number, "content": content,
+                "content_hash": page_hash, "is_processed": False
+            })
+        elif row[2] != page_hash:
+            changed_pages.append({"id": row[0], "content": content, "content_hash": page_hash, "is_processed": False})
+            page_rows[page_number] = (row[0], False, page_hash)
+    if new_pages:
+        inserted = db.execute(insert(DocumentPage).returning(DocumentPage.id, DocumentPage.page_number, DocumentPage.content_hash), new_pages)
+        page_rows.update({page_number: (page_id, False, page_hash) for page_id, page_number, page_hash in inserted})
+    if changed_pages:
+        db.execute(update(DocumentPage), changed_pages)
+    if new_pages or changed_pages:
+        db.commit()
+        logger.debug("Stored {} new and {} changed DocumentPage rows in database.", len(new_pages), len(changed_pages))
+
+def _remove_stale(db, doc, indexed_chunks: dict, seen_pages: set, chunked_pages: set, chunk_ids: set) -> int:
+    """
+    After a complete run, delete the vectors of pages that no longer exist
+    and of chunk positions past the end of re-chunked pages, then the
+    DocumentPage rows of pages that no longer exist. Returns the number of
+    vectors deleted.
+    """
+    stale = [
+        id for id, (page_number, _) in indexed_chunks.items()
+        if page_number not in seen_pages or (page_number in chunked_pages and id not in chunk_ids)
+    ]
+    if stale:
+        delete_vectors(ids=stale)
+    with stage("ingest_db"):
+        result = db.execute(
+            delete(DocumentPage)
+            .where(DocumentPage.document_id == doc.id, DocumentPage.page_number.not_in(sorted(seen_pages)))
+        )
+        db.commit()
+    if stale or result.rowcount:
+        logger.info(f"Removed {len(stale)} stale vectors and {result.rowcount} stale pages of document ID: {doc.id}.")
+    return len(stale)
+
+def _mark_processed(db, page_ids: list):
+    """
+    Flag pages as processed with a single UPDATE.
+    """
+    if page_ids:
+        db.execute(update(DocumentPage).where(DocumentPage.id.in_(page_ids)).values(is_processed=True))
+
+def index_chunks(chunks, on_batch_done=None) -> int:
+    """
+    Embed and store a stream of (id, text, metadata) chunks in token- and
+    count-bounded batches, the text as the vector's document. Returns the
+    number of chunks indexed.
+
+    Each batch is embedded with one embeddings request and written to the
+    vector store with one `add_vectors` call as soon as its embeddings
+    arrive. At most `EMBEDDING_CONCURRENCY` requests are in flight; while
+    they all are, `chunks` is not advanced, which pushes back on whatever
+    produces it. `on_batch_done(batch)` is called from the calling thread
+    after each batch is stored.
+    """
+    indexed = 0
+    pending = {}
+
+    def store_completed(return_when):
+        nonlocal indexed
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            batch = pending.pop(future)
+            embeddings = future.result()
+            add_vectors([chunk[0] for chunk in batch], embeddings, [chunk[2] for chunk in batch], [chunk[1] for chunk in batch])
+            indexed += len(batch)
+            record_ingested("chunk", len(batch))
+            logger.debug("Indexed batch of {} chunks ({} so far).", len(batch), indexed)
+            if on_batch_done:
+                on_batch_done(batch)
+
+    with ThreadPoolExecutor(max_workers=settings.EMBEDDING_CONCURRENCY) as executor:
+        try:
+            for _, batch in iter_batches(chunks, key=lambda chunk: chunk[1]):
+                if len(pending) >= settings.EMBEDDING_CONCURRENCY:
+                    store_completed(FIRST_COMPLETED)
+                pending[executor.submit(embed_texts, [chunk[1] for chunk in batch])] = batch
+            while pending:
+                store_completed(FIRST_COMPLETED)
+        except Exception:
+            # Don't keep paying for embeddings of a document that already failed
+            for future in pending:
+                future.cancel()
+            raise
+    return indexed
@@ -0,0 +1,150 @@
+import asyncio
+import time
+from collections import OrderedDict
+from threading import Lock
+import numpy as np
+from loguru import logger
+from app.config import settings
+from app.services.container import services
+from app.utils.telemetry import record_cache
+
+class SemanticCache:
+    """
+    In-memory answer cache keyed on query embeddings.
+
+    A lookup returns the stored answer of the most similar cached query when
+    their cosine similarity is at least `threshold`. Entries expire after
+    `ttl_seconds` and the least recently used entry is evicted once
+    `max_size` entries are stored. `invalidate()` drops everything, e.g.
+    when new documents change what retrieval would return.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float, threshold: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._lock = Lock()
+        self._vectors = None  # (max_size, dim) matrix of normalized embeddings, allocated on first store
+        self._occupied = np.zeros(max_size, dtype=bool)
+        self._entries = OrderedDict()  # slot -> (answer, expires_at), in LRU order
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _evict(self, slot: int):
+        del self._entries[slot]
+        self._occupied[slot] = False
+
+    def lookup(self, embedding):
+        """
+        Return `(answer, generation)`; `answer` is None on a miss. Pass the
+        generation back to `store` so answers computed before an
+        invalidation are not cached.
+        """
+        query = self._normalize(embedding)
+        with self._lock:
+            generation = self._generation
+            if not self._entries or self._vectors is None or self._vectors.shape[1] != query.shape[0]:
+                self._misses += 1
+                record_cache("semantic", "miss")
+                return None, generation
+            similarities = self._vectors @ query
+            similarities[~self._occupied] = -np.inf
+            slot = int(np.argmax(similarities))
+            if similarities[slot] >= self.threshold:
+                answer, expires_at = self._entries[slot]
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(slot)
+                    self._hits += 1
+                    record_cache("semantic", "hit")
+                    logger.debug("Semantic cache hit (similarity={:.4f}).", similarities[slot])
+                    return answer, generation
+                self._evict(slot)
+            self._misses += 1
+            record_cache("semantic", "miss")
+            return None, generation
+
+    def store(self, embedding, answer: str, generation: int = None):
+        vector = self._normalize(embedding)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                logger.debug("Skipping semantic cache store for an answer computed before invalidation.")
+                return
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+                self._occupied[:] = False
+                self._entries.clear()
+            now = time.monotonic()
+            for slot in [slot for slot, (_, expires_at) in self._entries.items() if expires_at <= now]:
+                self._evict(slot)
+            if len(self._entries) >= self.max_size:
+                slot, _ = self._entries.popitem(last=False)
+                self._occupied[slot] = False
+                self._evictions += 1
+            slot = int(np.argmin(self._occupied))
+            self._vectors[slot] = vector
+            self._occupied[slot] = True
+            self._entries[slot] = (answer, now + self.ttl_seconds)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._occupied[:] = False
+            self._generation += 1
+            self._invalidations += 1
+        logger.info("Semantic cache invalidated.")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": settings.SEMANTIC_CACHE_ENABLED,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+food_answer_cache = SemanticCache(
+    max_size=settings.SEMANTIC_CACHE_MAX_SIZE,
+    ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+)
+
+async def watch_corpus_changes(interval: float):
+    """
+    Invalidate `food_answer_cache` whenever the shared vector store's
+    version changes, i.e. another process ingested or removed documents.
+    Returns at once when the backend isn't shared.
+    """
+    try:
+        backend = await asyncio.to_thread(lambda: services.vector_backend)
+    except Exception:
+        logger.exception("Vector store unavailable; not watching it for changes.")
+        return
+    if not backend.shared:
+        return
+    logger.info("Watching the {} vector store for changes every {}s.", backend.name, interval)
+    last = None
+    while True:
+        try:
+            version = await asyncio.to_thread(backend.version)
+        except Exception as e:
+            logger.warning("Failed to read the vector store version: {}", e)
+        else:
+            if last is not None and version != last:
+                logger.info("Vector store changed in another process.")
+                food_answer_cache.invalidate()
+            last = version
+        await asyncio.sleep(interval)
@@ -0,0 +1,111 @@
+import asyncio
+import time
+from threading import Lock
+from loguru import logger
+from app.config import settings
+from app.services.llm_classifier import classify_message
+from app.services.llm_food_rag import prepare_food_answer
+from app.services.weather_service import get_weather_for_newyork
+
+class SpeculationStats:
+    """
+    Tracks speculative work started alongside classification: how often it
+    was used or wasted, the latency it saved, and the upstream work thrown away.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._kinds = {}
+
+    def _kind(self, kind: str) -> dict:
+        return self._kinds.setdefault(kind, {
+            "started": 0,
+            "used": 0,
+            "wasted": 0,
+            "saved_seconds": 0.0,
+            "wasted_seconds": 0.0,
+        })
+
+    def record_used(self, kind: str, saved_seconds: float):
+        with self._lock:
+            stats = self._kind(kind)
+            stats["started"] += 1
+            stats["used"] += 1
+            stats["saved_seconds"] += saved_seconds
+
+    def record_wasted(self, kind: str, wasted_seconds: float):
+        with self._lock:
+            stats = self._kind(kind)
+            stats["started"] += 1
+            stats["wasted"] += 1
+            stats["wasted_seconds"] += wasted_seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = {"enabled": settings.SPECULATIVE_EXECUTION}
+            for kind, stats in self._kinds.items():
+                started = stats["started"]
+                result[kind] = {
+                    **stats,
+                    "waste_rate": stats["wasted"] / started if started else 0.0,
+                    "avg_saved_ms": stats["saved_seconds"] * 1000 / stats["used"] if stats["used"] else 0.0,
+                }
+            return result
+
+speculation_stats = SpeculationStats()
+
+async def _timed(coro):
+    started = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - started
+
+async def _settle(kind: str, task: asyncio.Task, started: float, classified_at: float, wanted: bool):
+    """
+    Use or discard a speculative task. Returns its result when wanted.
+    """
+    if wanted:
+        try:
+            result, duration = await task
+        except Exception:
+            # The caller falls back to doing the work itself
+            logger.exception(f"Speculative {kind} failed.")
+            return None
+        # Latency gained is the part of the work that overlapped classification
+        speculation_stats.record_used(kind, min(duration, classified_at - started))
+        return result
+    if task.done():
+        wasted = task.result()[1] if not task.cancelled() and task.exception() is None else classified_at - started
+    else:
+        task.cancel()
+        wasted = time.perf_counter() - started
+    speculation_stats.record_wasted(kind, wasted)
+    logger.debug("Discarded speculative {} after {:.0f} ms.", kind, wasted * 1000)
+    return None
+
+async def classify_with_speculation(content: str, where: dict = None):
+    """
+    Classify `content` while food retrieval (scoped by `where`, and
+    optionally the weather fetch) runs in parallel. Returns
+    (classification, prepared_food, weather_data); the speculative results
+    are None when unused or when `SPECULATIVE_EXECUTION` is off.
+    """
+    if not settings.SPECULATIVE_EXECUTION:
+        return await classify_message(content), None, None
+
+    started = time.perf_counter()
+    retrieval_task = asyncio.ensure_future(_timed(prepare_food_answer(content, where)))
+    weather_task = asyncio.ensure_future(_timed(get_weather_for_newyork())) if settings.SPECULATIVE_WEATHER else None
+    try:
+        classification = await classify_message(content)
+    except BaseException:
+        retrieval_task.cancel()
+        if weather_task:
+            weather_task.cancel()
+        raise
+    classified_at = time.perf_counter()
+
+    prepared = await _settle("retrieval", retrieval_task, started, classified_at, classification == "food")
+    weather_data = None
+    if weather_task:
+        weather_data = await _settle("weather", weather_task, started, classified_at, classification == "weather")
+    return classification, prepared, weather_data
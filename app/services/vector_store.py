@@ -1,28 +1,310 @@
-import chromadb
-from chromadb.config import Settings
+from uuid import uuid4
 from loguru import logger
+from app.config import settings
+from app.services.container import services
+from app.utils.telemetry import stage
 
-client = chromadb.PersistentClient(path="./.chromadb")
-collection = client.get_or_create_collection(name="documents")
-logger.info("ChromaDB collection 'documents' initialized.")
+# What retrieval asks for by default: the chunk text and its distance. The
+# metadata (document, page, title) is only needed to filter or cite.
+QUERY_FIELDS = ("documents", "distances")
+
+class VectorBackend:
+    """
+    Interface for vector storage backends.
+
+    Each vector carries the chunk text as its document and a small metadata
+    dict used for filtering. `query` returns Chroma-shaped results: a dict
+    of `ids` plus the `include`d fields (`documents`, `distances`,
+    `metadatas`), each holding one list per query embedding; fields not
+    included are None. `where` takes Chroma's metadata filter syntax.
+    Distances are squared L2, like Chroma's default space.
+
+    `shared` backends are served by a separate process, so every app worker
+    (and node) sees writes as soon as they are made; the others live inside
+    one process and must not be opened by several workers at once.
+    """
+
+    name = "base"
+    shared = False
+
+    def add(self, ids: list, embeddings: list, metadatas: list, documents: list = None):
+        """
+        Insert or replace vectors by ID.
+        """
+        raise NotImplementedError
+
+    def query(self, query_embeddings: list, top_k: int, where: dict = None, include: tuple = QUERY_FIELDS) -> dict:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def get(self, ids: list = None, where: dict = None, limit: int = None, offset: int = 0, include: tuple = ("metadatas",)) -> dict:
+        """
+        The vectors with the given IDs and/or matching `where` (all of them
+        when both are None), as `{"ids": [...], <field>: [...]}` for each
+        `include`d field (`metadatas`, `documents`, `embeddings`).
+        """
+        raise NotImplementedError
+
+    def migrate_documents(self, batch_size: int = 1000) -> int:
+        """
+        Move the chunk text of vectors written before it was stored as the
+        document out of their `chunk_text` metadata. Returns the number of
+        vectors migrated.
+        """
+        raise NotImplementedError
+
+    def delete(self, ids: list = None, where: dict = None):
+        """
+        Remove vectors by ID and/or by `where` filter.
+        """
+        raise NotImplementedError
+
+    def compact(self) -> int:
+        """
+        Reclaim the space of deleted vectors. Returns the number of slots
+        freed; backends that manage their own storage return 0.
+        """
+        return 0
+
+    def version(self):
+        """
+        Opaque marker that changes whenever the indexed corpus does, so
+        other processes can notice new or removed content.
+        """
+        return self.count()
+
+    def mark_changed(self):
+        """
+        Publish a new `version()` after a batch of writes.
+        """
+
+class ChromaBackend(VectorBackend):
+    name = "chroma"
+
+    def __init__(self, path: str, collection_name: str = "documents"):
+        # Imported here: chromadb alone takes a large share of the app's import time
+        import chromadb
+        self.client = chromadb.PersistentClient(path=path)
+        self.collection = self.client.get_or_create_collection(name=collection_name)
+        logger.info(f"ChromaDB collection '{collection_name}' initialized.")
+
+    def add(self, ids: list, embeddings: list, metadatas: list, documents: list = None):
+        # Chroma caps the number of records per call
+        step = self.client.get_max_batch_size()
+        for start in range(0, len(ids), step):
+            self.collection.upsert(
+                ids=ids[start:start + step],
+                embeddings=embeddings[start:start + step],
+                metadatas=metadatas[start:start + step],
+                documents=documents[start:start + step] if documents is not None else None
+            )
+
+    def query(self, query_embeddings: list, top_k: int, where: dict = None, include: tuple = QUERY_FIELDS) -> dict:
+        return self.collection.query(query_embeddings=query_embeddings, n_results=top_k, where=where, include=list(include))
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def get(self, ids: list = None, where: dict = None, limit: int = None, offset: int = 0, include: tuple = ("metadatas",)) -> dict:
+        results = self.collection.get(ids=ids, where=where, limit=limit, offset=offset or None, include=list(include))
+        return {"ids": results["ids"], **{field: results[field] for field in include}}
+
+    def migrate_documents(self, batch_size: int = 1000) -> int:
+        migrated = 0
+        offset = 0
+        while True:
+            batch = self.get(limit=batch_size, offset=offset, include=("metadatas", "embeddings"))
+            if not len(batch["ids"]):
+                return migrated
+            legacy = [i for i, metadata in enumerate(batch["metadatas"]) if "chunk_text" in metadata]
+            if legacy:
+                # Embeddings are passed along so Chroma doesn't embed the
+                # documents itself; a None metadata value drops the key
+                self.collection.update(
+                    ids=[batch["ids"][i] for i in legacy],
+                    embeddings=[batch["embeddings"][i] for i in legacy],
+                    documents=[batch["metadatas"][i]["chunk_text"] for i in legacy],
+                    metadatas=[{"chunk_text": None} for _ in legacy]
+                )
+                migrated += len(legacy)
+            offset += len(batch["ids"])
+
+    def delete(self, ids: list = None, where: dict = None):
+        if ids is not None:
+            step = self.client.get_max_batch_size()
+            for start in range(0, len(ids), step):
+                self.collection.delete(ids=ids[start:start + step])
+        if where is not None:
+            self.collection.delete(where=where)
+
+    def version(self):
+        collection = self.client.get_collection(self.collection.name)
+        return (collection.metadata or {}).get("corpus_version")
+
+    def mark_changed(self):
+        # The collection metadata doubles as the change notification: readers
+        # poll it through `version()`. hnsw:* settings can't be re-submitted.
+        metadata = {key: value for key, value in (self.collection.metadata or {}).items() if not key.startswith("hnsw:")}
+        self.collection.modify(metadata={**metadata, "corpus_version": uuid4().hex})
+
+class ChromaServerBackend(ChromaBackend):
+    """
+    Chroma in client/server mode. Every worker process and node talks to
+    one Chroma server (e.g. `chroma run --path ./.chromadb --port 8001`), so
+    no process opens the index files itself: query throughput scales with
+    the number of app workers while ingestion writes from its own process.
+    """
+
+    name = "chroma_server"
+    shared = True
+
+    def __init__(self, host: str, port: int, ssl: bool = False, token: str = None, collection_name: str = "documents"):
+        import chromadb
+        headers = {"Authorization": f"Bearer {token}"} if token else None
+        self.client = chromadb.HttpClient(host=host, port=port, ssl=ssl, headers=headers)
+        self.collection = self.client.get_or_create_collection(name=collection_name)
+        logger.info("ChromaDB collection '{}' on {}:{} initialized.", collection_name, host, port)
+
+def create_backend(name: str = None) -> VectorBackend:
+    name = name or settings.VECTOR_BACKEND
+    if name == "chroma":
+        return ChromaBackend(settings.CHROMA_PATH)
+    if name == "chroma_server":
+        return ChromaServerBackend(settings.CHROMA_HOST, settings.CHROMA_PORT, settings.CHROMA_SSL, settings.CHROMA_AUTH_TOKEN)
+    if name == "numpy":
+        from app.services.numpy_index import NumpyIndexBackend
+        return NumpyIndexBackend(settings.NUMPY_INDEX_PATH, settings.NUMPY_INDEX_QUANTIZATION, settings.NUMPY_INDEX_RESCORE_FACTOR)
+    raise ValueError(f"Unknown vector backend '{name}'.")
 
 @logger.catch
-def add_vector(id: str, embedding: list, metadata: dict):
-    logger.info(f"Adding vector with ID: {id} and metadata: {{'document_id': {metadata.get('document_id')}, 'page_number': {metadata.get('page_number')}, 'chunk_id': {metadata.get('chunk_id')}}}")
+def add_vector(id: str, embedding: list, metadata: dict, document: str = None):
+    backend = services.vector_backend
+    logger.debug("Adding vector with ID: {} (document_id={}, page_number={}, chunk_id={})", id, metadata.get('document_id'), metadata.get('page_number'), metadata.get('chunk_id'))
+    try:
+        backend.add([id], [embedding], [metadata], [document] if document is not None else None)
+        logger.debug("Vector {} added to {} successfully.", id, backend.name)
+    except Exception as e:
+        logger.exception(f"Failed to add vector {id} to {backend.name}.")
+        raise
+
+def add_vectors(ids: list, embeddings: list, metadatas: list, documents: list = None):
+    """
+    Add a batch of vectors with a single backend call. Existing IDs are
+    replaced, which keeps resumed ingestion jobs idempotent.
+    """
+    backend = services.vector_backend
+    logger.debug("Adding batch of {} vectors to {}.", len(ids), backend.name)
     try:
-        collection.add(ids=[id], embeddings=[embedding], metadatas=[metadata])
-        logger.debug(f"Vector {id} added to ChromaDB successfully.")
+        with stage("vector_write"):
+            backend.add(ids, embeddings, metadatas, documents)
+        logger.debug("Batch of {} vectors added to {} successfully.", len(ids), backend.name)
     except Exception as e:
-        logger.exception(f"Failed to add vector {id} to ChromaDB.")
+        logger.exception(f"Failed to add batch of {len(ids)} vectors to {backend.name}.")
         raise
 
+def scope_filter(document_ids: list = None, titles: list = None):
+    """
+    Metadata filter restricting a query to the given documents and/or
+    titles, or None for the whole corpus.
+    """
+    clauses = []
+    if document_ids:
+        clauses.append({"document_id": {"$in": list(document_ids)}})
+    if titles:
+        clauses.append({"title": {"$in": list(titles)}})
+    if len(clauses) > 1:
+        return {"$and": clauses}
+    return clauses[0] if clauses else None
+
+def _fill_legacy_documents(backend, results: dict):
+    # Vectors written before the chunk text became the document still carry
+    # it in their metadata until `python -m app.migrate_vectors` is run
+    legacy = {id for ids, documents in zip(results["ids"], results["documents"]) for id, document in zip(ids, documents) if document is None}
+    if not legacy:
+        return
+    logger.warning("{} retrieved vectors have no document; run `python -m app.migrate_vectors`.", len(legacy))
+    stored = backend.get(ids=list(legacy))
+    texts = {id: (metadata or {}).get("chunk_text") for id, metadata in zip(stored["ids"], stored["metadatas"])}
+    results["documents"] = [
+        [document if document is not None else texts.get(id) for id, document in zip(ids, documents)]
+        for ids, documents in zip(results["ids"], results["documents"])
+    ]
+
 @logger.catch
-def query_vectors(query_embedding: list, top_k: int = 3):
-    logger.info("Querying vectors from ChromaDB.")
+def query_vectors(query_embedding: list, top_k: int = 3, where: dict = None, include: tuple = QUERY_FIELDS):
+    """
+    The `top_k` nearest vectors to one embedding among those matching
+    `where`, with only the `include`d fields.
+    """
+    backend = services.vector_backend
+    logger.debug("Querying vectors from {}.", backend.name)
     try:
-        results = collection.query(query_embeddings=[query_embedding], n_results=top_k)
-        logger.debug(f"Retrieved {len(results['documents'][0])} vectors from ChromaDB.")
+        with stage("vector_query"):
+            results = backend.query([query_embedding], top_k, where=where, include=include)
+            if "documents" in include:
+                _fill_legacy_documents(backend, results)
+        logger.debug("Retrieved {} vectors from {}.", len(results['ids'][0]), backend.name)
         return results
     except Exception as e:
-        logger.exception("Failed to query vectors from ChromaDB.")
-        raise
\ No newline at end of file
+        logger.exception(f"Failed to query vectors from {backend.name}.")
+        raise
+
+def query_vectors_batch(query_embeddings: list, top_k: int = 3, where: dict = None, include: tuple = QUERY_FIELDS):
+    """
+    Run several queries (sharing one `where` filter) in one backend call;
+    results hold one list per query.
+    """
+    backend = services.vector_backend
+    logger.debug("Querying {} vectors from {}.", len(query_embeddings), backend.name)
+    try:
+        with stage("vector_query_batch"):
+            results = backend.query(query_embeddings, top_k, where=where, include=include)
+            if "documents" in include:
+                _fill_legacy_documents(backend, results)
+            return results
+    except Exception as e:
+        logger.exception(f"Failed to query vectors from {backend.name}.")
+        raise
+
+def get_vectors(where: dict = None, limit: int = None, offset: int = 0) -> dict:
+    """
+    IDs and metadatas of the stored vectors matching `where`.
+    """
+    with stage("vector_get"):
+        return services.vector_backend.get(where=where, limit=limit, offset=offset)
+
+def migrate_documents(batch_size: int = 1000) -> int:
+    """
+    Migrate the vector store to chunk text stored as documents; see
+    `VectorBackend.migrate_documents`.
+    """
+    backend = services.vector_backend
+    with stage("vector_migrate"):
+        migrated = backend.migrate_documents(batch_size)
+    logger.info("Moved the chunk text of {} vectors in {} to their documents.", migrated, backend.name)
+    return migrated
+
+def delete_vectors(ids: list = None, where: dict = None):
+    """
+    Remove vectors by ID and/or metadata filter, e.g.
+    `delete_vectors(where={"document_id": 3})`.
+    """
+    backend = services.vector_backend
+    try:
+        with stage("vector_delete"):
+            backend.delete(ids=ids, where=where)
+        logger.debug("Deleted vectors from {} (ids={}, where={}).", backend.name, len(ids) if ids is not None else None, where)
+    except Exception as e:
+        logger.exception(f"Failed to delete vectors from {backend.name}.")
+        raise
+
+def notify_changed():
+    """
+    Tell other processes sharing the vector store that the corpus changed.
+    """
+    try:
+        services.vector_backend.mark_changed()
+    except Exception:
+        logger.exception("Failed to publish a vector store change.")
@@ -1,8 +1,19 @@
-import requests
+import httpx
 from loguru import logger
 from app.config import settings
+from app.services.container import services
+from app.utils.async_cache import AsyncTTLCache
+from app.utils.telemetry import stage
 
-def get_weather_for_newyork():
+# OpenWeather data only changes every few minutes; share one fetch across requests
+weather_cache = AsyncTTLCache(
+    "weather",
+    ttl_seconds=settings.WEATHER_CACHE_TTL_SECONDS,
+    stale_seconds=settings.WEATHER_CACHE_STALE_SECONDS,
+    cache_if=bool,  # don't cache the empty result of a failed fetch
+)
+
+async def _fetch_weather_for_newyork():
     params = {
         'q': 'New York',
         'appid': settings.WEATHER_API_KEY,
@@ -11,13 +22,21 @@ def get_weather_for_newyork():
     }
     logger.info("Fetching weather data for New York from OpenWeather API.")
     try:
-        response = requests.get(settings.WEATHER_API_BASE_URL, params=params, timeout=5)
-        response.raise_for_status()
+        with stage("weather_fetch"):
+            # Shared client so OpenWeather connections are kept alive between requests
+            response = await services.weather_http.get(settings.WEATHER_API_BASE_URL, params=params)
+            response.raise_for_status()
         return response.json()
-    except requests.exceptions.HTTPError as http_err:
-        logger.error(f"HTTP error occurred: {http_err} - Response: {response.text}")
-    except requests.exceptions.RequestException as req_err:
+    except httpx.HTTPStatusError as http_err:
+        logger.error(f"HTTP error occurred: {http_err} - Response: {http_err.response.text}")
+    except httpx.RequestError as req_err:
         logger.error(f"Request exception: {req_err}")
     except Exception as e:
         logger.exception(f"Unexpected error: {e}")
-    return {}
\ No newline at end of file
+    return {}
+
+async def get_weather_for_newyork():
+    """
+    Current New York weather, served from the shared TTL cache.
+    """
+    return await weather_cache.get_or_fetch("New York", _fetch_weather_for_newyork)
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from collections import OrderedDict
+from loguru import logger
+from app.utils.telemetry import record_cache
+
+class AsyncTTLCache:
+    """
+    Process-wide TTL cache for coroutine results with single-flight fetching.
+
+    - Concurrent misses for the same key share one upstream fetch.
+    - Values older than `ttl_seconds` but younger than
+      `ttl_seconds + stale_seconds` are served as-is while a single
+      background refresh runs (stale-while-revalidate).
+    - Values for which `cache_if(value)` is false (e.g. an empty error
+      result) are returned to the callers but not stored.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float, stale_seconds: float = 0, max_size: int = 128, cache_if=None):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_size = max_size
+        self.cache_if = cache_if or (lambda value: True)
+        self._entries = OrderedDict()  # key -> (value, fetched_at)
+        self._loop = None
+        self._inflight = {}  # key -> asyncio.Task, of self._loop
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._refreshes = 0
+
+    def _tasks(self) -> dict:
+        """
+        The in-flight fetches of the running event loop. A task can only be
+        awaited from its own loop, and the cache outlives any one loop (app
+        restarts, benchmark runners, test clients).
+        """
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._inflight = {}
+            self._loop = loop
+        return self._inflight
+
+    def _start_fetch(self, key, fetch):
+        inflight = self._tasks()
+
+        async def run():
+            try:
+                value = await fetch()
+                self.set(key, value)
+                return value
+            finally:
+                inflight.pop(key, None)
+
+        task = asyncio.ensure_future(run())
+        inflight[key] = task
+        return task
+
+    def _start_refresh(self, key, fetch):
+        self._refreshes += 1
+        task = self._start_fetch(key, fetch)
+
+        def log_failure(task):
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning(f"Background refresh of {self.name} cache failed: {task.exception()}")
+
+        task.add_done_callback(log_failure)
+
+    async def get_or_fetch(self, key, fetch):
+        """
+        Return the cached value for `key`, calling `fetch()` (a coroutine
+        function) when the value is missing or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl_seconds:
+                self._hits += 1
+                record_cache(self.name, "hit")
+                self._entries.move_to_end(key)
+                return value
+            if age < self.ttl_seconds + self.stale_seconds:
+                self._stale_hits += 1
+                record_cache(self.name, "stale")
+                if key not in self._tasks():
+                    logger.debug(f"Serving stale {self.name} value while it is refreshed.")
+                    self._start_refresh(key, fetch)
+                return value
+
+        task = self._tasks().get(key)
+        if task is None:
+            self._misses += 1
+            record_cache(self.name, "miss")
+            task = self._start_fetch(key, fetch)
+        else:
+            self._coalesced += 1
+            logger.debug(f"Waiting on in-flight {self.name} fetch.")
+        # Shield so a cancelled caller doesn't cancel the fetch others wait on
+        return await asyncio.shield(task)
+
+    def get(self, key):
+        """
+        Return the cached value for `key` if it is still fresh, else None.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl_seconds:
+            self._hits += 1
+            record_cache(self.name, "hit")
+            return entry[0]
+        self._misses += 1
+        record_cache(self.name, "miss")
+        return None
+
+    def set(self, key, value):
+        if self.cache_if(value):
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self._hits + self._stale_hits + self._misses + self._coalesced
+        return {
+            "size": len(self._entries),
+            "hits": self._hits,
+            "stale_hits": self._stale_hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+            "background_refreshes": self._refreshes,
+            "hit_rate": (self._hits + self._stale_hits + self._coalesced) / lookups if lookups else 0.0,
+        }
@@ -1,38 +1,152 @@
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from threading import Lock
 import pdfplumber
 from loguru import logger
+from app.config import settings
+from app.utils.tokenization import split_by_tokens
+from app.utils.telemetry import stage
 
-@logger.catch
-def extract_pages_from_pdf(file_path: str):
-    logger.info(f"Extracting pages from PDF: {file_path}")
-    pages_content = []
+_process_pool = None
+_process_pool_lock = Lock()
+
+def _get_process_pool(workers: int):
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # Spawned, not forked: the server process runs threads (the event
+            # loop's executors, ingestion workers, HTTP pools) whose locks a
+            # forked child could inherit held
+            _process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _process_pool
+
+def shutdown_process_pool(wait: bool = False):
+    """
+    Stop the extraction processes, if any were started.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+def _extraction_workers() -> int:
+    return settings.PDF_EXTRACTION_WORKERS or os.cpu_count() or 1
+
+def count_pdf_pages(file_path: str, backend: str = None) -> int:
+    backend = backend or settings.PDF_EXTRACTION_BACKEND
+    if backend == "pypdfium2":
+        import pypdfium2 as pdfium
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    with pdfplumber.open(file_path) as pdf:
+        return len(pdf.pages)
+
+def _iter_page_range(file_path: str, start: int, end: int, backend: str):
+    """
+    Yield (page_number, text) for pages [start, end) (0-based), releasing
+    each page's parsed objects once its text is out.
+    """
+    if backend == "pypdfium2":
+        import pypdfium2 as pdfium
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            for i in range(start, end):
+                with stage("pdf_extract_page"):
+                    page = pdf[i]
+                    textpage = page.get_textpage()
+                    text = textpage.get_text_bounded().replace("\r\n", "\n")
+                    textpage.close()
+                    page.close()
+                yield i+1, text
+        finally:
+            pdf.close()
+    else:
+        with pdfplumber.open(file_path, pages=list(range(start+1, end+1))) as pdf:
+            for i, page in zip(range(start, end), pdf.pages):
+                with stage("pdf_extract_page"):
+                    text = page.extract_text() or ""
+                    page.close()
+                yield i+1, text
+
+def _extract_page_range(file_path: str, start: int, end: int, backend: str):
+    """
+    Extract pages [start, end) (0-based). Runs inside pool workers, so each
+    call opens the file itself.
+    """
+    return list(_iter_page_range(file_path, start, end, backend))
+
+def iter_pages_from_pdf(file_path: str, workers: int = None, backend: str = None):
+    """
+    Yield (page_number, text) pairs in page order as they are extracted.
+
+    `backend` is `pdfplumber` (default) or the faster `pypdfium2`. Documents
+    with at least `PDF_PARALLEL_MIN_PAGES` pages are split into page ranges
+    and extracted across a process pool of `workers` processes
+    (`PDF_EXTRACTION_WORKERS`, 0 meaning one per CPU), with at most two
+    ranges per worker in flight so memory doesn't grow with the document.
+    """
+    backend = backend or settings.PDF_EXTRACTION_BACKEND
+    workers = workers or _extraction_workers()
+    logger.info(f"Extracting pages from PDF: {file_path} (backend={backend})")
     try:
-        with pdfplumber.open(file_path) as pdf:
-            for i, page in enumerate(pdf.pages):
-                text = page.extract_text() or ""
-                pages_content.append((i+1, text))
-                logger.debug(f"Extracted text from page {i+1}.")
+        total = count_pdf_pages(file_path, backend)
+        if workers <= 1 or total < settings.PDF_PARALLEL_MIN_PAGES:
+            yield from _iter_page_range(file_path, 0, total, backend)
+        else:
+            # A few ranges per worker keeps the pool busy when pages vary in cost
+            step = max(1, -(-total // (workers * 4)))
+            ranges = iter([(start, min(start + step, total)) for start in range(0, total, step)])
+            pool = _get_process_pool(workers)
+            futures = deque(pool.submit(_extract_page_range, file_path, start, end, backend) for start, end in islice(ranges, workers * 2))
+            try:
+                while futures:
+                    # Per-page timings stay in the worker processes; this is
+                    # how long the pipeline waited on them
+                    with stage("pdf_extract_wait"):
+                        pages = futures.popleft().result()
+                    for start, end in islice(ranges, 1):
+                        futures.append(pool.submit(_extract_page_range, file_path, start, end, backend))
+                    yield from pages
+            finally:
+                for future in futures:
+                    future.cancel()
+            logger.debug(f"Extracted {total} pages in ranges of {step} across {workers} processes.")
+    except GeneratorExit:
+        raise
     except Exception as e:
         logger.exception(f"Error reading PDF {file_path}: {e}")
         raise
-    logger.info(f"Extracted {len(pages_content)} pages from PDF.")
-    return pages_content
+    logger.info(f"Extracted {total} pages from PDF.")
+
+@logger.catch(reraise=True)
+def extract_pages_from_pdf(file_path: str, workers: int = None, backend: str = None):
+    """
+    Extract every (page_number, text) pair into a list; see `iter_pages_from_pdf`.
+    """
+    return list(iter_pages_from_pdf(file_path, workers, backend))
 
-@logger.catch
-def chunk_text(text: str, max_length: int = 1000):
+def chunk_text(text: str, max_tokens: int = None, overlap_tokens: int = None):
+    """
+    Split text into chunks of at most `max_tokens` tokens (`CHUNK_MAX_TOKENS`,
+    capped at the embedding model's input limit) that overlap by
+    `overlap_tokens` (`CHUNK_OVERLAP_TOKENS`). Raises ValueError when the
+    overlap is not smaller than the effective chunk size.
+    """
     logger.debug("Starting text chunking.")
-    chunks = []
-    words = text.split()
-    current_chunk = []
-    length = 0
-    for w in words:
-        if length + len(w) + 1 <= max_length:
-            current_chunk.append(w)
-            length += len(w) + 1
-        else:
-            chunks.append(" ".join(current_chunk))
-            current_chunk = [w]
-            length = len(w) + 1
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
+    max_tokens = min(max_tokens or settings.CHUNK_MAX_TOKENS, settings.EMBEDDING_MAX_INPUT_TOKENS)
+    overlap_tokens = settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    if overlap_tokens >= max_tokens:
+        raise ValueError(
+            f"Chunk overlap ({overlap_tokens} tokens) must be smaller than the chunk size ({max_tokens} tokens, "
+            f"the smaller of CHUNK_MAX_TOKENS and EMBEDDING_MAX_INPUT_TOKENS); lower CHUNK_OVERLAP_TOKENS."
+        )
+    chunks = split_by_tokens(text, max_tokens, overlap_tokens)
     logger.debug(f"Text chunked into {len(chunks)} chunks.")
-    return chunks
\ No newline at end of file
+    return chunks
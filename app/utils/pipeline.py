@@ -0,0 +1,50 @@
+import queue
+import threading
+
+_DONE = object()
+
+def prefetch(iterable, size: int, name: str = "prefetch"):
+    """
+    Iterate `iterable` on a background thread, buffering at most `size`
+    items in a bounded queue. The producer blocks while the queue is full,
+    so a slow consumer pushes back on it. Exceptions raised by the producer
+    are re-raised in the consumer, and closing this generator stops the
+    producer (and closes `iterable`).
+    """
+    buffer = queue.Queue(maxsize=size)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        error = None
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    break
+        except BaseException as e:
+            error = e
+        finally:
+            close = getattr(iterable, "close", None)
+            if close:
+                close()
+        put((_DONE, error))
+
+    threading.Thread(target=produce, name=name, daemon=True).start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
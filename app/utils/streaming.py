@@ -0,0 +1,19 @@
+import json
+
+async def iter_text_deltas(stream):
+    """
+    Yield the text content of each chunk of a streamed chat completion
+    (OpenAI and Groq share the chunk format), skipping empty deltas.
+    """
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        content = chunk.choices[0].delta.content
+        if content:
+            yield content
+
+def sse_event(event: str, data) -> str:
+    """
+    Format one Server-Sent Event with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
@@ -0,0 +1,151 @@
+import functools
+import inspect
+import time
+from contextlib import nullcontext
+from loguru import logger
+from app.config import settings
+
+# Per-stage latency/error metrics (Prometheus) and spans (OpenTelemetry).
+# With both disabled, `stage()` hands back a shared no-op context manager and
+# `timed` returns the function unchanged, so instrumented code pays nothing.
+
+_NOOP = nullcontext()
+
+_metrics_enabled = False
+_tracer = None
+
+STAGE_LATENCY = STAGE_ERRORS = LLM_TOKENS = LLM_ATTEMPTS = LLM_HEDGES = CACHE_REQUESTS = INGESTED_ITEMS = None
+
+if settings.METRICS_ENABLED:
+    try:
+        from prometheus_client import Counter, Histogram
+        STAGE_LATENCY = Histogram(
+            "app_stage_duration_seconds", "Latency of each request and ingestion stage.", ["stage"],
+            buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+        )
+        STAGE_ERRORS = Counter("app_stage_errors_total", "Stage executions that raised.", ["stage"])
+        LLM_TOKENS = Counter("app_llm_tokens_total", "LLM tokens by provider, model and kind (prompt/completion).", ["provider", "model", "kind"])
+        LLM_ATTEMPTS = Counter("app_llm_attempts_total", "LLM call attempts by provider, model and outcome (success/error/timeout).", ["provider", "model", "outcome"])
+        LLM_HEDGES = Counter("app_llm_hedges_total", "Hedged LLM requests by route and result (started/won).", ["route", "result"])
+        CACHE_REQUESTS = Counter("app_cache_requests_total", "Cache lookups by cache and result (hit/stale/miss).", ["cache", "result"])
+        INGESTED_ITEMS = Counter("app_ingested_items_total", "Pages and chunks processed by ingestion.", ["item"])
+        _metrics_enabled = True
+    except ImportError:
+        logger.warning("METRICS_ENABLED is set but prometheus_client is not installed; metrics are disabled.")
+
+if settings.TRACING_ENABLED:
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    _provider = TracerProvider(resource=Resource.create({"service.name": settings.OTEL_SERVICE_NAME}))
+    if settings.OTEL_EXPORTER_OTLP_ENDPOINT:
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        _provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=settings.OTEL_EXPORTER_OTLP_ENDPOINT)))
+    trace.set_tracer_provider(_provider)
+    _tracer = trace.get_tracer("app")
+
+class _Stage:
+    __slots__ = ("name", "started", "span")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.span = None
+
+    def __enter__(self):
+        if _tracer is not None:
+            self.span = _tracer.start_as_current_span(self.name)
+            self.span.__enter__()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if _metrics_enabled:
+            STAGE_LATENCY.labels(self.name).observe(time.perf_counter() - self.started)
+            # Cancellation is not an error of the stage itself
+            if exc_type is not None and issubclass(exc_type, Exception):
+                STAGE_ERRORS.labels(self.name).inc()
+        if self.span is not None:
+            self.span.__exit__(exc_type, exc, tb)
+        return False
+
+def stage(name: str):
+    """
+    Context manager timing one execution of `name` (works around `await`
+    too): observes its latency, counts it as an error if it raises, and
+    wraps it in a span when tracing is on.
+    """
+    if not _metrics_enabled and _tracer is None:
+        return _NOOP
+    return _Stage(name)
+
+def timed(name: str):
+    """
+    Decorator form of `stage` for sync and async functions.
+    """
+    def decorator(func):
+        if not _metrics_enabled and _tracer is None:
+            return func
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with _Stage(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_tokens(provider: str, model: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+    if _metrics_enabled:
+        if prompt_tokens:
+            LLM_TOKENS.labels(provider, model, "prompt").inc(prompt_tokens)
+        if completion_tokens:
+            LLM_TOKENS.labels(provider, model, "completion").inc(completion_tokens)
+
+def record_usage(provider: str, model: str, response):
+    """
+    Record the token usage reported on a (non-streaming) completion.
+    """
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        record_tokens(provider, model, usage.prompt_tokens or 0, usage.completion_tokens or 0)
+
+def record_llm_attempt(provider: str, model: str, outcome: str):
+    if _metrics_enabled:
+        LLM_ATTEMPTS.labels(provider, model, outcome).inc()
+
+def record_hedge(route: str, result: str):
+    if _metrics_enabled:
+        LLM_HEDGES.labels(route, result).inc()
+
+def record_cache(cache: str, result: str, count: int = 1):
+    if _metrics_enabled and count:
+        CACHE_REQUESTS.labels(cache, result).inc(count)
+
+def record_ingested(item: str, count: int = 1):
+    if _metrics_enabled and count:
+        INGESTED_ITEMS.labels(item).inc(count)
+
+def setup_telemetry(app):
+    """
+    Expose `/metrics` and instrument the FastAPI app with OpenTelemetry,
+    according to `METRICS_ENABLED` / `TRACING_ENABLED`.
+    """
+    if _metrics_enabled:
+        from fastapi import Response
+        from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+        @app.get("/metrics", include_in_schema=False)
+        def metrics() -> Response:
+            return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+        logger.info("Prometheus metrics exposed at /metrics.")
+    if _tracer is not None:
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+        FastAPIInstrumentor.instrument_app(app, excluded_urls="metrics")
+        logger.info("OpenTelemetry tracing enabled for FastAPI.")
@@ -0,0 +1,133 @@
+import os
+import re
+from threading import Lock
+from loguru import logger
+from app.config import settings
+
+class HeuristicTokenizer:
+    """
+    Dependency-free approximation of a BPE tokenizer: words are split into
+    pieces of at most 4 characters and every punctuation mark is a token.
+    It overcounts ordinary English text, so chunks stay under real limits.
+    """
+
+    name = "heuristic"
+
+    _PIECE = re.compile(r"\w{1,4}|[^\w\s]")
+
+    def spans(self, text: str) -> list:
+        return [match.span() for match in self._PIECE.finditer(text)]
+
+    def count(self, text: str) -> int:
+        return sum(1 for _ in self._PIECE.finditer(text))
+
+class TiktokenTokenizer:
+    """
+    The OpenAI tokenizer for `model`, via `tiktoken`.
+    """
+
+    name = "tiktoken"
+
+    def __init__(self, model: str):
+        import tiktoken
+        try:
+            self.encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            self.encoding = tiktoken.get_encoding("cl100k_base")
+
+    def spans(self, text: str) -> list:
+        tokens = self.encoding.encode(text, disallowed_special=())
+        _, starts = self.encoding.decode_with_offsets(tokens)
+        return list(zip(starts, starts[1:] + [len(text)]))
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+class HuggingFaceTokenizer:
+    """
+    A `tokenizers` tokenizer loaded from a local `tokenizer.json` or a
+    Hugging Face Hub repository.
+    """
+
+    name = "tokenizers"
+
+    def __init__(self, identifier: str):
+        from tokenizers import Tokenizer
+        if os.path.exists(identifier):
+            self.tokenizer = Tokenizer.from_file(identifier)
+        else:
+            self.tokenizer = Tokenizer.from_pretrained(identifier)
+        self.tokenizer.no_truncation()
+        self.tokenizer.no_padding()
+
+    def spans(self, text: str) -> list:
+        return self.tokenizer.encode(text, add_special_tokens=False).offsets
+
+    def count(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+_tokenizer = None
+_tokenizer_lock = Lock()
+
+def _load_tokenizer():
+    choice = settings.CHUNK_TOKENIZER
+    if choice == "heuristic":
+        return HeuristicTokenizer()
+    if choice in ("auto", "tiktoken"):
+        try:
+            return TiktokenTokenizer(settings.EMBEDDING_MODEL)
+        except ImportError:
+            if choice == "tiktoken":
+                raise
+    if choice in ("auto", "tokenizers"):
+        return HuggingFaceTokenizer(settings.CHUNK_TOKENIZER_NAME)
+    return HuggingFaceTokenizer(choice)
+
+def get_tokenizer():
+    """
+    Return the tokenizer used for chunking and batch sizing, loading it on
+    first use (`services.warm_up()` loads it at startup). `CHUNK_TOKENIZER`
+    is `auto` (tiktoken if installed, else the `tokenizers` model
+    `CHUNK_TOKENIZER_NAME`), `tiktoken`, `tokenizers`, `heuristic`, or a
+    `tokenizer.json` path / Hub repository. If loading fails, the error is
+    raised, unless `CHUNK_TOKENIZER_FALLBACK=heuristic` names the heuristic
+    tokenizer as a fallback.
+    """
+    global _tokenizer
+    tokenizer = _tokenizer
+    if tokenizer is not None:
+        return tokenizer
+    with _tokenizer_lock:
+        if _tokenizer is None:
+            try:
+                _tokenizer = _load_tokenizer()
+            except Exception as e:
+                if settings.CHUNK_TOKENIZER_FALLBACK != "heuristic":
+                    raise
+                logger.warning(f"Failed to load tokenizer '{settings.CHUNK_TOKENIZER}' ({e!r}), using the heuristic tokenizer.")
+                _tokenizer = HeuristicTokenizer()
+            logger.info(f"Using {_tokenizer.name} tokenizer for chunking.")
+        return _tokenizer
+
+def count_tokens(text: str) -> int:
+    return get_tokenizer().count(text)
+
+def split_by_tokens(text: str, max_tokens: int, overlap_tokens: int = 0) -> list:
+    """
+    Split `text` into windows of at most `max_tokens` tokens, consecutive
+    windows sharing `overlap_tokens` tokens. Windows are cut on token
+    boundaries and sliced from the original text, so no text is altered.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError(f"Chunk overlap ({overlap_tokens}) must be smaller than the chunk size ({max_tokens}).")
+    spans = get_tokenizer().spans(text)
+    chunks = []
+    step = max_tokens - overlap_tokens
+    for start in range(0, len(spans), step):
+        end = min(start + max_tokens, len(spans))
+        chunk = text[spans[start][0]:spans[end - 1][1]].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end == len(spans):
+            break
+    return chunks
@@ -0,0 +1,41 @@
+import json
+from loguru import logger
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject POST and PUT requests under `paths` (e.g. `POST /documents` and
+    `PUT /documents/{id}`) whose declared `Content-Length` exceeds
+    `max_bytes` with 413 before the body is read. Bodies without a length (chunked uploads)
+    pass through; the upload handler enforces the limit while streaming.
+    """
+
+    # Room for the multipart boundaries and the other form fields
+    _MULTIPART_OVERHEAD = 64 * 1024
+
+    _METHODS = ("POST", "PUT")
+
+    def __init__(self, app, max_bytes: int, paths: tuple = ("/documents",)):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = paths
+
+    def _applies(self, scope) -> bool:
+        if scope["type"] != "http" or scope["method"] not in self._METHODS:
+            return False
+        path = scope["path"].rstrip("/")
+        return any(path == prefix or path.startswith(prefix + "/") for prefix in self.paths)
+
+    async def __call__(self, scope, receive, send):
+        if self._applies(scope):
+            length = dict(scope["headers"]).get(b"content-length")
+            if length is not None and length.isdigit() and int(length) > self.max_bytes + self._MULTIPART_OVERHEAD:
+                logger.warning(f"Rejected upload of {int(length)} bytes to {scope['path']} (limit {self.max_bytes}).")
+                body = json.dumps({"detail": f"File exceeds the maximum upload size of {self.max_bytes} bytes."}).encode()
+                await send({
+                    "type": "http.response.start",
+                    "status": 413,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), (b"connection", b"close")],
+                })
+                await send({"type": "http.response.body", "body": body})
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,50 @@
+"""
+Shared helpers for the benchmark scripts: latency summaries and JSON result
+files that `benchmarks.compare` can diff between runs.
+"""
+import json
+import platform
+import subprocess
+import time
+import numpy as np
+
+def percentile_ms(samples: list, q: float) -> float:
+    return float(np.percentile(samples, q) * 1000) if samples else 0.0
+
+def latency_summary(samples: list) -> dict:
+    """
+    p50/p95/p99/mean/max in milliseconds for a list of durations in seconds.
+    """
+    return {
+        "p50_ms": percentile_ms(samples, 50),
+        "p95_ms": percentile_ms(samples, 95),
+        "p99_ms": percentile_ms(samples, 99),
+        "mean_ms": float(np.mean(samples) * 1000) if samples else 0.0,
+        "max_ms": float(np.max(samples) * 1000) if samples else 0.0,
+    }
+
+def run_info() -> dict:
+    """
+    Where and when the benchmark ran, so result files can be told apart.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+    }
+
+def write_results(results: dict, output: str = None) -> dict:
+    """
+    Print results as JSON and, when `output` is set, save them there.
+    """
+    results = {**results, "run": run_info()}
+    print(json.dumps(results, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
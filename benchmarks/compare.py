@@ -0,0 +1,92 @@
+"""
+Compare two benchmark result files and flag regressions.
+
+Numeric fields are matched by path (list entries by their `scenario`,
+`backend` or `name`). Latencies, durations and error rates are
+lower-is-better; throughput, recall and `*_per_second` are higher-is-better;
+anything else is shown but never fails the comparison. Exits with status 1
+if any metric got worse by more than `--threshold` percent.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+LOWER_IS_BETTER = ("_ms", "seconds", "latency", "error_rate")
+HIGHER_IS_BETTER = ("throughput", "recall", "per_second")
+IGNORED = ("run.", "params.")
+
+def _key(item, index: int) -> str:
+    if isinstance(item, dict):
+        for field in ("scenario", "backend", "name"):
+            if field in item:
+                return str(item[field])
+    return str(index)
+
+def flatten(value, prefix: str = "") -> dict:
+    """
+    Map dotted paths to the numeric leaves of a result file.
+    """
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = ((_key(item, i), item) for i, item in enumerate(value))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: float(value)}
+    else:
+        return {}
+    flat = {}
+    for key, item in items:
+        flat.update(flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+def direction(path: str) -> int:
+    """
+    -1 if lower is better, 1 if higher is better, 0 if unknown.
+    """
+    leaf = path.rsplit(".", 1)[-1]
+    if any(marker in leaf for marker in HIGHER_IS_BETTER):
+        return 1
+    if any(marker in path for marker in LOWER_IS_BETTER):
+        return -1
+    return 0
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> list:
+    base, new = flatten(baseline), flatten(candidate)
+    rows = []
+    for path in sorted(base.keys() & new.keys()):
+        if path.startswith(IGNORED):
+            continue
+        before, after = base[path], new[path]
+        change = (after - before) / abs(before) * 100 if before else 0.0
+        sign = direction(path)
+        regressed = sign != 0 and -sign * change > threshold
+        rows.append((path, before, after, change, regressed))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed regression in percent")
+    parser.add_argument("--only-regressions", action="store_true")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows = compare(baseline, candidate, args.threshold)
+    regressions = [row for row in rows if row[4]]
+    width = max((len(row[0]) for row in rows), default=10)
+    for path, before, after, change, regressed in rows:
+        if args.only_regressions and not regressed:
+            continue
+        print(f"{path:<{width}}  {before:>12.3f}  {after:>12.3f}  {change:>+8.1f}%{'  REGRESSION' if regressed else ''}")
+    print(f"{len(regressions)} regression(s) over {args.threshold:g}% in {len(rows)} metrics.")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Recall vs memory and latency of reduced-dimension and int8-quantized
+embedding storage, on our own corpus.
+
+The corpus is every embedding in the configured vector store (what the app
+serves today), or, with `--pdf-dir`, the chunks of those PDFs embedded with
+the configured model (through the embedding cache). Queries are the lines
+of `--queries-file`, embedded the same way, or else `--queries` chunks held
+out of the corpus.
+
+Smaller sizes are derived from the stored embeddings by truncating and
+re-normalizing, which is what the `dimensions` parameter of the
+text-embedding-3 models returns, so no re-embedding is needed. Each
+size is stored in a temporary NumPy index per `--quantization` mode.
+Recall@k is measured against exact search on the full-size float vectors,
+and the memory is what a scan touches (see `NumpyIndexBackend.memory`).
+
+    python -m benchmarks.embedding_storage_bench --dimensions 1536,1024,512,256 --quantization none,int8
+    python -m benchmarks.embedding_storage_bench --pdf-dir uploaded_docs --queries-file queries.txt
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from loguru import logger
+from benchmarks.common import percentile_ms, write_results
+from benchmarks.vector_store_bench import exact_top_k
+
+def load_store_embeddings(batch_size: int) -> np.ndarray:
+    from app.services.container import services
+    backend = services.vector_backend
+    embeddings, offset = [], 0
+    while True:
+        batch = backend.get(limit=batch_size, offset=offset, include=("embeddings",))
+        if not len(batch["ids"]):
+            break
+        embeddings.extend(np.asarray(batch["embeddings"], dtype=np.float32))
+        offset += len(batch["ids"])
+    return np.array(embeddings, dtype=np.float32)
+
+def embed(texts: list) -> np.ndarray:
+    from app.services.embeddings import embed_texts, iter_batches
+    embeddings = []
+    for _, batch in iter_batches(texts):
+        embeddings.extend(embed_texts(batch))
+    return np.asarray(embeddings, dtype=np.float32)
+
+def load_pdf_embeddings(pdf_dir: str) -> np.ndarray:
+    from app.utils.pdf_utils import chunk_text, extract_pages_from_pdf
+    chunks = []
+    for pdf in sorted(glob.glob(os.path.join(pdf_dir, "*.pdf"))):
+        for page_text in extract_pages_from_pdf(pdf):
+            chunks.extend(chunk_text(page_text))
+    return embed(chunks)
+
+def reduce(vectors: np.ndarray, dim: int) -> np.ndarray:
+    reduced = np.ascontiguousarray(vectors[:, :dim])
+    norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return reduced / norms
+
+def bench_storage(corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, dim: int, quantization: str, k: int, rescore_factor: int, batch_size: int) -> dict:
+    from app.services.numpy_index import NumpyIndexBackend
+    vectors, query_vectors = reduce(corpus, dim), reduce(queries, dim)
+    with tempfile.TemporaryDirectory() as path:
+        backend = NumpyIndexBackend(path, quantization, rescore_factor)
+        ids = [f"v{i}" for i in range(len(vectors))]
+        for start in range(0, len(vectors), batch_size):
+            end = min(start + batch_size, len(vectors))
+            backend.add(ids[start:end], vectors[start:end].tolist(), [{"row": i} for i in range(start, end)])
+
+        latencies, hits = [], 0
+        for query, expected in zip(query_vectors, truth):
+            started = time.perf_counter()
+            result = backend.query([query.tolist()], k, include=())
+            latencies.append(time.perf_counter() - started)
+            hits += len({int(id[1:]) for id in result["ids"][0]} & set(expected.tolist()))
+        memory = backend.memory()
+    return {
+        "dimensions": dim,
+        "quantization": quantization,
+        "recall_at_k": hits / truth.size,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p99_ms": percentile_ms(latencies, 99),
+        "scan_bytes": memory["scan_bytes"],
+        "float_matrix_bytes": memory["float_matrix_bytes"],
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-dir", help="Embed the chunks of these PDFs instead of reading the vector store")
+    parser.add_argument("--queries-file", help="One query per line; default: hold out --queries corpus chunks")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimensions", default="1536,1024,512,256", help="Sizes larger than the stored embeddings are skipped")
+    parser.add_argument("--quantization", default="none,int8")
+    parser.add_argument("--rescore-factor", type=int, default=4, help="NUMPY_INDEX_RESCORE_FACTOR for the int8 runs")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=1000, help="Vectors per read or add call")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+    corpus = load_pdf_embeddings(args.pdf_dir) if args.pdf_dir else load_store_embeddings(args.batch_size)
+    if args.queries_file:
+        with open(args.queries_file) as f:
+            queries = embed([line.strip() for line in f if line.strip()])
+    else:
+        rng = np.random.default_rng(0)
+        held_out = rng.choice(len(corpus), min(args.queries, len(corpus) // 2), replace=False)
+        queries = corpus[held_out]
+        corpus = np.delete(corpus, held_out, axis=0)
+    if not len(corpus) or not len(queries):
+        parser.error("The corpus is empty: ingest some documents or pass --pdf-dir.")
+
+    native = corpus.shape[1]
+    truth = exact_top_k(reduce(corpus, native), reduce(queries, native), args.top_k)
+    results = []
+    for dim in (int(size) for size in args.dimensions.split(",")):
+        if dim > native:
+            continue
+        for quantization in args.quantization.split(","):
+            results.append(bench_storage(corpus, queries, truth, dim, quantization, args.top_k, args.rescore_factor, args.batch_size))
+    baseline = next((result["scan_bytes"] for result in results if result["dimensions"] == native and result["quantization"] == "none"), None)
+    for result in results:
+        result["memory_reduction"] = baseline / result["scan_bytes"] if baseline and result["scan_bytes"] else None
+
+    return write_results({
+        "benchmark": "embedding_storage",
+        "params": vars(args),
+        "corpus": {"vectors": len(corpus), "queries": len(queries), "native_dimensions": native},
+        "results": results,
+    }, args.output)
+
+if __name__ == "__main__":
+    main()
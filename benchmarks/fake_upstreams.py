@@ -0,0 +1,206 @@
+"""
+Local stand-ins for the OpenAI, Groq and OpenWeather APIs, for load tests
+that don't spend money or hit rate limits.
+
+Every route sleeps for a latency drawn from a log-normal distribution
+(median `--*-latency-ms`, spread `--latency-sigma`) and fails with
+`--error-status` at `--error-rate`. Chat completions support streaming,
+emitting `--completion-tokens` tokens every `--token-interval-ms`.
+Embeddings are deterministic hashed bag-of-words vectors, so texts sharing
+words are close and retrieval behaves sensibly.
+
+    python -m benchmarks.fake_upstreams --port 9100 --chat-latency-ms 400 --error-rate 0.01
+
+Then start the app against it:
+
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 \\
+    GROQ_BASE_URL=http://127.0.0.1:9100 \\
+    WEATHER_API_BASE_URL=http://127.0.0.1:9100/data/2.5/weather \\
+    OPENAI_API_KEY=fake GROQ_API_KEY=fake uvicorn app.main:app
+
+`GET /stats` on the fake server returns request and injected error counts.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from collections import Counter
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WEATHER_WORDS = {"weather", "temperature", "rain", "forecast", "sunny", "cold", "hot", "wind", "humidity", "snow"}
+FOOD_WORDS = {"food", "recipe", "cook", "eat", "dish", "meal", "pasta", "chicken", "bake", "dinner", "lunch", "breakfast"}
+VOCABULARY = (
+    "the a of and to in with for on is it you can add some cook until golden serve warm "
+    "salt pepper oil garlic onion tomato minutes heat pan stir mix then finally enjoy"
+).split()
+
+class UpstreamConfig:
+    def __init__(self, args):
+        self.latency_ms = {
+            "embeddings": args.embedding_latency_ms,
+            "chat": args.chat_latency_ms,
+            "weather": args.weather_latency_ms,
+        }
+        self.latency_sigma = args.latency_sigma
+        self.token_interval_ms = args.token_interval_ms
+        self.completion_tokens = args.completion_tokens
+        self.error_rate = args.error_rate
+        self.error_status = args.error_status
+        self.dim = args.dim
+        self.random = random.Random(args.seed)
+
+def _embed(text: str, dim: int) -> list:
+    """
+    Feature-hashed bag of words, L2-normalized.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in re.findall(r"\w+", text.lower()):
+        digest = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+        vector[digest % dim] += 1.0 if digest >> 63 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0], norm = 1.0, 1.0
+    return (vector / norm).tolist()
+
+def _label(text: str) -> str:
+    words = set(re.findall(r"\w+", text.lower()))
+    if words & WEATHER_WORDS:
+        return "weather"
+    if words & FOOD_WORDS:
+        return "food"
+    return "other"
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+def create_app(config: UpstreamConfig) -> FastAPI:
+    app = FastAPI(title="Fake upstreams")
+    requests = Counter()
+    errors = Counter()
+
+    async def delay(kind: str):
+        median = config.latency_ms[kind] / 1000
+        if median > 0:
+            await asyncio.sleep(median * math.exp(config.latency_sigma * config.random.gauss(0, 1)))
+
+    def injected_error(kind: str):
+        requests[kind] += 1
+        if config.random.random() < config.error_rate:
+            errors[kind] += 1
+            return JSONResponse(
+                status_code=config.error_status,
+                content={"error": {"message": f"Injected {kind} failure.", "type": "server_error", "code": None}},
+            )
+        return None
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        await delay("embeddings")
+        if (error := injected_error("embeddings")) is not None:
+            return error
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dim = body.get("dimensions") or config.dim
+        tokens = sum(_estimate_tokens(text) for text in inputs)
+        return {
+            "object": "list",
+            "model": body["model"],
+            "data": [{"object": "embedding", "index": i, "embedding": _embed(text, dim)} for i, text in enumerate(inputs)],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    def reply_for(messages: list) -> str:
+        system, last = messages[0]["content"], messages[-1]["content"]
+        if "classifier" in system:
+            if "JSON array" in system:
+                return json.dumps([_label(text) for text in json.loads(last)])
+            return _label(last)
+        return " ".join(config.random.choice(VOCABULARY) for _ in range(config.completion_tokens))
+
+    async def chat(request: Request):
+        body = await request.json()
+        await delay("chat")
+        if (error := injected_error("chat")) is not None:
+            return error
+        reply = reply_for(body["messages"])
+        prompt_tokens = sum(_estimate_tokens(message["content"]) for message in body["messages"])
+        completion_id, created, model = f"chatcmpl-{int(time.time() * 1000)}", int(time.time()), body["model"]
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": _estimate_tokens(reply), "total_tokens": prompt_tokens + _estimate_tokens(reply)},
+            }
+
+        def chunk(delta: dict, finish_reason=None) -> str:
+            return "data: " + json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }) + "\n\n"
+
+        async def events():
+            for i, word in enumerate(reply.split(" ")):
+                if i:
+                    await asyncio.sleep(config.token_interval_ms / 1000)
+                yield chunk({"content": word if i == 0 else " " + word})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    # OpenAI and Groq (OpenAI-compatible under /openai/v1)
+    app.add_api_route("/v1/chat/completions", chat, methods=["POST"])
+    app.add_api_route("/openai/v1/chat/completions", chat, methods=["POST"])
+
+    @app.get("/data/2.5/weather")
+    async def weather():
+        await delay("weather")
+        if (error := injected_error("weather")) is not None:
+            return error
+        return {
+            "name": "New York",
+            "weather": [{"description": "clear sky"}],
+            "main": {"temp": 21.5, "feels_like": 20.9, "humidity": 48},
+            "wind": {"speed": 3.6},
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": dict(requests), "injected_errors": dict(errors)}
+
+    return app
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--embedding-latency-ms", type=float, default=80)
+    parser.add_argument("--chat-latency-ms", type=float, default=400, help="Median time to the full response (or first token when streaming)")
+    parser.add_argument("--weather-latency-ms", type=float, default=120)
+    parser.add_argument("--latency-sigma", type=float, default=0.4, help="Log-normal spread; 0 makes latency constant")
+    parser.add_argument("--token-interval-ms", type=float, default=15, help="Delay between streamed tokens")
+    parser.add_argument("--completion-tokens", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding size when the request sets no `dimensions`")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    uvicorn.run(create_app(UpstreamConfig(args)), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
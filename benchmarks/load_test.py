@@ -0,0 +1,181 @@
+"""
+Load generator for a running instance of the app.
+
+Runs each scenario with `--concurrency` parallel clients until `--requests`
+requests (or `--duration` seconds) are done, and reports throughput, error
+counts and p50/p95/p99 latency. Point the app at `benchmarks.fake_upstreams`
+to load-test it without touching the real APIs.
+
+Scenarios:
+- `messages`: POST /messages with a mix of food, weather and other queries.
+- `messages_stream`: POST /messages/stream; also reports time to first token.
+- `documents`: POST /documents with the PDFs in `--pdf-dir`. Each upload gets
+  a unique trailer so it isn't deduplicated; with `--wait-ingestion` the
+  time until GET /documents/{id} reports `completed` is reported too.
+
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000 \\
+        --scenarios messages,documents --requests 200 --concurrency 16 --output load.json
+"""
+import argparse
+import asyncio
+import glob
+import os
+import time
+import uuid
+from collections import Counter
+import httpx
+from benchmarks.common import latency_summary, write_results
+
+QUERIES = [
+    "How do I make pasta carbonara?",
+    "What's a quick chicken recipe for dinner?",
+    "How long should I bake salmon?",
+    "What's the weather like in New York today?",
+    "Will it rain in New York this afternoon?",
+    "What is the temperature outside right now?",
+    "Tell me a joke about programmers.",
+    "Who won the football game last night?",
+]
+
+class ScenarioRun:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies = []
+        self.first_token = []
+        self.ingestion = []
+        self.statuses = Counter()
+        self.errors = Counter()
+
+    def report(self, duration: float) -> dict:
+        completed = sum(self.statuses.values())
+        ok = sum(count for status, count in self.statuses.items() if 200 <= status < 300)
+        result = {
+            "scenario": self.name,
+            "requests": completed + sum(self.errors.values()),
+            "ok": ok,
+            "error_rate": 1 - ok / completed if completed else 1.0,
+            "status_counts": {str(status): count for status, count in sorted(self.statuses.items())},
+            "client_errors": dict(self.errors),
+            "duration_seconds": duration,
+            "throughput_rps": ok / duration if duration else 0.0,
+            "latency": latency_summary(self.latencies),
+        }
+        if self.first_token:
+            result["time_to_first_token"] = latency_summary(self.first_token)
+        if self.ingestion:
+            result["ingestion"] = latency_summary(self.ingestion)
+        return result
+
+async def _message(client: httpx.AsyncClient, run: ScenarioRun, i: int, args):
+    content = QUERIES[i % len(QUERIES)]
+    if args.unique_queries:
+        content = f"{content} (request {i})"
+    started = time.perf_counter()
+    response = await client.post("/messages", json={"content": content})
+    run.latencies.append(time.perf_counter() - started)
+    run.statuses[response.status_code] += 1
+
+async def _message_stream(client: httpx.AsyncClient, run: ScenarioRun, i: int, args):
+    content = QUERIES[i % len(QUERIES)]
+    if args.unique_queries:
+        content = f"{content} (request {i})"
+    started = time.perf_counter()
+    async with client.stream("POST", "/messages/stream", json={"content": content}) as response:
+        first = None
+        async for line in response.aiter_lines():
+            if first is None and line.startswith("event: token"):
+                first = time.perf_counter() - started
+    run.latencies.append(time.perf_counter() - started)
+    if first is not None:
+        run.first_token.append(first)
+    run.statuses[response.status_code] += 1
+
+async def _document(client: httpx.AsyncClient, run: ScenarioRun, i: int, args):
+    path = args.pdfs[i % len(args.pdfs)]
+    with open(path, "rb") as f:
+        data = f.read()
+    if not args.allow_dedup:
+        # Bytes after %%EOF are ignored by PDF readers but change the hash
+        data += f"\n%bench {uuid.uuid4()}\n".encode()
+    started = time.perf_counter()
+    response = await client.post(
+        "/documents",
+        data={"title": f"bench {os.path.basename(path)} #{i}"},
+        files={"file": (os.path.basename(path), data, "application/pdf")},
+    )
+    run.latencies.append(time.perf_counter() - started)
+    run.statuses[response.status_code] += 1
+    if args.wait_ingestion and response.status_code in (200, 202):
+        document_id = response.json()["id"]
+        deadline = started + args.ingestion_timeout
+        while time.perf_counter() < deadline:
+            status = (await client.get(f"/documents/{document_id}")).json().get("status")
+            if status in ("completed", "failed"):
+                if status == "completed":
+                    run.ingestion.append(time.perf_counter() - started)
+                else:
+                    run.errors["ingestion_failed"] += 1
+                return
+            await asyncio.sleep(args.poll_interval)
+        run.errors["ingestion_timeout"] += 1
+
+SCENARIOS = {
+    "messages": _message,
+    "messages_stream": _message_stream,
+    "documents": _document,
+}
+
+async def run_scenario(name: str, args) -> dict:
+    run = ScenarioRun(name)
+    request = SCENARIOS[name]
+    counter = iter(range(args.requests))
+    deadline = time.perf_counter() + args.duration if args.duration else None
+
+    async def worker(client: httpx.AsyncClient):
+        for i in counter:
+            if deadline and time.perf_counter() > deadline:
+                return
+            try:
+                await request(client, run, i, args)
+            except httpx.HTTPError as e:
+                run.errors[type(e).__name__] += 1
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        duration = time.perf_counter() - started
+    return run.report(duration)
+
+async def run_all(args) -> list:
+    return [await run_scenario(name, args) for name in args.scenarios.split(",")]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--scenarios", default="messages", help=f"Comma-separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--duration", type=float, default=0, help="Stop a scenario after this many seconds (0 = no limit)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--unique-queries", action="store_true", help="Make every message distinct to defeat the exact-text caches")
+    parser.add_argument("--pdf-dir", default="uploaded_docs")
+    parser.add_argument("--allow-dedup", action="store_true", help="Upload the PDFs unchanged, so repeats are deduplicated")
+    parser.add_argument("--wait-ingestion", action="store_true", help="Poll each uploaded document until it is processed")
+    parser.add_argument("--ingestion-timeout", type=float, default=300)
+    parser.add_argument("--poll-interval", type=float, default=0.25)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.scenarios.split(",")) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    args.pdfs = sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf")))
+    if "documents" in args.scenarios.split(",") and not args.pdfs:
+        parser.error(f"No PDFs found in {args.pdf_dir}")
+
+    params = {key: value for key, value in vars(args).items() if key != "pdfs"}
+    return write_results({"benchmark": "load_test", "params": params, "results": asyncio.run(run_all(args))}, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Micro-benchmarks for the ingestion and retrieval building blocks.
+
+- `extract`: `extract_pages_from_pdf` on every PDF in `--pdf-dir`, per
+  extraction backend (pages per second, median seconds per file).
+- `chunk`: `chunk_text` over the pages of those PDFs (chunks and
+  characters per second, per-page latency).
+- `query`: `query_vectors` / `query_vectors_batch` against a temporary
+  index of `--vectors` synthetic embeddings in the configured
+  `VECTOR_BACKEND` (p50/p95/p99 latency, also scoped to one of 10
+  synthetic documents with a `document_id` filter; batched throughput).
+- `logging`: caller-side cost per record of each `LOG_PROFILE` writing to
+  a temporary file: emitted INFO lines, DEBUG lines filtered out by level
+  (f-string vs lazy arguments), and `logger.exception`; for the enqueued
+  production sink, also the time to drain the queue.
+- `startup`: cold start in fresh interpreters: `import app.main` alone, and
+  followed by `services.warm_up()` (with the time each service took to
+  initialize).
+
+    python -m benchmarks.micro_bench --benchmarks extract,chunk,query,logging,startup --output micro.json
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from loguru import logger
+from benchmarks.common import latency_summary, write_results
+
+def bench_extract(pdfs: list, backends: list, repeat: int, workers: int) -> list:
+    from app.utils.pdf_utils import extract_pages_from_pdf
+    results = []
+    for backend in backends:
+        for path in pdfs:
+            durations, pages = [], 0
+            for _ in range(repeat):
+                started = time.perf_counter()
+                pages = len(extract_pages_from_pdf(path, workers=workers, backend=backend))
+                durations.append(time.perf_counter() - started)
+            median = statistics.median(durations)
+            results.append({
+                "name": f"{backend}:{os.path.basename(path)}",
+                "pages": pages,
+                "median_seconds": median,
+                "pages_per_second": pages / median if median else 0.0,
+            })
+    return results
+
+def bench_chunk(pdfs: list, repeat: int) -> dict:
+    from app.utils.pdf_utils import extract_pages_from_pdf, chunk_text
+    from app.utils.tokenization import get_tokenizer
+    texts = [text for path in pdfs for _, text in extract_pages_from_pdf(path, workers=1)]
+    get_tokenizer()  # load outside the timed loop
+    latencies, chunks = [], 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            page_started = time.perf_counter()
+            chunks += len(chunk_text(text))
+            latencies.append(time.perf_counter() - page_started)
+    duration = time.perf_counter() - started
+    characters = sum(len(text) for text in texts) * repeat
+    return {
+        "tokenizer": get_tokenizer().name,
+        "pages": len(texts),
+        "chunks_per_second": chunks / duration if duration else 0.0,
+        "characters_per_second": characters / duration if duration else 0.0,
+        "per_page": latency_summary(latencies),
+    }
+
+def bench_query(n_vectors: int, dim: int, n_queries: int, top_k: int, seed: int = 0) -> dict:
+    from app.services import vector_store
+    from app.services.container import services
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n_vectors, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    step = 1000
+    for start in range(0, n_vectors, step):
+        end = min(start + step, n_vectors)
+        vector_store.add_vectors(
+            [f"bench_{i}" for i in range(start, end)],
+            vectors[start:end].tolist(),
+            [{"document_id": i % 10, "page_number": i, "chunk_id": 0, "title": "bench"} for i in range(start, end)],
+            [f"chunk {i}" for i in range(start, end)],
+        )
+    queries = rng.standard_normal((n_queries, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    queries = queries.tolist()
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        vector_store.query_vectors(query, top_k)
+        latencies.append(time.perf_counter() - started)
+    # Scoped to one of the 10 synthetic documents
+    scoped = []
+    for query in queries:
+        started = time.perf_counter()
+        vector_store.query_vectors(query, top_k, where={"document_id": 0})
+        scoped.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    vector_store.query_vectors_batch(queries, top_k)
+    batch_seconds = time.perf_counter() - started
+    return {
+        "backend": services.vector_backend.name,
+        "vectors": n_vectors,
+        "single": latency_summary(latencies),
+        "single_one_document": latency_summary(scoped),
+        "batch_queries_per_second": n_queries / batch_seconds if batch_seconds else 0.0,
+    }
+
+def _per_call_us(call, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call()
+    return (time.perf_counter() - started) * 1e6 / iterations
+
+def bench_logging(profiles: list, iterations: int, log_dir: str) -> dict:
+    from app.logging_config import configure_logging
+    payload = "ingredient " * 200
+
+    def log_exception():
+        try:
+            local_state = {"page": 3, "chunks": list(range(20))}
+            raise ValueError(f"failed on {local_state['page']}")
+        except ValueError:
+            logger.exception("Benchmark exception.")
+
+    results = {}
+    for profile in profiles:
+        path = os.path.join(log_dir, f"{profile}.log")
+        with open(path, "w") as sink:
+            configure_logging(profile, sink=sink, level="INFO")
+            result = {
+                "info_emitted_us": _per_call_us(lambda: logger.info("Message classified as: {}", "food"), iterations),
+                "debug_filtered_fstring_us": _per_call_us(lambda: logger.debug(f"Context for RAG: {payload[:100]}..."), iterations),
+                "debug_filtered_lazy_us": _per_call_us(lambda: logger.debug("Context for RAG: {}...", payload), iterations),
+                "exception_us": _per_call_us(log_exception, max(1, iterations // 100)),
+            }
+            started = time.perf_counter()
+            logger.complete()
+            result["drain_seconds"] = time.perf_counter() - started
+            logger.remove()
+        result["bytes_written"] = os.path.getsize(path)
+        results[profile] = result
+    return results
+
+_WARM_UP_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import app.main
+from app.services.container import services
+imported = time.perf_counter()
+services.warm_up()
+print(json.dumps({"import_seconds": imported - started, "warm_up_seconds": time.perf_counter() - imported, **services.stats()}))
+"""
+
+def bench_startup(repeat: int) -> dict:
+    # Warm-up creates the SDK clients, which refuse to start without a key;
+    # nothing is sent upstream
+    env = {"OPENAI_API_KEY": "benchmark", "GROQ_API_KEY": "benchmark", **os.environ}
+    process_seconds, runs = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import app.main"], env=env, check=True, capture_output=True)
+        process_seconds.append(time.perf_counter() - started)
+        output = subprocess.run([sys.executable, "-c", _WARM_UP_SCRIPT], env=env, check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "import_process_median_seconds": statistics.median(process_seconds),
+        "import_median_seconds": statistics.median(run["import_seconds"] for run in runs),
+        "warm_up_median_seconds": statistics.median(run["warm_up_seconds"] for run in runs),
+        "init_ms": runs[-1]["init_ms"],
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--benchmarks", default="extract,chunk,query")
+    parser.add_argument("--pdf-dir", default="uploaded_docs")
+    parser.add_argument("--pdf-backends", default="pdfplumber,pypdfium2")
+    parser.add_argument("--extract-workers", type=int, default=1, help="Extraction processes (1 = in-process)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--vectors", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--log-profiles", default="development,production")
+    parser.add_argument("--log-iterations", type=int, default=20000)
+    parser.add_argument("--log-level", default="WARNING", help="Per-call INFO/DEBUG logging would dominate the timings")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+    selected = args.benchmarks.split(",")
+    pdfs = sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf")))
+    if {"extract", "chunk"} & set(selected) and not pdfs:
+        parser.error(f"No PDFs found in {args.pdf_dir}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as index_dir:
+        # The vector store is created on first use from these settings
+        os.environ["CHROMA_PATH"] = os.path.join(index_dir, "chroma")
+        os.environ["NUMPY_INDEX_PATH"] = os.path.join(index_dir, "numpy")
+        if "extract" in selected:
+            results["extract"] = bench_extract(pdfs, args.pdf_backends.split(","), args.repeat, args.extract_workers)
+        if "chunk" in selected:
+            results["chunk"] = bench_chunk(pdfs, args.repeat)
+        if "query" in selected:
+            results["query"] = bench_query(args.vectors, args.dim, args.queries, args.top_k)
+        if "startup" in selected:
+            results["startup"] = bench_startup(args.repeat)
+        if "logging" in selected:
+            results["logging"] = bench_logging(args.log_profiles.split(","), args.log_iterations, index_dir)
+            logger.add(sys.stderr, level=args.log_level)
+    return write_results({"benchmark": "micro", "params": vars(args), "results": results}, args.output)
+
+if __name__ == "__main__":
+    main()
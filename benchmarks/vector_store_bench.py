@@ -0,0 +1,135 @@
+"""
+Compare vector store backends on recall@k and query latency.
+
+Builds each backend in a temporary directory from the same synthetic
+normalized embeddings, then runs single queries (p50/p99 latency) and one
+batched query per backend. Recall is measured against exact brute-force
+search.
+
+`chroma_server` talks to a running Chroma server (`chroma run --port 8001`)
+and uses a throwaway collection. For it, `--reader-processes 1,2,4` also
+measures the aggregate query throughput of that many processes querying
+the server at once, i.e. how reads scale with app workers.
+
+    python -m benchmarks.vector_store_bench --vectors 20000 --dim 1536 --queries 200
+    python -m benchmarks.vector_store_bench --backends chroma_server --reader-processes 1,2,4,8
+"""
+import argparse
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from benchmarks.common import percentile_ms, write_results
+
+def make_dataset(n_vectors: int, dim: int, n_queries: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    # Clustered data looks more like real chunk embeddings than uniform noise
+    centers = rng.standard_normal((max(1, n_vectors // 100), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), n_vectors)] + 0.5 * rng.standard_normal((n_vectors, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.integers(0, n_vectors, n_queries)] + 0.1 * rng.standard_normal((n_queries, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return vectors, queries
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    distances = -2.0 * (queries @ vectors.T) + np.einsum("ij,ij->i", vectors, vectors)[None, :]
+    return np.argsort(distances, axis=1)[:, :k]
+
+def build_backend(name: str, path: str, collection_name: str = "bench"):
+    if name == "chroma_server":
+        from app.config import settings
+        from app.services.vector_store import ChromaServerBackend
+        return ChromaServerBackend(settings.CHROMA_HOST, settings.CHROMA_PORT, settings.CHROMA_SSL, settings.CHROMA_AUTH_TOKEN, collection_name=collection_name)
+    if name == "chroma":
+        from app.services.vector_store import ChromaBackend
+        return ChromaBackend(path, collection_name="bench")
+    from app.services.numpy_index import NumpyIndexBackend
+    return NumpyIndexBackend(path)
+
+def _query_loop(name: str, collection_name: str, queries: list, k: int) -> float:
+    """
+    Run single queries against a shared backend from a fresh process;
+    returns the seconds taken.
+    """
+    backend = build_backend(name, None, collection_name)
+    started = time.perf_counter()
+    for query in queries:
+        backend.query([query], k)
+    return time.perf_counter() - started
+
+def bench_readers(name: str, collection_name: str, queries: np.ndarray, k: int, process_counts: list) -> list:
+    results = []
+    for processes in process_counts:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            started = time.perf_counter()
+            list(pool.map(_query_loop, [name] * processes, [collection_name] * processes, [queries.tolist()] * processes, [k] * processes))
+            duration = time.perf_counter() - started
+        results.append({"processes": processes, "queries_per_second": processes * len(queries) / duration})
+    return results
+
+def bench_backend(name: str, vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int, batch_size: int, reader_processes: list = ()) -> dict:
+    with tempfile.TemporaryDirectory() as path:
+        collection_name = f"bench_{uuid.uuid4().hex[:8]}"
+        backend = build_backend(name, path, collection_name)
+        ids = [f"v{i}" for i in range(len(vectors))]
+        metadatas = [{"row": i} for i in range(len(vectors))]
+        started = time.perf_counter()
+        for start in range(0, len(vectors), batch_size):
+            end = start + batch_size
+            backend.add(ids[start:end], vectors[start:end].tolist(), metadatas[start:end])
+        build_seconds = time.perf_counter() - started
+
+        latencies, hits = [], 0
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            result = backend.query([query.tolist()], k)
+            latencies.append(time.perf_counter() - started)
+            found = {int(id[1:]) for id in result["ids"][0]}
+            hits += len(found & set(expected.tolist()))
+
+        started = time.perf_counter()
+        backend.query(queries.tolist(), k)
+        batch_seconds = time.perf_counter() - started
+
+        result = {
+            "backend": name,
+            "build_seconds": build_seconds,
+            "recall_at_k": hits / truth.size,
+            "p50_ms": percentile_ms(latencies, 50),
+            "p99_ms": percentile_ms(latencies, 99),
+            "batch_query_ms": batch_seconds * 1000,
+            "batch_queries_per_second": len(queries) / batch_seconds,
+        }
+        if backend.shared:
+            try:
+                if reader_processes:
+                    result["readers"] = bench_readers(name, collection_name, queries, k, reader_processes)
+            finally:
+                backend.client.delete_collection(collection_name)
+        return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=1000, help="Vectors per add call while building")
+    parser.add_argument("--backends", default="chroma,numpy", help="chroma, numpy and/or chroma_server")
+    parser.add_argument("--reader-processes", default="", help="Comma-separated process counts for the shared-backend read scaling run")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    reader_processes = [int(count) for count in args.reader_processes.split(",") if count]
+    vectors, queries = make_dataset(args.vectors, args.dim, args.queries)
+    truth = exact_top_k(vectors, queries, args.top_k)
+    results = {
+        "benchmark": "vector_store",
+        "params": vars(args),
+        "results": [bench_backend(name, vectors, queries, truth, args.top_k, args.batch_size, reader_processes) for name in args.backends.split(",")],
+    }
+    return write_results(results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Baseline schema: messages, documents and document_pages
+
+Databases created by `Base.metadata.create_all` before migrations existed
+already have these tables, so each one is only created when missing.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    if "messages" not in existing:
+        op.create_table(
+            "messages",
+            sa.Column("id", sa.Integer, primary_key=True, index=True),
+            sa.Column("is_ai", sa.Boolean, nullable=False, default=False),
+            sa.Column("content", sa.Text, nullable=False),
+            sa.Column("timestamp", sa.DateTime, nullable=False, default=datetime.utcnow),
+        )
+    if "documents" not in existing:
+        op.create_table(
+            "documents",
+            sa.Column("id", sa.Integer, primary_key=True, index=True),
+            sa.Column("title", sa.String, nullable=False),
+            sa.Column("file_path", sa.String, nullable=False),
+            sa.Column("is_processed", sa.Boolean, nullable=False, default=False),
+        )
+    if "document_pages" not in existing:
+        op.create_table(
+            "document_pages",
+            sa.Column("id", sa.Integer, primary_key=True, index=True),
+            sa.Column("document_id", sa.Integer, sa.ForeignKey("documents.id"), nullable=False),
+            sa.Column("page_number", sa.Integer, nullable=False),
+            sa.Column("content", sa.Text, nullable=False),
+            sa.Column("is_processed", sa.Boolean, nullable=False, default=False),
+        )
+
+def downgrade():
+    op.drop_table("document_pages")
+    op.drop_table("documents")
+    op.drop_table("messages")
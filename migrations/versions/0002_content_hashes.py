@@ -0,0 +1,38 @@
+"""Add documents.content_hash and document_pages.content_hash
+
+`documents.content_hash` (SHA-256 of the uploaded file) dedupes uploads;
+`document_pages.content_hash` (SHA-256 of the page text) lets re-indexing
+skip unchanged pages. Both stay NULL for existing rows: such documents are
+not deduplicated and their pages are re-embedded on their next update.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def _columns(table: str) -> set:
+    return {column["name"] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+def upgrade():
+    # Tables created by `create_all` after the models gained the columns have them already
+    if "content_hash" not in _columns("documents"):
+        with op.batch_alter_table("documents") as batch:
+            batch.add_column(sa.Column("content_hash", sa.String(64), nullable=True))
+            batch.create_index("ix_documents_content_hash", ["content_hash"], unique=True)
+    if "content_hash" not in _columns("document_pages"):
+        with op.batch_alter_table("document_pages") as batch:
+            batch.add_column(sa.Column("content_hash", sa.String(64), nullable=True))
+
+def downgrade():
+    with op.batch_alter_table("document_pages") as batch:
+        batch.drop_column("content_hash")
+    with op.batch_alter_table("documents") as batch:
+        batch.drop_index("ix_documents_content_hash")
+        batch.drop_column("content_hash")
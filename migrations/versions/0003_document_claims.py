@@ -0,0 +1,29 @@
+"""Add documents.claimed_by and documents.claimed_at
+
+The ingestion job working on a document records itself here, so API
+workers and other ingestion processes can see that the document is busy.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("documents")}
+    with op.batch_alter_table("documents") as batch:
+        if "claimed_by" not in columns:
+            batch.add_column(sa.Column("claimed_by", sa.String(32), nullable=True))
+        if "claimed_at" not in columns:
+            batch.add_column(sa.Column("claimed_at", sa.DateTime, nullable=True))
+
+def downgrade():
+    with op.batch_alter_table("documents") as batch:
+        batch.drop_column("claimed_at")
+        batch.drop_column("claimed_by")
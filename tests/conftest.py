@@ -0,0 +1,26 @@
+import os
+import tempfile
+import pytest
+
+# Settings are read when app.config is imported, so configure a throwaway
+# SQLite database and keep the app off the network before any test imports it
+_db_dir = tempfile.mkdtemp(prefix="app-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+os.environ.setdefault("UPLOAD_DIR", os.path.join(_db_dir, "uploads"))
+os.environ.setdefault("VECTOR_BACKEND", "numpy")
+os.environ.setdefault("NUMPY_INDEX_PATH", os.path.join(_db_dir, "vector_index"))
+os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(_db_dir, "embeddings.sqlite3"))
+os.environ.setdefault("CHUNK_TOKENIZER", "heuristic")
+os.environ.setdefault("SERVICES_WARM_UP", "false")
+os.environ.setdefault("INGESTION_IN_PROCESS", "false")
+os.environ.setdefault("VECTOR_CHANGE_POLL_SECONDS", "0")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("GROQ_API_KEY", "test")
+
+@pytest.fixture(scope="session")
+def database():
+    """
+    Migrate the test database, for tests that use it without the app.
+    """
+    from app.database import init_db
+    init_db()
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+from app.utils.async_cache import AsyncTTLCache
+
+def age(cache: AsyncTTLCache, key, seconds: float):
+    value, fetched_at = cache._entries[key]
+    cache._entries[key] = (value, fetched_at - seconds)
+
+class Upstream:
+    def __init__(self):
+        self.calls = 0
+        self.release = None
+
+    async def fetch(self):
+        self.calls += 1
+        if self.release is not None:
+            await self.release.wait()
+        return f"value-{self.calls}"
+
+def test_concurrent_misses_share_one_fetch():
+    async def run():
+        cache, upstream = AsyncTTLCache("test", ttl_seconds=60), Upstream()
+        upstream.release = asyncio.Event()
+        callers = [asyncio.ensure_future(cache.get_or_fetch("key", upstream.fetch)) for _ in range(5)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        return await asyncio.gather(*callers), upstream.calls, cache.stats()
+
+    values, calls, stats = asyncio.run(run())
+    assert values == ["value-1"] * 5
+    assert calls == 1
+    assert stats["misses"] == 1 and stats["coalesced"] == 4
+
+def test_fresh_value_is_served_from_the_cache():
+    async def run():
+        cache, upstream = AsyncTTLCache("test", ttl_seconds=60), Upstream()
+        first = await cache.get_or_fetch("key", upstream.fetch)
+        second = await cache.get_or_fetch("key", upstream.fetch)
+        return first, second, upstream.calls
+
+    assert asyncio.run(run()) == ("value-1", "value-1", 1)
+
+def test_stale_value_is_served_while_one_refresh_runs():
+    async def run():
+        cache, upstream = AsyncTTLCache("test", ttl_seconds=60, stale_seconds=60), Upstream()
+        await cache.get_or_fetch("key", upstream.fetch)
+        age(cache, "key", 90)
+        upstream.release = asyncio.Event()
+        stale = [await cache.get_or_fetch("key", upstream.fetch) for _ in range(3)]
+        await asyncio.sleep(0)
+        calls_during_refresh = upstream.calls
+        upstream.release.set()
+        await asyncio.sleep(0.01)
+        return stale, calls_during_refresh, await cache.get_or_fetch("key", upstream.fetch), cache.stats()
+
+    stale, calls_during_refresh, refreshed, stats = asyncio.run(run())
+    assert stale == ["value-1"] * 3
+    assert calls_during_refresh == 2
+    assert refreshed == "value-2"
+    assert stats["stale_hits"] == 3 and stats["background_refreshes"] == 1
+
+def test_value_past_the_stale_window_is_fetched_again():
+    async def run():
+        cache, upstream = AsyncTTLCache("test", ttl_seconds=60, stale_seconds=60), Upstream()
+        await cache.get_or_fetch("key", upstream.fetch)
+        age(cache, "key", 150)
+        return await cache.get_or_fetch("key", upstream.fetch)
+
+    assert asyncio.run(run()) == "value-2"
+
+def test_failed_fetch_reaches_every_waiter_and_is_not_cached():
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        cache = AsyncTTLCache("test", ttl_seconds=60)
+        results = await asyncio.gather(*(cache.get_or_fetch("key", failing) for _ in range(3)), return_exceptions=True)
+        return results, cache.get("key")
+
+    results, cached = asyncio.run(run())
+    assert calls == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cached is None
+
+def test_values_rejected_by_cache_if_are_not_stored():
+    async def run():
+        cache, upstream = AsyncTTLCache("test", ttl_seconds=60, cache_if=lambda value: value != "value-1"), Upstream()
+        first = await cache.get_or_fetch("key", upstream.fetch)
+        second = await cache.get_or_fetch("key", upstream.fetch)
+        return first, second
+
+    assert asyncio.run(run()) == ("value-1", "value-2")
+
+def test_oldest_entry_is_evicted_past_max_size():
+    cache = AsyncTTLCache("test", ttl_seconds=60, max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2 and cache.get("c") == 3
+
+def test_fetches_in_flight_on_another_event_loop_are_not_awaited():
+    cache = AsyncTTLCache("test", ttl_seconds=60)
+    other_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=other_loop.run_forever)
+    thread.start()
+
+    async def slow_fetch():
+        await asyncio.sleep(0.5)
+        return "other loop"
+
+    async def fetch():
+        return "this loop"
+
+    try:
+        pending = asyncio.run_coroutine_threadsafe(cache.get_or_fetch("key", slow_fetch), other_loop)
+        time.sleep(0.05)
+        assert asyncio.run(asyncio.wait_for(cache.get_or_fetch("key", fetch), 1)) == "this loop"
+        assert pending.result(timeout=2) == "other loop"
+    finally:
+        other_loop.call_soon_threadsafe(other_loop.stop)
+        thread.join()
+        other_loop.close()
@@ -0,0 +1,54 @@
+from app.services.llm_client import CircuitBreaker
+
+def open_breaker(reset_seconds: float = 60) -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=reset_seconds)
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    return breaker
+
+def test_opens_after_the_threshold_of_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.opened == 1
+    assert not breaker.allow()
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+def test_lets_one_probe_through_once_the_reset_time_passed():
+    breaker = open_breaker(reset_seconds=0)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+
+def test_successful_probe_closes_the_circuit():
+    breaker = open_breaker(reset_seconds=0)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+def test_failed_probe_opens_the_circuit_again():
+    breaker = open_breaker(reset_seconds=0)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.opened == 2
+    breaker.reset_seconds = 60
+    assert not breaker.allow()
+
+def test_cancelled_probe_frees_the_probe_slot():
+    breaker = open_breaker(reset_seconds=0)
+    assert breaker.allow()
+    breaker.record_cancelled()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
@@ -0,0 +1,63 @@
+import pytest
+from app.config import settings
+from app.services import llm_food_rag
+from app.services.context_builder import build_context
+from app.utils import tokenization
+from app.utils.tokenization import HeuristicTokenizer
+
+@pytest.fixture(autouse=True)
+def rag_settings(monkeypatch):
+    monkeypatch.setattr(tokenization, "_tokenizer", HeuristicTokenizer())
+    monkeypatch.setattr(settings, "RAG_MAX_DISTANCE", 1.5)
+    monkeypatch.setattr(settings, "RAG_DEDUP_THRESHOLD", 0.8)
+
+def sentence(topic: str, count: int = 20) -> str:
+    # `count` heuristic tokens
+    return " ".join(f"{topic}{i}" for i in range(count))
+
+def test_chunks_are_ranked_by_distance():
+    texts = [sentence("far"), sentence("near"), sentence("mid")]
+    chunks, dropped = build_context(texts, [0.9, 0.1, 0.5], max_tokens=1000)
+    assert chunks == [sentence("near"), sentence("mid"), sentence("far")]
+    assert dropped == {"duplicates": 0, "over_budget": 0, "too_distant": 0}
+
+def test_near_duplicates_of_a_picked_chunk_are_dropped():
+    original = sentence("pasta", 30)
+    overlapping = original + " with extra cheese"
+    chunks, dropped = build_context([overlapping, original, sentence("soup")], [0.2, 0.1, 0.3], max_tokens=1000)
+    assert chunks == [original, sentence("soup")]
+    assert dropped["duplicates"] == 1
+
+def test_chunks_are_packed_into_the_token_budget():
+    texts = [sentence("a", 40), sentence("b", 40), sentence("c", 15)]
+    chunks, dropped = build_context(texts, [0.1, 0.2, 0.3], max_tokens=60)
+    # The second chunk doesn't fit, the smaller one after it does
+    assert chunks == [sentence("a", 40), sentence("c", 15)]
+    assert dropped["over_budget"] == 1
+    assert sum(HeuristicTokenizer().count(chunk) for chunk in chunks) <= 60
+
+def test_the_budget_is_exact():
+    chunks, _ = build_context([sentence("a", 30), sentence("b", 30)], [0.1, 0.2], max_tokens=60)
+    assert len(chunks) == 2
+    chunks, _ = build_context([sentence("a", 30), sentence("b", 30)], [0.1, 0.2], max_tokens=59)
+    assert len(chunks) == 1
+
+def test_distant_and_empty_chunks_are_skipped():
+    chunks, dropped = build_context([sentence("near"), sentence("far"), None], [0.4, 2.0, 0.1], max_tokens=1000)
+    assert chunks == [sentence("near")]
+    assert dropped["too_distant"] == 1
+
+def test_distance_cutoff_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "RAG_MAX_DISTANCE", 0)
+    chunks, _ = build_context([sentence("far")], [9.0], max_tokens=1000)
+    assert chunks == [sentence("far")]
+
+def test_no_relevant_context_skips_the_llm():
+    answer, prompt = llm_food_rag._build_prompt("carbonara?", [sentence("far")], [3.0])
+    assert (answer, prompt) == (llm_food_rag.NO_CONTEXT_ANSWER, None)
+
+def test_prompt_carries_the_picked_chunks():
+    answer, prompt = llm_food_rag._build_prompt("carbonara?", [sentence("egg"), sentence("egg")], [0.1, 0.2])
+    assert answer is None
+    assert prompt["content"].count(sentence("egg")) == 1
+    assert "User: carbonara?" in prompt["content"]
@@ -0,0 +1,200 @@
+import os
+from datetime import datetime, timedelta
+import pytest
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.database import SessionLocal
+from app.main import app
+from app.models import Document, DocumentPage
+from app.routers import documents
+from app.services.compaction import run_compaction
+from app.services.vector_store import add_vectors, get_vectors
+
+PDF = b"%PDF-1.4\n%%EOF\n"
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+def create_document(claimed_at: datetime = None) -> int:
+    with SessionLocal() as db:
+        doc = Document(
+            title="Recipes",
+            file_path=os.path.join(settings.UPLOAD_DIR, "missing.pdf"),
+            claimed_by="worker" if claimed_at else None,
+            claimed_at=claimed_at,
+        )
+        db.add(doc)
+        db.commit()
+        return doc.id
+
+def pdf(name: str) -> bytes:
+    return f"%PDF-1.4\n% {name}\n%%EOF\n".encode()
+
+def upload(client, name: str) -> dict:
+    response = client.post("/documents", data={"title": name}, files={"file": (f"{name}.pdf", pdf(name), "application/pdf")})
+    assert response.status_code == 202
+    return response.json()
+
+def index(document_id: int, pages: int = 2):
+    """
+    Store what a finished ingestion leaves behind: processed pages with
+    one vector each.
+    """
+    with SessionLocal() as db:
+        doc = db.get(Document, document_id)
+        for page_number in range(1, pages + 1):
+            db.add(DocumentPage(document_id=document_id, page_number=page_number, content=f"page {page_number}", is_processed=True))
+        doc.is_processed = True
+        db.commit()
+    add_vectors(
+        ids=[f"doc{document_id}_p{page_number}_c0" for page_number in range(1, pages + 1)],
+        embeddings=[[float(document_id), float(page_number), 1.0] for page_number in range(1, pages + 1)],
+        metadatas=[{"document_id": document_id, "page_number": page_number} for page_number in range(1, pages + 1)],
+    )
+
+def page_states(document_id: int) -> list:
+    with SessionLocal() as db:
+        return [page.is_processed for page in db.get(Document, document_id).pages]
+
+def vector_ids(document_id: int) -> set:
+    return set(get_vectors(where={"document_id": document_id})["ids"])
+
+def uploads() -> set:
+    return set(os.listdir(settings.UPLOAD_DIR)) if os.path.isdir(settings.UPLOAD_DIR) else set()
+
+def test_update_of_a_claimed_document_is_refused(client):
+    document_id = create_document(claimed_at=datetime.utcnow())
+    before = uploads()
+    response = client.put(f"/documents/{document_id}", files={"file": ("new.pdf", PDF, "application/pdf")})
+    assert response.status_code == 409
+    assert uploads() == before
+
+def test_update_is_refused_when_a_job_claims_the_document_during_the_upload(client, monkeypatch):
+    document_id = create_document()
+    store_upload = documents._store_upload
+
+    async def store_and_claim(file):
+        stored = await store_upload(file)
+        with SessionLocal() as db:
+            doc = db.get(Document, document_id)
+            doc.claimed_by, doc.claimed_at = "worker", datetime.utcnow()
+            db.commit()
+        return stored
+
+    monkeypatch.setattr(documents, "_store_upload", store_and_claim)
+    before = uploads()
+    response = client.put(f"/documents/{document_id}", files={"file": ("new.pdf", PDF, "application/pdf")})
+    assert response.status_code == 409
+    assert uploads() == before
+
+def test_delete_of_a_claimed_document_is_refused(client):
+    document_id = create_document(claimed_at=datetime.utcnow())
+    assert client.delete(f"/documents/{document_id}").status_code == 409
+    with SessionLocal() as db:
+        assert db.get(Document, document_id) is not None
+
+def test_claimed_document_is_reported_as_processing(client):
+    document_id = create_document(claimed_at=datetime.utcnow())
+    assert client.get(f"/documents/{document_id}").json()["status"] == "processing"
+
+def test_expired_claim_does_not_block_delete(client):
+    expired = datetime.utcnow() - timedelta(seconds=settings.INGESTION_CLAIM_TTL_SECONDS + 60)
+    document_id = create_document(claimed_at=expired)
+    assert client.delete(f"/documents/{document_id}").status_code == 204
+    with SessionLocal() as db:
+        assert db.get(Document, document_id) is None
+
+def test_missing_document(client):
+    assert client.delete("/documents/999999").status_code == 404
+    response = client.put("/documents/999999", files={"file": ("new.pdf", PDF, "application/pdf")})
+    assert response.status_code == 404
+
+def test_update_with_a_new_file_queues_re_indexing(client):
+    doc = upload(client, "update-new-file")
+    index(doc["id"])
+    response = client.put(f"/documents/{doc['id']}", files={"file": ("v2.pdf", pdf("update-new-file v2"), "application/pdf")})
+    assert response.status_code == 202
+    body = response.json()
+    assert not body["is_processed"] and body["title"] == "update-new-file"
+    assert body["file_path"] != doc["file_path"]
+    assert os.path.exists(body["file_path"]) and not os.path.exists(doc["file_path"])
+    # Pages are hashed again by the ingestion job; only a new title revisits them all
+    assert page_states(doc["id"]) == [True, True]
+
+def test_update_with_the_same_file_and_title_is_a_no_op(client):
+    doc = upload(client, "update-same")
+    index(doc["id"])
+    before = uploads()
+    response = client.put(f"/documents/{doc['id']}", files={"file": ("again.pdf", pdf("update-same"), "application/pdf")})
+    assert response.status_code == 200
+    assert response.json()["is_processed"] and response.json()["file_path"] == doc["file_path"]
+    assert uploads() == before
+
+def test_update_of_the_title_revisits_every_page(client):
+    doc = upload(client, "update-title")
+    index(doc["id"])
+    before = uploads()
+    response = client.put(
+        f"/documents/{doc['id']}",
+        data={"title": "renamed"},
+        files={"file": ("again.pdf", pdf("update-title"), "application/pdf")},
+    )
+    assert response.status_code == 202
+    assert response.json()["title"] == "renamed" and response.json()["file_path"] == doc["file_path"]
+    assert page_states(doc["id"]) == [False, False]
+    assert uploads() == before
+
+def test_update_with_another_documents_file_is_refused(client):
+    doc = upload(client, "update-conflict")
+    other = upload(client, "update-conflict other")
+    before = uploads()
+    response = client.put(f"/documents/{doc['id']}", files={"file": ("other.pdf", pdf("update-conflict other"), "application/pdf")})
+    assert response.status_code == 409
+    assert uploads() == before
+    with SessionLocal() as db:
+        assert db.get(Document, doc["id"]).file_path == doc["file_path"]
+        assert db.get(Document, other["id"]).file_path == other["file_path"]
+
+def test_delete_removes_pages_vectors_and_file(client):
+    doc = upload(client, "delete-idle")
+    index(doc["id"])
+    assert vector_ids(doc["id"])
+    assert client.delete(f"/documents/{doc['id']}").status_code == 204
+    assert not os.path.exists(doc["file_path"])
+    assert vector_ids(doc["id"]) == set()
+    with SessionLocal() as db:
+        assert db.query(DocumentPage).filter(DocumentPage.document_id == doc["id"]).count() == 0
+
+def test_compaction_removes_orphans_and_leaves_ingestion_alone(client):
+    kept = upload(client, "compact-kept")
+    index(kept["id"], pages=3)
+    ingesting = upload(client, "compact-ingesting")
+    index(ingesting["id"])
+    deleted = upload(client, "compact-deleted")
+    index(deleted["id"])
+    with SessionLocal() as db:
+        # A page that disappeared from a processed document
+        db.query(DocumentPage).filter(DocumentPage.document_id == kept["id"], DocumentPage.page_number == 3).delete()
+        # A document still being re-indexed may not have stored its pages yet
+        db.get(Document, ingesting["id"]).is_processed = False
+        db.query(DocumentPage).filter(DocumentPage.document_id == ingesting["id"]).delete()
+        # A deletion interrupted before its pages and vectors were removed
+        db.query(Document).filter(Document.id == deleted["id"]).delete()
+        db.commit()
+
+    response = client.post("/documents/compact")
+    assert response.status_code == 200
+    result = response.json()
+    assert result["orphan_pages"] == 2
+    assert result["orphan_vectors"] == 3
+    assert result["freed_slots"] >= 3
+    assert vector_ids(kept["id"]) == {f"doc{kept['id']}_p1_c0", f"doc{kept['id']}_p2_c0"}
+    assert vector_ids(ingesting["id"]) == {f"doc{ingesting['id']}_p1_c0", f"doc{ingesting['id']}_p2_c0"}
+    assert vector_ids(deleted["id"]) == set()
+    with SessionLocal() as db:
+        assert db.query(DocumentPage).filter(DocumentPage.document_id == deleted["id"]).count() == 0
+
+    # Nothing left to remove
+    assert run_compaction() == {"orphan_pages": 0, "orphan_vectors": 0, "freed_slots": 0}
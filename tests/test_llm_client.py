@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+from app.config import settings
+from app.services import llm_client
+from app.services.llm_client import CircuitBreaker, Route
+
+@pytest.fixture(autouse=True)
+def hedging(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGING_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_DELAY_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "LLM_HEDGE_DEFAULT_DELAY_SECONDS", 0.05)
+    for provider in llm_client._providers.values():
+        monkeypatch.setattr(provider, "breaker", CircuitBreaker(5, 30))
+
+def fake_call(latencies: dict, calls: list):
+    """
+    `call(client, model)` answering with the model name after
+    `latencies[model]` seconds, or raising it when it's an exception.
+    """
+    async def call(client, model):
+        calls.append(model)
+        latency = latencies[model]
+        if isinstance(latency, Exception):
+            raise latency
+        await asyncio.sleep(latency)
+        return model
+    return call
+
+def test_routes_keep_separate_latency_windows():
+    food, ooc = Route("food-test", "groq:shared,openai:b", 5), Route("ooc-test", "groq:shared,openai:b", 5)
+    for _ in range(5):
+        food.targets[0].record_latency(8.0, stream=False)
+        ooc.targets[0].record_latency(0.5, stream=False)
+    assert food.targets[0].hedge_delay(stream=False) == 8.0
+    assert ooc.targets[0].hedge_delay(stream=False) == 0.5
+
+def test_hedge_delay_follows_observed_latency(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_PERCENTILE", 50)
+    target = Route("delay-test", "groq:a,openai:b", 5).targets[0]
+    assert target.hedge_delay(stream=False) is None
+    assert target.hedge_delay(stream=True) == settings.LLM_HEDGE_DEFAULT_DELAY_SECONDS
+    for seconds in (2.0, 6.0):
+        target.record_latency(seconds, stream=False)
+    # The slowest call stands in until there are enough samples
+    assert target.hedge_delay(stream=False) == 6.0
+    for _ in range(8):
+        target.record_latency(1.0, stream=False)
+    assert target.hedge_delay(stream=False) == 1.0
+    target.record_latency(0.001, stream=True)
+    assert target.hedge_delay(stream=True) == settings.LLM_HEDGE_MIN_DELAY_SECONDS
+
+def test_complete_answers_are_not_hedged_before_a_call_was_timed():
+    route, calls = Route("cold-test", "groq:slow,openai:fast", 5), []
+    target, result = asyncio.run(llm_client._hedged(route, fake_call({"slow": 0.2, "fast": 0.0}, calls)))
+    assert (result, calls, route.hedges) == ("slow", ["slow"], 0)
+
+def test_slow_primary_is_hedged_once_its_latency_is_known():
+    route, calls = Route("warm-test", "groq:slow,openai:fast", 5), []
+    for _ in range(5):
+        route.targets[0].record_latency(0.02, stream=False)
+    target, result = asyncio.run(llm_client._hedged(route, fake_call({"slow": 1.0, "fast": 0.0}, calls)))
+    assert (result, calls) == ("fast", ["slow", "fast"])
+    assert route.hedges == 1 and route.hedges_won == 1
+
+def test_streams_are_hedged_after_the_default_delay_before_a_call_was_timed():
+    route, calls = Route("stream-test", "groq:slow,openai:fast", 5), []
+    _, result = asyncio.run(llm_client._hedged(route, fake_call({"slow": 1.0, "fast": 0.0}, calls), stream=True))
+    assert result == "fast" and route.hedges == 1
+
+def test_failed_primary_fails_over_to_the_next_target():
+    route, calls = Route("failover-test", "groq:broken,openai:fine", 5), []
+    _, result = asyncio.run(llm_client._hedged(route, fake_call({"broken": RuntimeError("500"), "fine": 0.0}, calls)))
+    assert (result, calls, route.failovers) == ("fine", ["broken", "fine"], 1)
+    assert route.targets[0].errors == 1
+
+def test_open_circuits_are_skipped():
+    route, calls = Route("breaker-test", "groq:a,openai:b", 5), []
+    llm_client._providers["groq"].breaker.state = "open"
+    llm_client._providers["groq"].breaker._opened_at = float("inf")
+    _, result = asyncio.run(llm_client._hedged(route, fake_call({"a": 0.0, "b": 0.0}, calls)))
+    assert (result, calls) == ("b", ["b"])
+    llm_client._providers["openai"].breaker.state = "open"
+    llm_client._providers["openai"].breaker._opened_at = float("inf")
+    with pytest.raises(llm_client.LLMUnavailableError):
+        asyncio.run(llm_client._hedged(route, fake_call({"a": 0.0, "b": 0.0}, calls)))
+
+def test_calls_past_the_deadline_time_out():
+    route = Route("deadline-test", "groq:slow", 0.05)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(llm_client._hedged(route, fake_call({"slow": 1.0}, [])))
@@ -0,0 +1,45 @@
+import asyncio
+import pytest
+from app.config import settings
+from app.services import llm_classifier
+from app.services.local_classifier import classify_by_keywords
+
+@pytest.mark.parametrize("content", [
+    "How do I cook?",
+    "Is it nice outside?",
+    "Tell me about the climate in Peru.",
+    "What should I eat?",
+])
+def test_a_single_keyword_is_not_confident(content):
+    _, confidence = classify_by_keywords(content)
+    assert 0 < confidence < settings.LOCAL_CLASSIFIER_THRESHOLD
+
+@pytest.mark.parametrize("content, label", [
+    ("How do I cook a chicken curry?", "food"),
+    ("Give me a pasta recipe.", "food"),
+    ("Will it rain outside tomorrow?", "weather"),
+    ("What is the temperature and humidity?", "weather"),
+])
+def test_two_keywords_of_one_label_are_confident(content, label):
+    assert classify_by_keywords(content) == (label, 1.0)
+
+def test_mixed_keywords_are_not_confident():
+    label, confidence = classify_by_keywords("Can I grill outside if it rains?")
+    assert confidence < settings.LOCAL_CLASSIFIER_THRESHOLD
+
+def test_no_keywords():
+    assert classify_by_keywords("Who won the game last night?") == ("other", 0.0)
+
+def test_a_single_keyword_falls_back_to_the_llm(monkeypatch):
+    calls = []
+
+    async def classify_with_llm(content):
+        calls.append(content)
+        return "other"
+
+    monkeypatch.setattr(settings, "LOCAL_CLASSIFIER_USE_EMBEDDINGS", False)
+    monkeypatch.setattr(settings, "LOCAL_CLASSIFIER_SHADOW_RATE", 0.0)
+    monkeypatch.setattr(llm_classifier, "classify_with_llm", classify_with_llm)
+    assert asyncio.run(llm_classifier.classify_message("Which climate do penguins live in?")) == "other"
+    assert asyncio.run(llm_classifier.classify_message("How do I cook a chicken curry?")) == "food"
+    assert calls == ["Which climate do penguins live in?"]
@@ -0,0 +1,98 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from app.database import SessionLocal
+from app.main import app
+from app.models import Message
+from app.services import message_batch
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app, raise_server_exceptions=False) as client:
+        yield client
+
+@pytest.fixture
+def upstreams(monkeypatch):
+    """
+    Label each message by its first word and answer it without any provider;
+    `calls` records the coalesced upstream calls.
+    """
+    calls = {"classify": [], "retrieve": []}
+
+    async def classify_messages(contents):
+        calls["classify"].append(list(contents))
+        return [content.split()[0] for content in contents]
+
+    async def prepare_food_answers(contents, wheres):
+        calls["retrieve"].append(list(contents))
+        return [f"context for {content}" for content in contents]
+
+    async def generate_food_answer(content, prepared, where):
+        return f"recipe ({prepared})"
+
+    async def generate_ooc_answer(content):
+        if "fail" in content:
+            raise RuntimeError("provider down")
+        return "only food and weather"
+
+    async def get_weather_for_newyork():
+        return {"name": "New York"}
+
+    async def generate_weather_answer(weather_data):
+        return f"sunny in {weather_data['name']}"
+
+    for function in (classify_messages, prepare_food_answers, generate_food_answer, generate_ooc_answer, get_weather_for_newyork, generate_weather_answer):
+        monkeypatch.setattr(message_batch, function.__name__, function)
+    return calls
+
+def batch(client, *contents):
+    return client.post("/messages/batch", json={"messages": [{"content": content} for content in contents]})
+
+def stored(first_content: str) -> list:
+    # (is_ai, content) of the messages stored since the batch's first user message
+    with SessionLocal() as db:
+        first_id = db.scalar(select(Message.id).where(Message.content == first_content).order_by(Message.id.desc()))
+        rows = db.execute(select(Message.is_ai, Message.content).where(Message.id >= first_id).order_by(Message.id))
+        return [tuple(row) for row in rows]
+
+def test_answers_keep_the_input_order_and_coalesce_upstream_calls(client, upstreams):
+    contents = ["food pasta 1", "other joke 1", "weather today 1", "food soup 1"]
+    response = batch(client, *contents)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [item["index"] for item in results] == [0, 1, 2, 3]
+    assert [item["message"]["content"] for item in results] == [
+        "recipe (context for food pasta 1)",
+        "only food and weather",
+        "sunny in New York",
+        "recipe (context for food soup 1)",
+    ]
+    assert upstreams["classify"] == [contents]
+    assert upstreams["retrieve"] == [["food pasta 1", "food soup 1"]]
+    assert stored("food pasta 1") == [(False, content) for content in contents] + [(True, item["message"]["content"]) for item in results]
+
+def test_failed_items_carry_an_error_and_store_no_answer(client, upstreams):
+    results = batch(client, "other fail 2", "food pasta 2").json()["results"]
+    assert results[0] == {"index": 0, "message": None, "error": "Failed to generate a response."}
+    assert results[1]["message"]["content"] == "recipe (context for food pasta 2)"
+    assert stored("other fail 2") == [(False, "other fail 2"), (False, "food pasta 2"), (True, "recipe (context for food pasta 2)")]
+
+def test_failed_retrieval_fails_only_the_food_items(client, upstreams, monkeypatch):
+    async def prepare_food_answers(contents, wheres):
+        raise RuntimeError("vector store down")
+
+    monkeypatch.setattr(message_batch, "prepare_food_answers", prepare_food_answers)
+    results = batch(client, "food pasta 3", "weather today 3").json()["results"]
+    assert results[0]["error"] == "Failed to retrieve context for the food query."
+    assert results[1]["message"]["content"] == "sunny in New York"
+
+def test_user_messages_are_kept_when_answering_fails(client, upstreams, monkeypatch):
+    async def classify_messages(contents):
+        raise RuntimeError("classifier down")
+
+    monkeypatch.setattr(message_batch, "classify_messages", classify_messages)
+    assert batch(client, "food pasta 4", "other joke 4").status_code == 500
+    assert stored("food pasta 4") == [(False, "food pasta 4"), (False, "other joke 4")]
+
+def test_empty_batch_is_rejected(client):
+    assert client.post("/messages/batch", json={"messages": []}).status_code == 422
@@ -0,0 +1,74 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from app.database import SessionLocal
+from app.main import app
+from app.models import Message
+from app.routers import messages
+from app.services import llm_client
+from app.services.llm_ooc import FALLBACK_ANSWER
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture
+def classified_as(monkeypatch):
+    def classify(label, prepared=None):
+        async def classify_with_speculation(content, where):
+            return label, prepared, None
+        monkeypatch.setattr(messages, "classify_with_speculation", classify_with_speculation)
+    return classify
+
+def upstream(monkeypatch, tokens, error=None):
+    async def stream_text(route, messages, **params):
+        for token in tokens:
+            yield token
+        if error is not None:
+            raise error
+    monkeypatch.setattr(llm_client, "stream_text", stream_text)
+
+def events(response) -> list:
+    parsed = []
+    for block in response.text.strip().split("\n\n"):
+        event, data = block.split("\n")
+        parsed.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return parsed
+
+def stored(content: str) -> list:
+    # (is_ai, content) of the messages stored since the user message
+    with SessionLocal() as db:
+        user_id = db.scalar(select(Message.id).where(Message.content == content).order_by(Message.id.desc()))
+        rows = db.execute(select(Message.is_ai, Message.content).where(Message.id >= user_id).order_by(Message.id))
+        return [tuple(row) for row in rows]
+
+def test_tokens_then_the_stored_answer(client, monkeypatch, classified_as):
+    classified_as("other")
+    upstream(monkeypatch, ["Sorry, ", "I only know food."])
+    response = client.post("/messages/stream", json={"content": "Tell me a joke, stream 1"})
+    assert response.status_code == 200
+    parsed = events(response)
+    assert parsed[:2] == [("token", {"content": "Sorry, "}), ("token", {"content": "I only know food."})]
+    assert parsed[2][0] == "done" and parsed[2][1]["content"] == "Sorry, I only know food."
+    assert stored("Tell me a joke, stream 1") == [(False, "Tell me a joke, stream 1"), (True, "Sorry, I only know food.")]
+
+def test_failure_before_the_first_token_streams_the_fallback(client, monkeypatch, classified_as):
+    classified_as("other")
+    upstream(monkeypatch, [], error=RuntimeError("provider down"))
+    parsed = events(client.post("/messages/stream", json={"content": "Tell me a joke, stream 2"}))
+    assert [event for event, _ in parsed] == ["token", "done"]
+    assert stored("Tell me a joke, stream 2") == [(False, "Tell me a joke, stream 2"), (True, FALLBACK_ANSWER)]
+
+@pytest.mark.parametrize("label, prepared", [
+    ("other", None),
+    ("food", ([0.0], 0, None, {"role": "user", "content": "prompt"})),
+])
+def test_failure_midway_sends_an_error_and_stores_no_answer(client, monkeypatch, classified_as, label, prepared):
+    classified_as(label, prepared)
+    upstream(monkeypatch, ["Half an "], error=RuntimeError("connection reset"))
+    content = f"Half-answered {label} question"
+    parsed = events(client.post("/messages/stream", json={"content": content}))
+    assert parsed == [("token", {"content": "Half an "}), ("error", {"detail": "Failed to generate the AI response."})]
+    assert stored(content) == [(False, content)]
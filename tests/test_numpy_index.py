@@ -0,0 +1,137 @@
+import numpy as np
+import pytest
+from app.services.numpy_index import NumpyIndexBackend
+
+ALL_FIELDS = ("metadatas", "documents", "distances")
+
+DIM = 32
+
+@pytest.fixture
+def vectors():
+    return np.random.default_rng(0).normal(size=(300, DIM)).astype(np.float32)
+
+def filled(path, vectors, quantization="none") -> NumpyIndexBackend:
+    backend = NumpyIndexBackend(str(path), quantization)
+    backend.add(
+        [f"v{i}" for i in range(len(vectors))],
+        vectors.tolist(),
+        [{"document_id": i % 3, "row": i} for i in range(len(vectors))],
+        [f"chunk {i}" for i in range(len(vectors))],
+    )
+    return backend
+
+def exact_top_k(vectors, queries, k):
+    distances = ((queries[:, None, :] - vectors[None, :, :]) ** 2).sum(axis=2)
+    return np.argsort(distances, axis=1)[:, :k]
+
+@pytest.mark.parametrize("quantization", ["none", "int8"])
+def test_query_returns_the_nearest_rows_with_exact_distances(tmp_path, vectors, quantization):
+    backend = filled(tmp_path, vectors, quantization)
+    result = backend.query([vectors[7].tolist(), vectors[42].tolist()], 3, include=ALL_FIELDS)
+    assert [ids[0] for ids in result["ids"]] == ["v7", "v42"]
+    assert result["distances"][0][0] == pytest.approx(0.0, abs=1e-3)
+    assert result["documents"][1][0] == "chunk 42"
+    assert result["metadatas"][1][0] == {"document_id": 0, "row": 42}
+    expected = ((vectors[7] - vectors[int(result["ids"][0][1][1:])]) ** 2).sum()
+    assert result["distances"][0][1] == pytest.approx(float(expected), rel=1e-4)
+
+def test_query_with_a_document_filter(tmp_path, vectors):
+    backend = filled(tmp_path, vectors)
+    result = backend.query([vectors[7].tolist()], 5, where={"document_id": 2}, include=ALL_FIELDS)
+    assert result["ids"][0] and all(metadata["document_id"] == 2 for metadata in result["metadatas"][0])
+    result = backend.query([vectors[7].tolist()], 5, where={"document_id": {"$in": [0, 1]}})
+    assert result["ids"][0][0] == "v7"
+
+def test_re_adding_an_id_overwrites_its_row(tmp_path, vectors):
+    backend = filled(tmp_path, vectors)
+    backend.add(["v7"], [vectors[8].tolist()], [{"document_id": 1}], ["moved"])
+    assert backend.count() == len(vectors)
+    result = backend.query([vectors[8].tolist()], 2)
+    assert set(result["ids"][0]) == {"v7", "v8"}
+
+def test_deleted_rows_are_not_returned_and_are_reused(tmp_path, vectors):
+    backend = filled(tmp_path, vectors)
+    backend.delete(ids=["v7"])
+    backend.delete(where={"document_id": 2})
+    assert backend.count() == len(vectors) - 1 - 100
+    result = backend.query([vectors[7].tolist(), vectors[8].tolist()], 10, include=ALL_FIELDS)
+    assert "v7" not in result["ids"][0]
+    assert all(metadata["document_id"] != 2 for metadatas in result["metadatas"] for metadata in metadatas)
+
+    matrix_bytes = backend.memory()["float_matrix_bytes"]
+    backend.add(["new"], [vectors[7].tolist()], [{"document_id": 5}])
+    assert backend.query([vectors[7].tolist()], 1)["ids"] == [["new"]]
+    assert backend.memory()["float_matrix_bytes"] == matrix_bytes
+
+def test_fewer_live_rows_than_top_k(tmp_path, vectors):
+    backend = filled(tmp_path, vectors[:4])
+    backend.delete(ids=["v0", "v1"])
+    result = backend.query([vectors[0].tolist()], 10)
+    assert sorted(result["ids"][0]) == ["v2", "v3"]
+
+@pytest.mark.parametrize("quantization", ["none", "int8"])
+def test_compact_drops_free_rows_and_survives_a_reload(tmp_path, vectors, quantization):
+    backend = filled(tmp_path, vectors, quantization)
+    backend.delete(where={"document_id": 0})
+    assert backend.compact() == 100
+    assert backend.compact() == 0
+    before = backend.query([vectors[8].tolist()], 5)
+    assert before["ids"][0][0] == "v8"
+
+    reloaded = NumpyIndexBackend(str(tmp_path), quantization)
+    assert reloaded.count() == 200
+    assert reloaded.query([vectors[8].tolist()], 5) == before
+    assert reloaded.get(ids=["v8"], include=("metadatas", "documents"))["documents"] == ["chunk 8"]
+
+@pytest.mark.parametrize("change", ["delete", "overwrite", "compact"])
+def test_rows_changed_while_a_query_is_scored_are_not_returned(tmp_path, vectors, change):
+    backend = filled(tmp_path, vectors[:10])
+    backend.delete(ids=["v9"])
+    score = backend._score
+    scored = []
+
+    def score_racing_a_writer(*args):
+        hits = score(*args)
+        if not scored:
+            if change == "delete":
+                backend.delete(ids=["v3"])
+            elif change == "overwrite":
+                backend.add(["v3"], [(-vectors[3]).tolist()], [{"document_id": 0}], ["moved"])
+            else:
+                backend.compact()
+        scored.append(hits)
+        return hits
+
+    backend._score = score_racing_a_writer
+    result = backend.query([vectors[3].tolist()], 3)
+    # Scored again against the changed rows
+    assert len(scored) == 2
+    assert None not in result["ids"][0]
+    assert (result["ids"][0][0] == "v3") == (change == "compact")
+    for id, document in zip(result["ids"][0], result["documents"][0]):
+        assert document == ("moved" if id == "v3" and change == "overwrite" else f"chunk {id[1:]}")
+
+def test_migrate_documents_in_batches(tmp_path, vectors):
+    backend = NumpyIndexBackend(str(tmp_path))
+    backend.add(
+        [f"v{i}" for i in range(25)],
+        vectors[:25].tolist(),
+        [{"document_id": 1, "chunk_text": f"chunk {i}"} for i in range(25)],
+    )
+    assert backend.migrate_documents(batch_size=10) == 25
+    assert backend.migrate_documents(batch_size=10) == 0
+    result = backend.get(ids=["v0", "v24"], include=("metadatas", "documents"))
+    assert result == {"ids": ["v0", "v24"], "metadatas": [{"document_id": 1}] * 2, "documents": ["chunk 0", "chunk 24"]}
+    assert NumpyIndexBackend(str(tmp_path)).get(ids=["v24"], include=("documents",))["documents"] == ["chunk 24"]
+
+def test_int8_recall_matches_float32(tmp_path, vectors):
+    corpus, queries = vectors[:250], vectors[250:] + 0.1
+    truth = exact_top_k(corpus, queries, 5)
+    recall = {}
+    for quantization in ("none", "int8"):
+        backend = filled(tmp_path / quantization, corpus, quantization)
+        result = backend.query(queries.tolist(), 5, include=())
+        hits = sum(len({int(id[1:]) for id in ids} & set(expected.tolist())) for ids, expected in zip(result["ids"], truth))
+        recall[quantization] = hits / truth.size
+    assert recall["none"] == 1.0
+    assert recall["int8"] >= 0.98
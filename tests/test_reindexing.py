@@ -0,0 +1,110 @@
+import hashlib
+import pytest
+from sqlalchemy import select
+from app.database import SessionLocal
+from app.models import Document, DocumentPage
+from app.services import pdf_processor
+from app.services.document_claims import ClaimLostError, DocumentClaim
+from app.services.semantic_cache import food_answer_cache
+from app.services.vector_store import get_vectors
+
+def fake_embedding(text: str) -> list:
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [byte / 255 for byte in digest[:3]]
+
+@pytest.fixture
+def embedded(monkeypatch, database):
+    """
+    Texts sent to the embeddings API, which is replaced by a hash.
+    """
+    texts = []
+
+    def embed_texts(batch):
+        texts.extend(batch)
+        return [fake_embedding(text) for text in batch]
+
+    monkeypatch.setattr(pdf_processor, "embed_texts", embed_texts)
+    return texts
+
+def create_document(title: str = "Recipes") -> int:
+    with SessionLocal() as db:
+        doc = Document(title=title, file_path="unused.pdf")
+        db.add(doc)
+        db.commit()
+        return doc.id
+
+def ingest(monkeypatch, document_id: int, pages: dict):
+    monkeypatch.setattr(pdf_processor, "iter_pages_from_pdf", lambda file_path: iter(sorted(pages.items())))
+    with SessionLocal() as db:
+        claim = DocumentClaim(db, document_id)
+        assert claim.acquire()
+        pdf_processor.process_document(db, db.get(Document, document_id), claim)
+
+def stored_pages(document_id: int) -> dict:
+    with SessionLocal() as db:
+        rows = db.execute(select(DocumentPage.page_number, DocumentPage.content, DocumentPage.is_processed).where(DocumentPage.document_id == document_id))
+        return {page_number: (content, is_processed) for page_number, content, is_processed in rows}
+
+def vector_ids(document_id: int) -> set:
+    return set(get_vectors(where={"document_id": document_id})["ids"])
+
+PAGES = {
+    1: "Carbonara: spaghetti, eggs, pecorino and guanciale.",
+    2: "Pesto: basil, pine nuts, garlic and olive oil.",
+    3: "Tiramisu: savoiardi, mascarpone, espresso and cocoa.",
+}
+
+def test_first_ingestion_indexes_every_page(monkeypatch, embedded):
+    document_id = create_document()
+    ingest(monkeypatch, document_id, PAGES)
+    assert embedded == list(PAGES.values())
+    assert vector_ids(document_id) == {f"doc{document_id}_p{page}_c0" for page in PAGES}
+    assert stored_pages(document_id) == {page: (text, True) for page, text in PAGES.items()}
+    with SessionLocal() as db:
+        doc = db.get(Document, document_id)
+        assert doc.is_processed and doc.claimed_by is None
+
+def test_reindexing_embeds_only_changed_pages_and_removes_vanished_ones(monkeypatch, embedded):
+    document_id = create_document()
+    ingest(monkeypatch, document_id, PAGES)
+    embedded.clear()
+    invalidations = food_answer_cache.stats()["invalidations"]
+
+    revised = {1: PAGES[1], 2: "Pesto: basil, walnuts, garlic and olive oil."}
+    with SessionLocal() as db:
+        db.get(Document, document_id).is_processed = False
+        db.commit()
+    ingest(monkeypatch, document_id, revised)
+
+    assert embedded == [revised[2]]
+    assert vector_ids(document_id) == {f"doc{document_id}_p1_c0", f"doc{document_id}_p2_c0"}
+    assert stored_pages(document_id) == {page: (text, True) for page, text in revised.items()}
+    assert food_answer_cache.stats()["invalidations"] == invalidations + 1
+
+def test_interrupted_ingestion_resumes_without_re_embedding(monkeypatch, embedded):
+    document_id = create_document()
+    ingest(monkeypatch, document_id, PAGES)
+    embedded.clear()
+    with SessionLocal() as db:
+        doc = db.get(Document, document_id)
+        doc.is_processed = False
+        for page in doc.pages:
+            page.is_processed = False
+        db.commit()
+    ingest(monkeypatch, document_id, PAGES)
+    assert embedded == []
+    assert all(is_processed for _, is_processed in stored_pages(document_id).values())
+
+def test_claim_taken_over_by_another_job_stops_the_ingestion(monkeypatch, embedded):
+    document_id = create_document()
+    monkeypatch.setattr(pdf_processor, "iter_pages_from_pdf", lambda file_path: iter(sorted(PAGES.items())))
+    with SessionLocal() as db:
+        claim = DocumentClaim(db, document_id)
+        assert claim.acquire()
+        # The claim expired and another job took the document over
+        db.get(Document, document_id).claimed_by = "other"
+        db.commit()
+        with pytest.raises(ClaimLostError):
+            pdf_processor.process_document(db, db.get(Document, document_id), claim)
+    with SessionLocal() as db:
+        assert not db.get(Document, document_id).is_processed
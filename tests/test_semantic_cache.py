@@ -0,0 +1,75 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app.services import semantic_cache
+from app.services.semantic_cache import SemanticCache, watch_corpus_changes
+
+def cache(**options) -> SemanticCache:
+    return SemanticCache(**{"max_size": 4, "ttl_seconds": 60, "threshold": 0.95, **options})
+
+def test_similar_query_hits_and_different_query_misses():
+    answers = cache()
+    answers.store([1.0, 0.0, 0.0], "carbonara")
+    assert answers.lookup([0.99, 0.05, 0.0])[0] == "carbonara"
+    assert answers.lookup([0.0, 1.0, 0.0])[0] is None
+
+def test_invalidate_drops_every_answer():
+    answers = cache()
+    answers.store([1.0, 0.0], "carbonara")
+    answers.invalidate()
+    assert answers.lookup([1.0, 0.0])[0] is None
+    assert answers.stats()["size"] == 0 and answers.stats()["invalidations"] == 1
+
+def test_answer_computed_before_an_invalidation_is_not_stored():
+    answers = cache()
+    _, generation = answers.lookup([1.0, 0.0])
+    answers.invalidate()
+    answers.store([1.0, 0.0], "stale carbonara", generation)
+    assert answers.lookup([1.0, 0.0])[0] is None
+
+    _, generation = answers.lookup([1.0, 0.0])
+    answers.store([1.0, 0.0], "carbonara", generation)
+    assert answers.lookup([1.0, 0.0])[0] == "carbonara"
+
+def test_expired_answers_are_not_served():
+    answers = cache(ttl_seconds=0)
+    answers.store([1.0, 0.0], "carbonara")
+    assert answers.lookup([1.0, 0.0])[0] is None
+
+def test_least_recently_used_answer_is_evicted():
+    answers = cache(max_size=2)
+    answers.store([1.0, 0.0, 0.0], "a")
+    answers.store([0.0, 1.0, 0.0], "b")
+    assert answers.lookup([1.0, 0.0, 0.0])[0] == "a"
+    answers.store([0.0, 0.0, 1.0], "c")
+    assert answers.lookup([0.0, 1.0, 0.0])[0] is None
+    assert answers.lookup([1.0, 0.0, 0.0])[0] == "a"
+
+class VersionedBackend:
+    shared = True
+    name = "fake"
+
+    def __init__(self, versions: list):
+        self.versions = versions
+
+    def version(self):
+        return self.versions.pop(0) if len(self.versions) > 1 else self.versions[0]
+
+@pytest.mark.parametrize("versions, invalidations", [([1, 1, 1], 0), ([1, 2, 2], 1), ([1, 2, 3], 2)])
+def test_changes_of_a_shared_vector_store_invalidate_the_cache(monkeypatch, versions, invalidations):
+    answers = cache()
+    monkeypatch.setattr(semantic_cache, "food_answer_cache", answers)
+    monkeypatch.setattr(semantic_cache, "services", SimpleNamespace(vector_backend=VersionedBackend(versions)))
+
+    async def watch():
+        task = asyncio.ensure_future(watch_corpus_changes(0.001))
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(watch())
+    assert answers.stats()["invalidations"] == invalidations
+
+def test_unshared_vector_stores_are_not_watched(monkeypatch):
+    backend = SimpleNamespace(shared=False)
+    monkeypatch.setattr(semantic_cache, "services", SimpleNamespace(vector_backend=backend))
+    assert asyncio.run(asyncio.wait_for(watch_corpus_changes(0.001), 1)) is None
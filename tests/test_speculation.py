@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+from app.config import settings
+from app.services import speculation
+from app.services.speculation import SpeculationStats, classify_with_speculation
+
+class Upstreams:
+    """
+    Stand-ins for the classifier, food retrieval and weather fetch, which
+    record what ran and whether it was cancelled.
+    """
+
+    def __init__(self, label: str, retrieval_seconds: float = 0.0, retrieval_error: Exception = None):
+        self.label = label
+        self.retrieval_seconds = retrieval_seconds
+        self.retrieval_error = retrieval_error
+        self.retrieval_started = False
+        self.retrieval_cancelled = False
+
+    async def classify_message(self, content):
+        await asyncio.sleep(0.01)
+        if isinstance(self.label, Exception):
+            raise self.label
+        # Retrieval runs while the message is being classified
+        assert self.retrieval_started
+        return self.label
+
+    async def prepare_food_answer(self, content, where):
+        self.retrieval_started = True
+        try:
+            await asyncio.sleep(self.retrieval_seconds)
+        except asyncio.CancelledError:
+            self.retrieval_cancelled = True
+            raise
+        if self.retrieval_error is not None:
+            raise self.retrieval_error
+        return ("prepared", content, where)
+
+    async def get_weather_for_newyork(self):
+        return {"name": "New York"}
+
+@pytest.fixture
+def stats(monkeypatch):
+    stats = SpeculationStats()
+    monkeypatch.setattr(speculation, "speculation_stats", stats)
+    monkeypatch.setattr(settings, "SPECULATIVE_EXECUTION", True)
+    monkeypatch.setattr(settings, "SPECULATIVE_WEATHER", False)
+    return stats
+
+def install(monkeypatch, upstreams: Upstreams):
+    for name in ("classify_message", "prepare_food_answer", "get_weather_for_newyork"):
+        monkeypatch.setattr(speculation, name, getattr(upstreams, name))
+
+def test_food_uses_the_retrieval_started_during_classification(monkeypatch, stats):
+    upstreams = Upstreams("food")
+    install(monkeypatch, upstreams)
+    where = {"document_id": 1}
+    assert asyncio.run(classify_with_speculation("pasta?", where)) == ("food", ("prepared", "pasta?", where), None)
+    assert stats.stats()["retrieval"]["used"] == 1
+
+def test_other_labels_cancel_the_retrieval(monkeypatch, stats):
+    upstreams = Upstreams("other", retrieval_seconds=10)
+    install(monkeypatch, upstreams)
+    assert asyncio.run(classify_with_speculation("a joke?")) == ("other", None, None)
+    assert upstreams.retrieval_cancelled
+    assert stats.stats()["retrieval"]["wasted"] == 1
+
+def test_failed_retrieval_leaves_it_to_the_caller(monkeypatch, stats):
+    install(monkeypatch, Upstreams("food", retrieval_error=RuntimeError("vector store down")))
+    assert asyncio.run(classify_with_speculation("pasta?")) == ("food", None, None)
+
+def test_weather_is_fetched_speculatively_when_enabled(monkeypatch, stats):
+    monkeypatch.setattr(settings, "SPECULATIVE_WEATHER", True)
+    install(monkeypatch, Upstreams("weather"))
+    assert asyncio.run(classify_with_speculation("rain?")) == ("weather", None, {"name": "New York"})
+    assert stats.stats()["weather"]["used"] == 1 and stats.stats()["retrieval"]["wasted"] == 1
+
+def test_classification_failure_cancels_the_speculative_work(monkeypatch, stats):
+    upstreams = Upstreams(RuntimeError("classifier down"), retrieval_seconds=10)
+    install(monkeypatch, upstreams)
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await classify_with_speculation("pasta?")
+        await asyncio.sleep(0)
+        # Cancelled by the failure, not by the loop shutting down
+        return upstreams.retrieval_cancelled
+
+    assert asyncio.run(run())
+
+def test_nothing_runs_speculatively_when_disabled(monkeypatch, stats):
+    monkeypatch.setattr(settings, "SPECULATIVE_EXECUTION", False)
+    upstreams = Upstreams("food")
+    upstreams.retrieval_started = True  # classification doesn't wait for it
+    install(monkeypatch, upstreams)
+    monkeypatch.setattr(speculation, "prepare_food_answer", None)
+    assert asyncio.run(classify_with_speculation("pasta?")) == ("food", None, None)
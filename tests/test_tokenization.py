@@ -0,0 +1,72 @@
+import pytest
+from app.config import settings
+from app.utils import tokenization
+from app.utils.pdf_utils import chunk_text
+from app.utils.tokenization import HeuristicTokenizer, split_by_tokens
+
+@pytest.fixture(autouse=True)
+def heuristic_tokenizer(monkeypatch):
+    monkeypatch.setattr(tokenization, "_tokenizer", HeuristicTokenizer())
+
+def words(count: int) -> str:
+    # One heuristic token per word
+    return " ".join(f"w{i}" for i in range(count))
+
+def test_text_within_the_limit_is_one_chunk():
+    assert split_by_tokens(words(10), max_tokens=10) == [words(10)]
+
+def test_windows_are_cut_on_token_boundaries():
+    chunks = split_by_tokens(words(25), max_tokens=10)
+    assert chunks == [
+        " ".join(f"w{i}" for i in range(0, 10)),
+        " ".join(f"w{i}" for i in range(10, 20)),
+        " ".join(f"w{i}" for i in range(20, 25)),
+    ]
+
+def test_consecutive_windows_share_the_overlap():
+    chunks = split_by_tokens(words(16), max_tokens=10, overlap_tokens=4)
+    assert chunks == [
+        " ".join(f"w{i}" for i in range(0, 10)),
+        " ".join(f"w{i}" for i in range(6, 16)),
+    ]
+
+def test_no_trailing_window_made_only_of_overlap():
+    assert len(split_by_tokens(words(20), max_tokens=10, overlap_tokens=2)) == 3
+    assert len(split_by_tokens(words(18), max_tokens=10, overlap_tokens=2)) == 2
+
+def test_chunks_are_sliced_from_the_original_text():
+    text = "Wholegrain-bread, 3 eggs;  olive oil!"
+    for chunk in split_by_tokens(text, max_tokens=3, overlap_tokens=1):
+        assert chunk in text
+    assert all(HeuristicTokenizer().count(chunk) <= 3 for chunk in split_by_tokens(text, max_tokens=3))
+
+def test_blank_text_has_no_chunks():
+    assert split_by_tokens("", max_tokens=10) == []
+    assert split_by_tokens("   \n ", max_tokens=10) == []
+
+@pytest.mark.parametrize("overlap", [10, 11])
+def test_overlap_must_be_smaller_than_the_window(overlap):
+    with pytest.raises(ValueError):
+        split_by_tokens(words(30), max_tokens=10, overlap_tokens=overlap)
+
+def test_chunk_size_is_capped_at_the_embedding_input_limit(monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_MAX_INPUT_TOKENS", 8)
+    chunks = chunk_text(words(20), max_tokens=512, overlap_tokens=0)
+    assert [len(chunk.split()) for chunk in chunks] == [8, 8, 4]
+
+def test_overlap_is_checked_against_the_capped_chunk_size(monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_MAX_INPUT_TOKENS", 8)
+    with pytest.raises(ValueError, match="CHUNK_OVERLAP_TOKENS"):
+        chunk_text(words(20), max_tokens=512, overlap_tokens=8)
+
+def test_failed_tokenizer_load_is_raised_without_a_fallback(monkeypatch):
+    def fail():
+        raise OSError("encoding download failed")
+
+    monkeypatch.setattr(tokenization, "_tokenizer", None)
+    monkeypatch.setattr(tokenization, "_load_tokenizer", fail)
+    monkeypatch.setattr(settings, "CHUNK_TOKENIZER_FALLBACK", "")
+    with pytest.raises(OSError):
+        tokenization.get_tokenizer()
+    monkeypatch.setattr(settings, "CHUNK_TOKENIZER_FALLBACK", "heuristic")
+    assert tokenization.get_tokenizer().name == "heuristic"